@@ -0,0 +1,36 @@
+"""cache_versions table for cross-worker cache invalidation
+
+Revision ID: 3c1f2a9d7b40
+Revises: 8ee5097ecb4c
+Create Date: 2025-05-02 18:04:51.120337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1f2a9d7b40'
+down_revision: Union[str, None] = '8ee5097ecb4c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "cache_versions",
+        sa.Column("topic", sa.String(32), primary_key=True),
+        sa.Column("version", sa.BigInteger, nullable=False, server_default="0"),
+    )
+
+    op.execute(
+        sa.text(
+            "INSERT INTO cache_versions (topic) VALUES ('inventory'), ('recipes')"
+        )
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("cache_versions")
@@ -0,0 +1,89 @@
+"""global_inventory.potion_count maintained by potion_recipes triggers
+
+Revision ID: 5d2a8f7e13c6
+Revises: b7e40c1d95a2
+Create Date: 2025-05-13 10:22:45.918273
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2a8f7e13c6'
+down_revision: Union[str, None] = 'b7e40c1d95a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "global_inventory",
+        sa.Column("potion_count", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+
+    # Statement-level triggers with transition tables: a checkout touching one
+    # recipe or a bulk load touching 100k both cost one global_inventory update.
+    op.execute(
+        """
+        CREATE FUNCTION potion_count_apply() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            delta bigint;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                SELECT COALESCE(SUM(inventory), 0) INTO delta FROM new_rows;
+            ELSIF TG_OP = 'DELETE' THEN
+                SELECT -COALESCE(SUM(inventory), 0) INTO delta FROM old_rows;
+            ELSE
+                SELECT COALESCE((SELECT SUM(inventory) FROM new_rows), 0)
+                     - COALESCE((SELECT SUM(inventory) FROM old_rows), 0)
+                INTO delta;
+            END IF;
+
+            IF delta <> 0 THEN
+                UPDATE global_inventory SET potion_count = potion_count + delta;
+            END IF;
+            RETURN NULL;
+        END;
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER potion_count_insert AFTER INSERT ON potion_recipes
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION potion_count_apply()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER potion_count_update AFTER UPDATE ON potion_recipes
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION potion_count_apply()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER potion_count_delete AFTER DELETE ON potion_recipes
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION potion_count_apply()
+        """
+    )
+
+    op.execute(
+        """
+        UPDATE global_inventory
+        SET potion_count = (SELECT COALESCE(SUM(inventory), 0) FROM potion_recipes)
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER potion_count_delete ON potion_recipes")
+    op.execute("DROP TRIGGER potion_count_update ON potion_recipes")
+    op.execute("DROP TRIGGER potion_count_insert ON potion_recipes")
+    op.execute("DROP FUNCTION potion_count_apply()")
+    op.drop_column("global_inventory", "potion_count")
@@ -0,0 +1,170 @@
+"""shops table and shop_id on every game table
+
+Revision ID: 6e3d1b7a9f42
+Revises: f2a6c9e04b18
+Create Date: 2025-05-24 11:40:17.502816
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e3d1b7a9f42'
+down_revision: Union[str, None] = 'f2a6c9e04b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# existing rows, and anything inserted without a shop, belong to shop 1,
+# whose API key is API_KEY from the environment
+TENANT_TABLES = (
+    "global_inventory",
+    "potion_recipes",
+    "carts",
+    "cart_items",
+    "cache_versions",
+    "shop_events",
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "shops",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("name", sa.String(64), nullable=False, unique=True),
+        # hex sha256 of the shop's API key; NULL for shop 1
+        sa.Column("api_key_sha256", sa.String(64), unique=True),
+        sa.Column("created_at", sa.DateTime, server_default=sa.func.now()),
+    )
+    op.execute("INSERT INTO shops (id, name) VALUES (1, 'default')")
+    op.execute("SELECT setval(pg_get_serial_sequence('shops', 'id'), 1)")
+
+    # a constant default doesn't rewrite the tables
+    for table in TENANT_TABLES:
+        op.add_column(
+            table,
+            sa.Column(
+                "shop_id",
+                sa.Integer,
+                sa.ForeignKey("shops.id", ondelete="CASCADE"),
+                nullable=False,
+                server_default="1",
+            ),
+        )
+
+    op.create_unique_constraint(
+        "global_inventory_shop_id_key", "global_inventory", ["shop_id"]
+    )
+
+    op.drop_constraint("cache_versions_pkey", "cache_versions")
+    op.create_primary_key("cache_versions_pkey", "cache_versions", ["shop_id", "topic"])
+
+    # skus and mixes are unique within a shop; every recipe lookup leads with it
+    op.drop_constraint("potion_recipes_sku_key", "potion_recipes")
+    op.create_unique_constraint(
+        "potion_recipes_shop_id_sku_key", "potion_recipes", ["shop_id", "sku"]
+    )
+    op.drop_index("ix_potion_recipes_mix", table_name="potion_recipes")
+    op.create_index(
+        "ix_potion_recipes_mix",
+        "potion_recipes",
+        ["shop_id", "red_pct", "green_pct", "blue_pct", "dark_pct"],
+    )
+    op.drop_index("ix_potion_recipes_in_stock", table_name="potion_recipes")
+    op.create_index(
+        "ix_potion_recipes_in_stock",
+        "potion_recipes",
+        ["shop_id", "id"],
+        postgresql_where=sa.text("inventory > 0"),
+    )
+
+    # the trigger now moves each shop's potion_count by that shop's rows
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION potion_count_apply() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                UPDATE global_inventory g
+                SET potion_count = g.potion_count + d.delta
+                FROM (SELECT shop_id, SUM(inventory) AS delta
+                      FROM new_rows GROUP BY shop_id) d
+                WHERE g.shop_id = d.shop_id AND d.delta <> 0;
+            ELSIF TG_OP = 'DELETE' THEN
+                UPDATE global_inventory g
+                SET potion_count = g.potion_count - d.delta
+                FROM (SELECT shop_id, SUM(inventory) AS delta
+                      FROM old_rows GROUP BY shop_id) d
+                WHERE g.shop_id = d.shop_id AND d.delta <> 0;
+            ELSE
+                UPDATE global_inventory g
+                SET potion_count = g.potion_count + d.delta
+                FROM (SELECT shop_id, SUM(inventory) AS delta
+                      FROM (SELECT shop_id, inventory FROM new_rows
+                            UNION ALL
+                            SELECT shop_id, -inventory FROM old_rows) c
+                      GROUP BY shop_id) d
+                WHERE g.shop_id = d.shop_id AND d.delta <> 0;
+            END IF;
+            RETURN NULL;
+        END;
+        $$
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION potion_count_apply() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            delta bigint;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                SELECT COALESCE(SUM(inventory), 0) INTO delta FROM new_rows;
+            ELSIF TG_OP = 'DELETE' THEN
+                SELECT -COALESCE(SUM(inventory), 0) INTO delta FROM old_rows;
+            ELSE
+                SELECT COALESCE((SELECT SUM(inventory) FROM new_rows), 0)
+                     - COALESCE((SELECT SUM(inventory) FROM old_rows), 0)
+                INTO delta;
+            END IF;
+
+            IF delta <> 0 THEN
+                UPDATE global_inventory SET potion_count = potion_count + delta;
+            END IF;
+            RETURN NULL;
+        END;
+        $$
+        """
+    )
+
+    # only the default shop survives a downgrade
+    op.execute("DELETE FROM shops WHERE id <> 1")
+
+    op.drop_index("ix_potion_recipes_in_stock", table_name="potion_recipes")
+    op.create_index(
+        "ix_potion_recipes_in_stock",
+        "potion_recipes",
+        ["id"],
+        postgresql_where=sa.text("inventory > 0"),
+    )
+    op.drop_index("ix_potion_recipes_mix", table_name="potion_recipes")
+    op.create_index(
+        "ix_potion_recipes_mix",
+        "potion_recipes",
+        ["red_pct", "green_pct", "blue_pct", "dark_pct"],
+    )
+    op.drop_constraint("potion_recipes_shop_id_sku_key", "potion_recipes")
+    op.create_unique_constraint("potion_recipes_sku_key", "potion_recipes", ["sku"])
+
+    op.drop_constraint("cache_versions_pkey", "cache_versions")
+    op.create_primary_key("cache_versions_pkey", "cache_versions", ["topic"])
+
+    op.drop_constraint("global_inventory_shop_id_key", "global_inventory")
+    for table in reversed(TENANT_TABLES):
+        op.drop_column(table, "shop_id")
+    op.drop_table("shops")
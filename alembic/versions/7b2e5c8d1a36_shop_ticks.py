@@ -0,0 +1,64 @@
+"""shop_ticks time series and its daily rollups
+
+Revision ID: 7b2e5c8d1a36
+Revises: 6e3d1b7a9f42
+Create Date: 2025-05-26 10:21:44.918263
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2e5c8d1a36'
+down_revision: Union[str, None] = '6e3d1b7a9f42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# the state columns both tables carry; in shop_tick_rollups they hold the
+# day's last tick
+STATE = ("gold", "red_ml", "green_ml", "blue_ml", "dark_ml", "potion_count")
+
+
+def _shop_id() -> sa.Column:
+    return sa.Column(
+        "shop_id",
+        sa.Integer,
+        sa.ForeignKey("shops.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+
+
+def upgrade() -> None:
+    # one row per /info/current_time, never updated; ranges are read by
+    # (shop_id, at), the primary key
+    op.create_table(
+        "shop_ticks",
+        _shop_id(),
+        sa.Column("at", sa.DateTime, primary_key=True, server_default=sa.func.now()),
+        sa.Column("day", sa.String(16), nullable=False),
+        sa.Column("hour", sa.SmallInteger, nullable=False),
+        *(sa.Column(column, sa.Integer, nullable=False) for column in STATE),
+    )
+
+    # one row per shop and calendar day, rebuilt from that day's ticks by the
+    # events consumer; long ranges are charted from these
+    op.create_table(
+        "shop_tick_rollups",
+        _shop_id(),
+        sa.Column("date", sa.Date, primary_key=True),
+        sa.Column("ticks", sa.Integer, nullable=False),
+        sa.Column("last_at", sa.DateTime, nullable=False),
+        sa.Column("day", sa.String(16), nullable=False),
+        sa.Column("hour", sa.SmallInteger, nullable=False),
+        sa.Column("gold_min", sa.Integer, nullable=False),
+        sa.Column("gold_max", sa.Integer, nullable=False),
+        *(sa.Column(column, sa.Integer, nullable=False) for column in STATE),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("shop_tick_rollups")
+    op.drop_table("shop_ticks")
@@ -0,0 +1,53 @@
+"""shop_events outbox and consumer checkpoints
+
+Revision ID: 9a4c6e2b8d17
+Revises: 5d2a8f7e13c6
+Create Date: 2025-05-18 16:05:33.271904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4c6e2b8d17'
+down_revision: Union[str, None] = '5d2a8f7e13c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # txid is the writer's transaction id. Consumers read in (txid, id) order
+    # and only from transactions older than every one still running, so an
+    # event whose transaction commits late can't fall behind a checkpoint.
+    # sqlalchemy has no xid8 type, hence the raw DDL.
+    op.execute(
+        """
+        CREATE TABLE shop_events (
+            id bigserial PRIMARY KEY,
+            txid xid8 NOT NULL DEFAULT pg_current_xact_id(),
+            kind varchar(32) NOT NULL,
+            payload jsonb NOT NULL,
+            created_at timestamp DEFAULT now()
+        )
+        """
+    )
+    op.create_index("ix_shop_events_txid_id", "shop_events", ["txid", "id"])
+
+    op.execute(
+        """
+        CREATE TABLE event_checkpoints (
+            consumer varchar(32) PRIMARY KEY,
+            last_txid xid8 NOT NULL DEFAULT '0',
+            last_id bigint NOT NULL DEFAULT 0
+        )
+        """
+    )
+    op.execute(sa.text("INSERT INTO event_checkpoints (consumer) VALUES ('shop')"))
+
+
+def downgrade() -> None:
+    op.drop_table("event_checkpoints")
+    op.drop_table("shop_events")
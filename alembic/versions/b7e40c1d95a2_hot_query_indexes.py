@@ -0,0 +1,60 @@
+"""indexes for hot potion_recipes lookups
+
+Revision ID: b7e40c1d95a2
+Revises: 3c1f2a9d7b40
+Create Date: 2025-05-09 14:37:12.404118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e40c1d95a2'
+down_revision: Union[str, None] = '3c1f2a9d7b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# cart_items.cart_id (checkout) is already covered: it leads the unique
+# (cart_id, recipe_id) index.
+
+
+def upgrade() -> None:
+    # CONCURRENTLY can't run inside the migration transaction, and doesn't
+    # block writes while the shop is live
+    with op.get_context().autocommit_block():
+        # bottler._recipe_row and the recipe generator look recipes up by mix
+        op.create_index(
+            "ix_potion_recipes_mix",
+            "potion_recipes",
+            ["red_pct", "green_pct", "blue_pct", "dark_pct"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        # the catalog only ever wants the few recipes that are in stock
+        op.create_index(
+            "ix_potion_recipes_in_stock",
+            "potion_recipes",
+            ["id"],
+            postgresql_where=sa.text("inventory > 0"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_potion_recipes_in_stock",
+            table_name="potion_recipes",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_potion_recipes_mix",
+            table_name="potion_recipes",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,153 @@
+"""range-partition carts and cart_items by day
+
+Revision ID: c4f81a7e2d93
+Revises: 9a4c6e2b8d17
+Create Date: 2025-05-20 09:41:12.604518
+
+"""
+from datetime import date, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f81a7e2d93'
+down_revision: Union[str, None] = '9a4c6e2b8d17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# same naming and bounds as src.archive, which creates the partitions
+# after these ones
+PREMAKE_DAYS = 3
+
+
+def _create_partitions(first: date, last: date) -> None:
+    day = first
+    while day <= last:
+        for table in ("carts", "cart_items"):
+            op.execute(
+                f"CREATE TABLE {table}_p{day:%Y%m%d} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{day}') TO ('{day + timedelta(days=1)}')"
+            )
+        day += timedelta(days=1)
+
+
+def upgrade() -> None:
+    # Partitioned tables need the partition key in every unique constraint,
+    # so cart_items carries its cart's created_at and the keys grow a column.
+    op.rename_table("cart_items", "cart_items_old")
+    op.rename_table("carts", "carts_old")
+    for seq in ("carts_id_seq", "cart_items_id_seq"):
+        op.execute(f"ALTER SEQUENCE {seq} OWNED BY NONE")
+    for name in ("carts_pkey", "cart_items_pkey", "cart_items_cart_id_recipe_id_key"):
+        op.execute(f"ALTER INDEX {name} RENAME TO {name}_old")
+
+    op.execute(
+        """
+        CREATE TABLE carts (
+            id integer NOT NULL DEFAULT nextval('carts_id_seq'),
+            customer_id varchar(64) NOT NULL,
+            customer_name varchar(64),
+            created_at timestamp NOT NULL DEFAULT now(),
+            checked_out boolean DEFAULT false,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    op.execute(
+        """
+        CREATE TABLE cart_items (
+            id integer NOT NULL DEFAULT nextval('cart_items_id_seq'),
+            cart_id integer NOT NULL,
+            cart_created_at timestamp NOT NULL,
+            recipe_id integer
+                CONSTRAINT cart_items_recipe_id_fkey REFERENCES potion_recipes (id),
+            quantity integer NOT NULL
+                CONSTRAINT cart_items_quantity_check CHECK (quantity > 0),
+            PRIMARY KEY (id, cart_created_at),
+            UNIQUE (cart_id, recipe_id, cart_created_at),
+            FOREIGN KEY (cart_id, cart_created_at)
+                REFERENCES carts (id, created_at) ON DELETE CASCADE
+        ) PARTITION BY RANGE (cart_created_at)
+        """
+    )
+    op.execute("ALTER SEQUENCE carts_id_seq OWNED BY carts.id")
+    op.execute("ALTER SEQUENCE cart_items_id_seq OWNED BY cart_items.id")
+
+    # one partition per day from the oldest cart on, plus a default so an
+    # insert never fails if the maintenance job falls behind
+    oldest, today = op.get_bind().execute(
+        sa.text("SELECT min(created_at)::date, current_date FROM carts_old")
+    ).one()
+    _create_partitions(min(oldest or today, today), today + timedelta(days=PREMAKE_DAYS))
+    op.execute("CREATE TABLE carts_default PARTITION OF carts DEFAULT")
+    op.execute("CREATE TABLE cart_items_default PARTITION OF cart_items DEFAULT")
+
+    op.execute(
+        """
+        INSERT INTO carts (id, customer_id, customer_name, created_at, checked_out)
+        SELECT id, customer_id, customer_name, COALESCE(created_at, now()), checked_out
+        FROM carts_old
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO cart_items (id, cart_id, cart_created_at, recipe_id, quantity)
+        SELECT ci.id, ci.cart_id, c.created_at, ci.recipe_id, ci.quantity
+        FROM cart_items_old ci
+        JOIN carts c ON c.id = ci.cart_id
+        """
+    )
+    op.drop_table("cart_items_old")
+    op.drop_table("carts_old")
+
+
+def downgrade() -> None:
+    op.execute("ALTER SEQUENCE carts_id_seq OWNED BY NONE")
+    op.execute("ALTER SEQUENCE cart_items_id_seq OWNED BY NONE")
+    op.rename_table("cart_items", "cart_items_part")
+    op.rename_table("carts", "carts_part")
+    for name in ("carts_pkey", "cart_items_pkey"):
+        op.execute(f"ALTER INDEX {name} RENAME TO {name}_part")
+
+    op.execute(
+        """
+        CREATE TABLE carts (
+            id integer PRIMARY KEY DEFAULT nextval('carts_id_seq'),
+            customer_id varchar(64) NOT NULL,
+            customer_name varchar(64),
+            created_at timestamp DEFAULT now(),
+            checked_out boolean DEFAULT false
+        )
+        """
+    )
+    op.execute(
+        """
+        CREATE TABLE cart_items (
+            id integer PRIMARY KEY DEFAULT nextval('cart_items_id_seq'),
+            cart_id integer REFERENCES carts (id) ON DELETE CASCADE,
+            recipe_id integer REFERENCES potion_recipes (id),
+            quantity integer NOT NULL CHECK (quantity > 0),
+            UNIQUE (cart_id, recipe_id)
+        )
+        """
+    )
+    op.execute("ALTER SEQUENCE carts_id_seq OWNED BY carts.id")
+    op.execute("ALTER SEQUENCE cart_items_id_seq OWNED BY cart_items.id")
+    op.execute(
+        """
+        INSERT INTO carts (id, customer_id, customer_name, created_at, checked_out)
+        SELECT id, customer_id, customer_name, created_at, checked_out FROM carts_part
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO cart_items (id, cart_id, recipe_id, quantity)
+        SELECT id, cart_id, recipe_id, quantity FROM cart_items_part
+        """
+    )
+    # dropping the partitioned parents drops every partition with them
+    op.drop_table("cart_items_part")
+    op.drop_table("carts_part")
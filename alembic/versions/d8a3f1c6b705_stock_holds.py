@@ -0,0 +1,152 @@
+"""stock_holds, and potion_recipes.reserved kept in step by trigger
+
+Revision ID: d8a3f1c6b705
+Revises: 7b2e5c8d1a36
+Create Date: 2025-05-27 15:48:02.640915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8a3f1c6b705'
+down_revision: Union[str, None] = '7b2e5c8d1a36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # a cart's claim on stock until it checks out or the hold expires
+    op.create_table(
+        "stock_holds",
+        # no foreign key to carts: it would have to carry the partition key.
+        # A hold expires long before its cart is swept.
+        sa.Column("cart_id", sa.Integer, primary_key=True),
+        sa.Column(
+            "recipe_id",
+            sa.Integer,
+            sa.ForeignKey("potion_recipes.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column(
+            "shop_id",
+            sa.Integer,
+            sa.ForeignKey("shops.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("quantity", sa.Integer, nullable=False),
+        sa.Column("expires_at", sa.DateTime, nullable=False),
+        sa.CheckConstraint("quantity > 0"),
+    )
+    op.create_index("ix_stock_holds_expires_at", "stock_holds", ["expires_at"])
+    op.create_index("ix_stock_holds_recipe_id", "stock_holds", ["recipe_id"])
+    op.create_index("ix_stock_holds_shop_id", "stock_holds", ["shop_id"])
+
+    # the sum of a recipe's holds. The CHECK is what makes a hold or a sale
+    # that would oversell fail, however the statements interleave.
+    op.add_column(
+        "potion_recipes",
+        sa.Column("reserved", sa.Integer, nullable=False, server_default="0"),
+    )
+    op.create_check_constraint(
+        "potion_recipes_reserved_check",
+        "potion_recipes",
+        "reserved >= 0 AND reserved <= inventory",
+    )
+
+    # in stock now means some of it isn't held
+    op.drop_index("ix_potion_recipes_in_stock", table_name="potion_recipes")
+    op.create_index(
+        "ix_potion_recipes_in_stock",
+        "potion_recipes",
+        ["shop_id", "id"],
+        postgresql_where=sa.text("inventory > reserved"),
+    )
+
+    # Statement-level, like potion_count: releasing a thousand expired holds
+    # is one update per recipe. Recipes are updated one at a time in id
+    # order, as checkout sells them, so a bulk release and a checkout can't
+    # deadlock. (A single UPDATE ... FROM locks in whatever order its plan
+    # reads, and locking first in a subquery takes each row twice.)
+    op.execute(
+        """
+        CREATE FUNCTION reserved_add(ids integer[], deltas bigint[]) RETURNS void
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            c record;
+        BEGIN
+            FOR c IN
+                SELECT id, SUM(delta) AS delta
+                FROM unnest(ids, deltas) AS u(id, delta)
+                GROUP BY id
+                HAVING SUM(delta) <> 0
+                ORDER BY id
+            LOOP
+                UPDATE potion_recipes SET reserved = reserved + c.delta WHERE id = c.id;
+            END LOOP;
+        END;
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE FUNCTION reserved_apply() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                PERFORM reserved_add(array_agg(recipe_id), array_agg(quantity::bigint))
+                FROM new_rows;
+            ELSIF TG_OP = 'DELETE' THEN
+                PERFORM reserved_add(array_agg(recipe_id), array_agg(-quantity::bigint))
+                FROM old_rows;
+            ELSE
+                PERFORM reserved_add(array_agg(recipe_id), array_agg(delta))
+                FROM (SELECT recipe_id, quantity::bigint AS delta FROM new_rows
+                      UNION ALL
+                      SELECT recipe_id, -quantity FROM old_rows) c;
+            END IF;
+            RETURN NULL;
+        END;
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER reserved_insert AFTER INSERT ON stock_holds
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION reserved_apply()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER reserved_update AFTER UPDATE ON stock_holds
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION reserved_apply()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER reserved_delete AFTER DELETE ON stock_holds
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION reserved_apply()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("stock_holds")  # its triggers go with it
+    op.execute("DROP FUNCTION reserved_apply()")
+    op.execute("DROP FUNCTION reserved_add(integer[], bigint[])")
+
+    op.drop_index("ix_potion_recipes_in_stock", table_name="potion_recipes")
+    op.create_index(
+        "ix_potion_recipes_in_stock",
+        "potion_recipes",
+        ["shop_id", "id"],
+        postgresql_where=sa.text("inventory > 0"),
+    )
+    op.drop_constraint("potion_recipes_reserved_check", "potion_recipes")
+    op.drop_column("potion_recipes", "reserved")
@@ -0,0 +1,33 @@
+"""index open carts by age for the abandoned-cart sweeper
+
+Revision ID: f2a6c9e04b18
+Revises: c4f81a7e2d93
+Create Date: 2025-05-21 14:12:08.337190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a6c9e04b18'
+down_revision: Union[str, None] = 'c4f81a7e2d93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Postgres can't build an index on a partitioned table CONCURRENTLY; the
+    # live partitions only hold a few days of carts, so this is quick.
+    op.create_index(
+        "ix_carts_open_created_at",
+        "carts",
+        ["created_at"],
+        postgresql_where=sa.text("NOT checked_out"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_carts_open_created_at", table_name="carts")
@@ -0,0 +1,139 @@
+"""
+Checkout latency while the shop is flooded with browsing.
+
+    python -m bench.bench_admission
+    python -m bench.bench_admission --url http://127.0.0.1:3000 --browsers 200 --checkouts 300
+
+Needs a running server (`uv run main.py`). Run it once as is and once with
+ADMISSION_MAX_INFLIGHT=0 to see what admission control buys.
+
+Opens a throwaway shop (deleted again at the end) with one potion in stock
+and --checkouts carts holding one each. Then --browsers clients loop over
+catalog, new cart, add item as fast as the server answers, while the carts
+are checked out a few at a time. Checkout p99 should stay near its idle
+value with admission on, and climb with the flood when it's off; the
+browsing that doesn't fit is shed as 503s instead.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+import sqlalchemy as sa
+
+from src import database as db
+from src import invalidation, tenancy
+
+SKU = "RED"
+
+
+def open_shop() -> tuple[int, str]:
+    shop_id, key = tenancy.create("bench-admission")
+    with db.engine.begin() as conn:
+        conn.execute(
+            sa.text(
+                "INSERT INTO potion_recipes "
+                "(shop_id, sku, name, price, red_pct, green_pct, blue_pct, dark_pct, inventory) "
+                "VALUES (:shop, :sku, 'red', 50, 100, 0, 0, 0, 10000)"
+            ),
+            {"shop": shop_id, "sku": SKU},
+        )
+        with tenancy.using(shop_id):
+            invalidation.publish(conn, invalidation.RECIPES)
+    return shop_id, key
+
+
+async def browse(
+    client: httpx.AsyncClient, stop: asyncio.Event, statuses: dict, latencies: list
+) -> None:
+    async def call(method: str, path: str, **kwargs):
+        t0 = time.perf_counter()
+        response = await client.request(method, path, **kwargs)
+        latencies.append(time.perf_counter() - t0)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        return response
+
+    while not stop.is_set():
+        await call("GET", "/catalog/")
+        cart = await call("POST", "/carts/", json={"customer_id": "browser"})
+        if cart.status_code == 200:
+            await call("POST", f"/carts/{cart.json()['cart_id']}/items/{SKU}", json={"quantity": 1})
+
+
+async def check_out(client: httpx.AsyncClient, carts: list[int], latencies: list) -> None:
+    for cart in carts:
+        t0 = time.perf_counter()
+        response = await client.post(f"/carts/{cart}/checkout")
+        latencies.append(time.perf_counter() - t0)
+        response.raise_for_status()
+        await asyncio.sleep(0.01)
+
+
+async def run(args, key: str) -> None:
+    limits = httpx.Limits(max_connections=args.browsers + args.parallel)
+    async with httpx.AsyncClient(
+        base_url=args.url, headers={"access_token": key}, limits=limits, timeout=60
+    ) as client:
+        carts = []
+        for _ in range(args.checkouts):
+            cart = (await client.post("/carts/", json={"customer_id": "buyer"})).json()["cart_id"]
+            await client.post(f"/carts/{cart}/items/{SKU}", json={"quantity": 1})
+            carts.append(cart)
+
+        idle: list[float] = []
+        await check_out(client, carts[: args.parallel * 5], idle)
+        carts = carts[args.parallel * 5 :]
+
+        statuses: dict[int, int] = {}
+        browsing: list[float] = []
+        flooded: list[float] = []
+        stop = asyncio.Event()
+        browsers = [
+            asyncio.create_task(browse(client, stop, statuses, browsing))
+            for _ in range(args.browsers)
+        ]
+        await asyncio.sleep(1)  # let the flood build up
+        t0 = time.perf_counter()
+        await asyncio.gather(
+            *(check_out(client, carts[i :: args.parallel], flooded) for i in range(args.parallel))
+        )
+        elapsed = time.perf_counter() - t0
+        # let browsers finish their current request: cancelling httpx
+        # mid-request can leave the pool closing forever
+        stop.set()
+        await asyncio.gather(*browsers)
+
+    def row(name: str, latencies: list[float]) -> str:
+        q = statistics.quantiles(latencies, n=100)
+        return f"{name:<20}{len(latencies):>8}{q[49] * 1000:>10.1f}{q[98] * 1000:>10.1f}"
+
+    print(f"{'':<20}{'n':>8}{'p50':>10}{'p99':>10}  (ms)")
+    print(row("checkout, idle", idle))
+    print(row("checkout, flooded", flooded))
+    print(row("browsing", browsing))
+    shed = statuses.get(503, 0)
+    print(
+        f"\nbrowsing: {len(browsing) / elapsed:.0f} req/s, "
+        f"{shed} shed (503, {shed / max(1, len(browsing)):.0%}), statuses {dict(sorted(statuses.items()))}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://127.0.0.1:3000")
+    parser.add_argument("--browsers", type=int, default=100, help="concurrent browsing clients")
+    parser.add_argument("--checkouts", type=int, default=200)
+    parser.add_argument("--parallel", type=int, default=4, help="concurrent checkouts")
+    args = parser.parse_args()
+
+    shop_id, key = open_shop()
+    try:
+        asyncio.run(run(args, key))
+    finally:
+        tenancy.delete(shop_id)
+
+
+if __name__ == "__main__":
+    main()
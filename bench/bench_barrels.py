@@ -0,0 +1,103 @@
+"""
+Latency and memory of ingesting a large wholesale barrel catalog, as
+List[Barrel] models (what FastAPI used to build from the body) and as
+BarrelColumns. No database needed.
+
+    python -m bench.bench_barrels
+    python -m bench.bench_barrels --barrels 50000 -n 20
+
+Latency is the median of -n runs of parsing + validating the body, and of
+planning over the result. Memory is measured with tracemalloc: peak while
+parsing, and what stays allocated for as long as the handler holds the
+catalog.
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from typing import List
+
+from pydantic import TypeAdapter
+
+from src.api.barrels import Barrel, BarrelColumns, create_barrel_plan
+
+MIXES = [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1], [0.5, 0.5, 0, 0]]
+
+
+def catalog_json(n: int) -> bytes:
+    rng = random.Random(0)
+    return json.dumps(
+        [
+            {
+                "sku": f"BARREL_{i}",
+                "ml_per_barrel": rng.choice([500, 1000, 2500, 10000]),
+                "potion_type": rng.choice(MIXES),
+                "price": rng.randint(10, 800),
+                "quantity": rng.randint(1, 30),
+            }
+            for i in range(n)
+        ]
+    ).encode()
+
+
+def _as_models(body: bytes):
+    # FastAPI parses the body with json.loads, then validates the python objects
+    return TypeAdapter(List[Barrel]).validate_python(json.loads(body))
+
+
+def _as_columns(body: bytes):
+    return BarrelColumns.from_json(body)
+
+
+def _plan_models(catalog: List[Barrel]) -> None:
+    # the planner as it was before BarrelColumns, over the models directly
+    candidates = [b for b in catalog if b.potion_type[0] == 1]
+    candidates.sort(key=lambda b: (b.ml_per_barrel, b.price))
+    next((b for b in candidates if b.price <= 1000), None)
+
+
+def _plan_columns(catalog: BarrelColumns) -> None:
+    create_barrel_plan(1000, 0, 0, 0, catalog)
+
+
+def run(label: str, parse, plan, body: bytes, runs: int) -> None:
+    parse_times, plan_times = [], []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        catalog = parse(body)
+        t1 = time.perf_counter()
+        plan(catalog)
+        parse_times.append(t1 - t0)
+        plan_times.append(time.perf_counter() - t1)
+
+    tracemalloc.start()
+    catalog = parse(body)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del catalog
+
+    print(
+        f"{label:<10}{statistics.median(parse_times) * 1000:>12.1f}"
+        f"{statistics.median(plan_times) * 1000:>12.2f}"
+        f"{peak / 2**20:>12.2f}{retained / 2**20:>12.2f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--barrels", type=int, default=10_000)
+    parser.add_argument("-n", "--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    body = catalog_json(args.barrels)
+    print(f"{args.barrels} barrels, {len(body) / 2**20:.2f} MiB of JSON")
+    print(f"{'ingest':<10}{'parse ms':>12}{'plan ms':>12}{'peak MiB':>12}{'held MiB':>12}")
+    run("models", _as_models, _plan_models, body, args.runs)
+    run("columns", _as_columns, _plan_columns, body, args.runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+CPU per response for the catalog and plan endpoints, before and after the
+fast serialization path. No database needed.
+
+    python -m bench.bench_serialization -n 20000
+
+  models      build the models in the handler, then FastAPI re-validates them
+              against response_model and encodes with jsonable_encoder + json
+  adapter     TypeAdapter.dump_json on the already-built models (plan endpoints)
+  cached      the catalog body encoded once per recipes version (cache hit)
+"""
+
+import argparse
+import asyncio
+import time
+from typing import List, TypedDict
+
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from starlette.responses import JSONResponse
+
+from src.api.bottler import PotionMixes, _PLAN
+from src.api.catalog import CatalogItem, _encode_catalog
+from src.api.responses import json_bytes_response, json_response
+
+class _Row(TypedDict):
+    # a catalog query row
+    sku: str
+    name: str
+    inventory: int
+    price: int
+    red_pct: int
+    green_pct: int
+    blue_pct: int
+    dark_pct: int
+
+
+ROWS: list[_Row] = [
+    {"sku": f"R{r}G{100 - r}B0D0", "name": f"mix {r}", "inventory": 5, "price": 50,
+     "red_pct": r, "green_pct": 100 - r, "blue_pct": 0, "dark_pct": 0}
+    for r in range(0, 60, 10)
+]  # the catalog holds at most 6 items
+PLAN = [PotionMixes(potion_type=[r, 100 - r, 0, 0], quantity=1) for r in range(0, 100, 2)]
+
+
+def _catalog_models():
+    return [
+        CatalogItem(sku=row["sku"], name=row["name"], quantity=row["inventory"],
+                    price=row["price"],
+                    potion_type=[row["red_pct"], row["green_pct"],
+                                 row["blue_pct"], row["dark_pct"]])
+        for row in ROWS
+    ]
+
+
+async def _via_fastapi(field, build, n: int) -> float:
+    started = time.process_time()
+    for _ in range(n):
+        content = await serialize_response(field=field, response_content=build())
+        JSONResponse(content).body
+    return time.process_time() - started
+
+
+def _direct(respond, n: int) -> float:
+    started = time.process_time()
+    for _ in range(n):
+        respond().body
+    return time.process_time() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", "--responses", type=int, default=20_000)
+    args = parser.parse_args()
+    n = args.responses
+
+    catalog_field = create_model_field("Response_get_catalog", List[CatalogItem])
+    plan_field = create_model_field("Response_get_bottle_plan", List[PotionMixes])
+    body = _encode_catalog(ROWS)
+
+    results = [
+        ("catalog", "models", asyncio.run(_via_fastapi(catalog_field, _catalog_models, n))),
+        ("catalog", "cached", _direct(lambda: json_bytes_response(body), n)),
+        ("bottler plan (50)", "models", asyncio.run(_via_fastapi(plan_field, lambda: PLAN, n))),
+        ("bottler plan (50)", "adapter", _direct(lambda: json_response(_PLAN, PLAN), n)),
+    ]
+    print(f"{'endpoint':<20}{'path':<10}{'us/response':>12}")
+    for endpoint, path, cpu in results:
+        print(f"{endpoint:<20}{path:<10}{cpu / n * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Cold-start benchmark: import src.api.server and serve the first request in a
+fresh interpreter, the way a new serverless instance does.
+
+    python -m bench.bench_startup            # / and /catalog/, 10 runs each
+    python -m bench.bench_startup -n 20 /    # just the root route
+
+Each run is a new process. The request goes straight to the ASGI app, so no
+HTTP client library is imported before the clock starts. /catalog/ needs a
+migrated database at POSTGRES_URI.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CHILD = r"""
+import asyncio, json, sys, time
+t0 = time.perf_counter()
+from src.api.server import app
+t1 = time.perf_counter()
+
+async def first_response(path):
+    from src import config
+    api_key = config.get_settings().API_KEY
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": b"", "server": ("bench", 80),
+        "client": ("bench", 1), "headers": [(b"access_token", api_key.encode())],
+    }
+    status = {}
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+    await app(scope, receive, send)
+    return status["code"]
+
+code = asyncio.run(first_response(sys.argv[1]))
+t2 = time.perf_counter()
+print(json.dumps({"status": code, "import": t1 - t0, "first_response": t2 - t1, "total": t2 - t0}))
+"""
+
+
+def run_once(path: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, path],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("paths", nargs="*", default=["/", "/catalog/"])
+    parser.add_argument("-n", "--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    run_once("/")  # warm the OS page cache and .pyc files
+    print(f"{'path':<12}{'import ms':>12}{'1st resp ms':>14}{'total ms':>12}  status")
+    for path in args.paths:
+        runs = [run_once(path) for _ in range(args.runs)]
+        med = {k: statistics.median(r[k] for r in runs) * 1000 for k in ("import", "first_response", "total")}
+        print(
+            f"{path:<12}{med['import']:>12.1f}{med['first_response']:>14.1f}{med['total']:>12.1f}"
+            f"  {sorted({r['status'] for r in runs})}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Per-statement latency on the checkout and catalog paths, before and after the
+query registry.
+
+    python -m bench.bench_statements -n 2000
+
+Three variants per statement:
+  inline    a new sqlalchemy.text() per call and no server-side prepare (the old handlers)
+  registry  the src.queries constant, still unprepared (DB_PREPARE_THRESHOLD=none)
+  prepared  the src.queries constant with prepare_threshold=0
+
+Everything runs in one transaction that is rolled back, so the database is
+left as it was.
+"""
+
+import argparse
+import statistics
+import time
+
+import sqlalchemy as sa
+
+from src import config, queries
+
+CHECKOUT_PATH = [
+    "RECIPE_BY_SKU",
+    "CART_SET_ITEM",
+    "CART_ITEMS_FOR_CHECKOUT",
+    "RECIPE_REMOVE_STOCK",
+    "INVENTORY_ADD_GOLD",
+    "CART_MARK_CHECKED_OUT",
+]
+CATALOG_PATH = ["CATALOG"]
+
+
+def _seed(conn) -> dict:
+    rid = conn.execute(
+        sa.text(
+            """
+            INSERT INTO potion_recipes (sku, name, price, red_pct, green_pct, blue_pct, dark_pct, inventory)
+            VALUES ('BENCH_POTION', 'bench', 1, 0, 0, 0, 100, 1000000000)
+            ON CONFLICT (shop_id, sku) DO UPDATE SET inventory = 1000000000
+            RETURNING id
+            """
+        )
+    ).scalar_one()
+    cid = conn.execute(
+        queries.CART_CREATE, {"shop": 1, "cid": "bench", "cname": "bench"}
+    ).scalar_one()
+    conn.execute(queries.CART_SET_ITEM, {"shop": 1, "cid": cid, "rid": rid, "qty": 1})
+    return {"shop": 1, "s": "BENCH_POTION", "rid": rid, "cid": cid, "qty": 1, "g": 0}
+
+
+def _params(stmt: sa.TextClause, sample: dict) -> dict:
+    return {k: sample[k] for k in stmt._bindparams}
+
+
+def run(threshold, inline: bool, names: list[str], n: int) -> dict[str, float]:
+    engine = sa.create_engine(
+        config.get_settings().POSTGRES_URI,
+        connect_args={"prepare_threshold": threshold},
+    )
+    result = {}
+    with engine.connect() as conn:
+        trans = conn.begin()
+        sample = _seed(conn)
+        for name in names:
+            stmt = getattr(queries, name)
+            params = _params(stmt, sample)
+            sql = stmt.text
+            for _ in range(20):  # warm-up, and past any prepare threshold
+                conn.execute(stmt, params)
+            times = []
+            for _ in range(n):
+                t0 = time.perf_counter()
+                res = conn.execute(sa.text(sql) if inline else stmt, params)
+                if res.returns_rows:
+                    res.all()
+                times.append(time.perf_counter() - t0)
+            result[name] = statistics.median(times) * 1e6
+        trans.rollback()
+    engine.dispose()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", "--runs", type=int, default=1000)
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    names = CHECKOUT_PATH + CATALOG_PATH
+    settings = {"inline": (None, True), "registry": (None, False), "prepared": (0, False)}
+    variants: dict[str, dict[str, float]] = {v: {} for v in settings}
+    for _ in range(args.repeat):  # best of several passes, to damp noise
+        for v, (threshold, inline) in settings.items():
+            for name, us in run(threshold, inline, names, args.runs).items():
+                variants[v][name] = min(us, variants[v].get(name, us))
+    print(f"{'statement (median us)':<26}" + "".join(f"{v:>10}" for v in variants))
+    for name in names:
+        print(f"{name:<26}" + "".join(f"{variants[v][name]:>10.1f}" for v in variants))
+    for label, path in (("checkout path", CHECKOUT_PATH), ("catalog path", CATALOG_PATH)):
+        print(f"{label:<26}" + "".join(f"{sum(variants[v][s] for s in path):>10.1f}" for v in variants))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Per-request latency as one process serves more shops.
+
+    python -m bench.bench_tenants
+    python -m bench.bench_tenants --tenants 1 10 50 -n 3000
+
+Opens the largest --tenants count of throwaway shops (deleted again at the
+end), each with the --step recipe book and two potions in stock. Then, for
+each count, runs -n requests through the app in-process (TestClient, cache
+listener running) as a customer session: catalog, audit, new cart, add an
+item, checkout, each from a shop picked at random among the first `count`.
+
+Latency per request should not move with the tenant count: every shop runs
+the same prepared statements over the shared pool, and the per-shop caches
+are just more dictionary entries.
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+import sqlalchemy as sa
+from fastapi.testclient import TestClient
+
+from src import database as db
+from src import invalidation, recipe_gen, tenancy
+from src.api.server import app
+
+IN_STOCK = ("R100G0B0D0", "R0G100B0D0")
+
+
+def open_shops(count: int, step: int) -> list[tuple[int, dict]]:
+    shops = []
+    for i in range(count):
+        shop_id, key = tenancy.create(f"bench-tenant-{i}")
+        with tenancy.using(shop_id):
+            recipe_gen.load(step)
+        shops.append((shop_id, {"access_token": key}))
+    with db.engine.begin() as conn:
+        conn.execute(
+            sa.text(
+                "UPDATE potion_recipes SET inventory = 10000 "
+                "WHERE shop_id = ANY(:shops) AND sku = ANY(:skus)"
+            ),
+            {"shops": [s for s, _ in shops], "skus": list(IN_STOCK)},
+        )
+        invalidation.publish_all_shops(conn, invalidation.RECIPES)
+    return shops
+
+
+def session(client: TestClient, headers: dict, latencies: list[float]) -> None:
+    def timed(method: str, path: str, **kwargs):
+        t0 = time.perf_counter()
+        response = client.request(method, path, headers=headers, **kwargs)
+        latencies.append(time.perf_counter() - t0)
+        response.raise_for_status()
+        return response
+
+    timed("GET", "/catalog/")
+    timed("GET", "/inventory/audit")
+    cart = timed("POST", "/carts/", json={"customer_id": "bench"}).json()["cart_id"]
+    timed("POST", f"/carts/{cart}/items/{random.choice(IN_STOCK)}", json={"quantity": 1})
+    timed("POST", f"/carts/{cart}/checkout")
+
+
+def run(client: TestClient, shops: list, requests: int) -> None:
+    latencies: list[float] = []
+    for _ in range(20):  # warm every connection's prepared statements
+        session(client, random.choice(shops)[1], [])
+    while len(latencies) < requests:
+        session(client, random.choice(shops)[1], latencies)
+
+    q = statistics.quantiles(latencies, n=100)
+    print(
+        f"{len(shops):<10}{statistics.mean(latencies) * 1000:>10.2f}"
+        f"{q[49] * 1000:>10.2f}{q[94] * 1000:>10.2f}{q[98] * 1000:>10.2f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tenants", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("-n", "--requests", type=int, default=2000)
+    parser.add_argument("--step", type=int, default=10, help="recipe_gen granularity")
+    args = parser.parse_args()
+
+    shops = open_shops(max(args.tenants), args.step)
+    try:
+        with TestClient(app) as client:
+            print(f"{'tenants':<10}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}  (ms)")
+            for count in sorted(args.tenants):
+                run(client, shops[:count], args.requests)
+    finally:
+        for shop_id, _ in shops:
+            tenancy.delete(shop_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""
+Replay game ticks against a running shop and report latency per endpoint.
+
+    uv run main.py                                  # the app, in another terminal
+    python -m bench.replay                          # 10 synthetic ticks
+    python -m bench.replay --ticks 50 --customers 40 --concurrency 16
+    python -m bench.replay --record ticks.jsonl     # write the synthetic ticks out
+    python -m bench.replay --from ticks.jsonl       # replay recorded traffic
+    python -m bench.replay --save main              # keep this run as a baseline
+    python -m bench.replay --compare main           # diff this run against it
+    python -m bench.replay --in-process             # no server: the app in this process
+
+A tick is what the game server sends every two hours. Customers browse the
+catalog, open a cart, add items and (mostly) check out: --customers sessions
+per tick, --concurrency of them at a time. Then the shop gets its time
+update and its barrel and bottler plan/deliver calls, one after another, and
+an audit. The run starts with POST /admin/reset unless --no-reset; restore a
+snapshot first (python -m src.snapshots restore NAME) for a bigger state.
+
+Recorded traffic is JSONL, one request per line:
+
+    {"tick": 3, "session": "c17", "method": "POST", "path": "/carts/", "json": {...}}
+
+Ticks run in order. Within a tick, lines that share a session run in order
+and sessions run concurrently; lines without one run afterwards, in order.
+Paths and bodies may refer to what a session saw earlier:
+
+    {cart_id}   the id the session's POST /carts/ returned
+    {sku}       a random in-stock sku from the session's last GET /catalog/
+    "$plan"     (as the body) what the preceding plan call returned, so a
+                deliver brings exactly what the shop asked for
+
+A line that can't be resolved (empty catalog, nothing planned) is skipped
+and counted. Recorded lines with literal ids also work if the POST /carts/
+line kept its response ("response": {"cart_id": 17}): /carts/17/... is
+rewritten to the cart this run created in its place.
+
+Results are grouped by route (/carts/{cart_id}/checkout). Baselines are JSON
+files under bench/baselines/. --compare flags every route whose p95 got more
+than --tolerance percent slower, and exits 1 if there is one.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import statistics
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from src import config
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+
+DAYS = ("Hearthday", "Crownday", "Blesseday", "Soulday", "Edgeday", "Bloomday", "Arcanaday")
+
+# what the barrel plan is offered every tick
+WHOLESALE = [
+    {"sku": f"{size}_{colour.upper()}_BARREL", "ml_per_barrel": ml,
+     "potion_type": mix, "price": price, "quantity": 10}
+    for size, ml, price in (("SMALL", 500, 100), ("MEDIUM", 2500, 250), ("LARGE", 10000, 500))
+    for colour, mix in (("red", [1, 0, 0, 0]), ("green", [0, 1, 0, 0]),
+                        ("blue", [0, 0, 1, 0]), ("dark", [0, 0, 0, 1]))
+]
+
+_ID = re.compile(r"/\d+(?=/|$)")
+_ITEM_SKU = re.compile(r"/items/[^/]+$")
+_CART = re.compile(r"^/carts/(\d+)(?=/)")
+
+
+@dataclass
+class Call:
+    tick: int
+    method: str
+    path: str
+    json: Any = None
+    session: str | None = None
+    response: Any = None  # as recorded, only used to map literal cart ids
+
+    @property
+    def route(self) -> str:
+        path = _ITEM_SKU.sub("/items/{sku}", self.path)
+        if path.startswith("/carts/"):
+            return _ID.sub("/{cart_id}", path, count=1)
+        return _ID.sub("/{order_id}", path)
+
+
+def synthesize(ticks: int, customers: int, seed: int = 0) -> list[Call]:
+    rng = random.Random(seed)
+    calls = []
+    for t in range(ticks):
+        for c in range(customers):
+            s = f"t{t}c{c}"
+            calls += [
+                Call(t, "GET", "/catalog/", session=s),
+                Call(t, "POST", "/carts/", {"customer_id": s, "customer_name": "replay"}, s),
+            ]
+            for _ in range(rng.randint(1, 3)):
+                calls.append(
+                    Call(t, "POST", "/carts/{cart_id}/items/{sku}",
+                         {"quantity": rng.randint(1, 2)}, s)
+                )
+            if rng.random() < 0.8:
+                calls.append(Call(t, "POST", "/carts/{cart_id}/checkout", session=s))
+        calls += [
+            Call(t, "POST", "/info/current_time",
+                 {"day": DAYS[t // 12 % len(DAYS)], "hour": t % 12 * 2}),
+            Call(t, "POST", "/barrels/plan", WHOLESALE),
+            Call(t, "POST", f"/barrels/deliver/{t + 1}", "$plan"),
+            Call(t, "POST", "/bottler/plan"),
+            Call(t, "POST", f"/bottler/deliver/{t + 1}", "$plan"),
+            Call(t, "GET", "/inventory/audit"),
+        ]
+    return calls
+
+
+def load(path: Path) -> list[Call]:
+    with open(path) as f:
+        return [Call(**json.loads(line)) for line in f if line.strip()]
+
+
+def record(calls: list[Call], path: Path) -> None:
+    with open(path, "w") as f:
+        for c in calls:
+            f.write(json.dumps({k: v for k, v in asdict(c).items() if v is not None}) + "\n")
+
+
+@dataclass
+class Stats:
+    latencies: list[float] = field(default_factory=list)
+    client_errors: int = 0
+    server_errors: int = 0  # 5xx, or no response at all
+
+    def add(self, seconds: float, status: int) -> None:
+        self.latencies.append(seconds)
+        if 400 <= status < 500:
+            self.client_errors += 1
+        elif status >= 500 or status == 0:
+            self.server_errors += 1
+
+
+def _percentiles(latencies: list[float]) -> tuple[float, float, float]:
+    if len(latencies) < 2:
+        return (latencies[0],) * 3 if latencies else (0.0,) * 3
+    q = statistics.quantiles(latencies, n=100, method="inclusive")
+    return q[49], q[94], q[98]
+
+
+class Replayer:
+    def __init__(self, client: httpx.AsyncClient, concurrency: int, seed: int = 0):
+        self.client = client
+        self.sessions = asyncio.Semaphore(concurrency)
+        self.rng = random.Random(seed)
+        self.stats: dict[str, Stats] = {}
+        self.skipped = 0
+        self.cart_ids: dict[int, int] = {}  # recorded id -> id in this run
+
+    def _path(self, call: Call, seen: dict) -> str | None:
+        path = call.path
+        if "{cart_id}" in path:
+            if "cart_id" not in seen:
+                return None
+            path = path.replace("{cart_id}", str(seen["cart_id"]))
+        if "{sku}" in path:
+            if not seen.get("skus"):
+                return None
+            path = path.replace("{sku}", self.rng.choice(seen["skus"]))
+        m = _CART.match(path)
+        if m and int(m[1]) in self.cart_ids:
+            path = f"/carts/{self.cart_ids[int(m[1])]}{path[m.end():]}"
+        return path
+
+    def _body(self, call: Call, seen: dict) -> tuple[bool, Any]:
+        if call.json != "$plan":
+            return True, call.json
+        offered, ordered = seen.get("plan", (None, None))
+        if not ordered:
+            return False, None
+        if isinstance(offered, list) and offered and "ml_per_barrel" in offered[0]:
+            # barrel orders name a sku; deliver the barrels themselves
+            by_sku = {b["sku"]: b for b in offered}
+            ordered = [{**by_sku[o["sku"]], "quantity": o["quantity"]} for o in ordered]
+        return True, ordered
+
+    async def call(self, call: Call, seen: dict) -> None:
+        path = self._path(call, seen)
+        ok, body = self._body(call, seen)
+        if path is None or not ok:
+            self.skipped += 1
+            return
+
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(call.method, path, json=body)
+            status = response.status_code
+        except httpx.HTTPError:
+            response, status = None, 0
+        stats = self.stats.setdefault(call.route, Stats())
+        stats.add(time.perf_counter() - started, status)
+        if response is None or status >= 300:
+            return
+
+        if call.route == "/catalog/":
+            seen["skus"] = [item["sku"] for item in response.json()]
+        elif call.route == "/carts/":
+            seen["cart_id"] = response.json()["cart_id"]
+            if isinstance(call.response, dict) and "cart_id" in call.response:
+                self.cart_ids[call.response["cart_id"]] = seen["cart_id"]
+        elif call.route.endswith("/plan"):
+            seen["plan"] = (call.json, response.json())
+
+    async def session(self, calls: list[Call]) -> None:
+        async with self.sessions:
+            seen: dict = {}
+            for c in calls:
+                await self.call(c, seen)
+
+    async def tick(self, calls: list[Call]) -> None:
+        sessions: dict[str, list[Call]] = {}
+        shop = []
+        for c in calls:
+            if c.session is None:
+                shop.append(c)
+            else:
+                sessions.setdefault(c.session, []).append(c)
+        await asyncio.gather(*(self.session(s) for s in sessions.values()))
+        seen: dict = {}
+        for c in shop:
+            await self.call(c, seen)
+
+    async def run(self, calls: list[Call]) -> float:
+        """Replay every tick in order; returns the wall time it took."""
+        ticks: dict[int, list[Call]] = {}
+        for c in calls:
+            ticks.setdefault(c.tick, []).append(c)
+        started = time.perf_counter()
+        for t in sorted(ticks):
+            await self.tick(ticks[t])
+        return time.perf_counter() - started
+
+
+def summarize(stats: dict[str, Stats], elapsed: float, skipped: int) -> dict:
+    routes = {}
+    for route, s in sorted(stats.items()):
+        p50, p95, p99 = _percentiles(s.latencies)
+        routes[route] = {
+            "requests": len(s.latencies),
+            "4xx": s.client_errors,
+            "5xx": s.server_errors,
+            "per_second": round(len(s.latencies) / elapsed, 1),
+            "p50_ms": round(p50 * 1000, 2),
+            "p95_ms": round(p95 * 1000, 2),
+            "p99_ms": round(p99 * 1000, 2),
+        }
+    everything = [x for s in stats.values() for x in s.latencies]
+    p50, p95, p99 = _percentiles(everything)
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "seconds": round(elapsed, 3),
+        "skipped": skipped,
+        "total": {
+            "requests": len(everything),
+            "4xx": sum(s.client_errors for s in stats.values()),
+            "5xx": sum(s.server_errors for s in stats.values()),
+            "per_second": round(len(everything) / elapsed, 1),
+            "p50_ms": round(p50 * 1000, 2),
+            "p95_ms": round(p95 * 1000, 2),
+            "p99_ms": round(p99 * 1000, 2),
+        },
+        "routes": routes,
+    }
+
+
+def print_report(result: dict) -> None:
+    print(
+        f"{'route':<34}{'n':>7}{'4xx':>6}{'5xx':>6}{'req/s':>9}"
+        f"{'p50':>9}{'p95':>9}{'p99':>9}  (ms)"
+    )
+    for route, r in [*result["routes"].items(), ("total", result["total"])]:
+        print(
+            f"{route:<34}{r['requests']:>7}{r['4xx']:>6}{r['5xx']:>6}{r['per_second']:>9}"
+            f"{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+        )
+    print(f"{result['seconds']}s, {result['skipped']} calls skipped (nothing to act on)")
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Print p95 and throughput against baseline; returns the routes that regressed."""
+    print(f"\n{'route':<34}{'p95 then':>10}{'now':>10}{'change':>9}")
+    regressed = []
+    for route, r in [*result["routes"].items(), ("total", result["total"])]:
+        old = baseline["routes"].get(route) if route != "total" else baseline["total"]
+        if old is None:
+            continue
+        change = (r["p95_ms"] / old["p95_ms"] - 1) * 100 if old["p95_ms"] else 0.0
+        slower = change > tolerance
+        if slower:
+            regressed.append(route)
+        print(
+            f"{route:<34}{old['p95_ms']:>10.2f}{r['p95_ms']:>10.2f}{change:>+8.1f}%"
+            f"{'  slower' if slower else ''}"
+        )
+    then, now = baseline["total"]["per_second"], result["total"]["per_second"]
+    print(f"throughput {then} -> {now} req/s")
+    return regressed
+
+
+def _client(args) -> httpx.AsyncClient:
+    headers = {"access_token": args.api_key or config.get_settings().API_KEY}
+    if args.in_process:
+        from src.api.server import app
+
+        return httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://shop", headers=headers
+        )
+    limits = httpx.Limits(max_connections=args.concurrency)
+    return httpx.AsyncClient(base_url=args.url, headers=headers, limits=limits, timeout=30)
+
+
+async def _replay(args, calls: list[Call], warmup: list[Call]) -> dict:
+    async with _client(args) as client:
+        if not args.no_reset:
+            (await client.post("/admin/reset")).raise_for_status()
+        if warmup:
+            await Replayer(client, args.concurrency, args.seed).run(warmup)
+        replayer = Replayer(client, args.concurrency, args.seed)
+        elapsed = await replayer.run(calls)
+    return summarize(replayer.stats, elapsed, replayer.skipped)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://127.0.0.1:3000")
+    parser.add_argument("--api-key", help="default API_KEY (shop 1)")
+    parser.add_argument("--in-process", action="store_true",
+                        help="call the app directly instead of --url")
+    parser.add_argument("--from", dest="source", type=Path, help="recorded JSONL to replay")
+    parser.add_argument("--record", type=Path, help="write the synthetic ticks as JSONL")
+    parser.add_argument("--ticks", type=int, default=10)
+    parser.add_argument("--customers", type=int, default=20, help="sessions per tick")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured ticks first")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-reset", action="store_true")
+    parser.add_argument("--save", metavar="NAME", help="save the results as a baseline")
+    parser.add_argument("--compare", metavar="NAME", help="compare with a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="percent")
+    args = parser.parse_args()
+
+    if args.source:
+        calls, warmup = load(args.source), []
+    else:
+        ticks = synthesize(args.warmup + args.ticks, args.customers, args.seed)
+        warmup = [c for c in ticks if c.tick < args.warmup]
+        calls = [c for c in ticks if c.tick >= args.warmup]
+        if args.record:
+            record(calls, args.record)
+            print(f"wrote {len(calls)} calls to {args.record}")
+            return
+
+    result = asyncio.run(_replay(args, calls, warmup))
+    print_report(result)
+
+    if args.save:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        (BASELINE_DIR / f"{args.save}.json").write_text(json.dumps(result, indent=2))
+        print(f"saved baseline {args.save!r}")
+    if args.compare:
+        baseline = json.loads((BASELINE_DIR / f"{args.compare}.json").read_text())
+        if compare(result, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends, status
-import sqlalchemy
-from src.api import auth
-from src import database as db
+from fastapi import APIRouter, Depends, HTTPException, status
+from src.api import auth, metrics
+from src import invalidation, storage, tenancy
+from src.lazy import lazy_import
+
+snapshots = lazy_import("src.snapshots")
+sweeper = lazy_import("src.sweeper")
 
 router = APIRouter(
     prefix="/admin",
@@ -10,23 +13,78 @@ router = APIRouter(
 )
 
 
+def default_shop_only() -> None:
+    """For routes that act on every shop at once: only shop 1 may call them."""
+    if tenancy.current() != tenancy.DEFAULT_SHOP:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Shop 1 only"
+        )
+
+
 @router.post("/reset", status_code=status.HTTP_204_NO_CONTENT)
 def reset():
     """
-    Reset the game state. Gold goes to 100, all potions are removed from
+    Reset the caller's shop. Gold goes to 100, all potions are removed from
     inventory, and all barrels are removed from inventory. Carts are all reset.
+    Other shops are left alone.
     """
 
-    with db.engine.begin() as connection:
-        connection.execute(
-            sqlalchemy.text(
-                """
-               UPDATE global_inventory
-                SET gold = 100,
-                    red_ml = 0, green_ml = 0, blue_ml = 0, dark_ml =0,
-                    red_potions = 0, green_potions = 0, blue_potions = 0,
-                    dark_potions = 0
-                """
-            )
-        )
-    pass
+    with storage.get().transaction() as tx:
+        tx.reset()
+        tx.publish(invalidation.INVENTORY, invalidation.RECIPES)
+
+
+@router.get("/metrics")
+def get_metrics():
+    """
+    Requests, 5xx errors and latency percentiles per shop, as seen by the
+    worker that answers. Shop 1 sees every shop (0 is requests no shop was
+    resolved for); any other shop sees only itself.
+    """
+    shop = tenancy.current()
+    return metrics.registry.snapshot(
+        None if shop == tenancy.DEFAULT_SHOP else [shop]
+    )
+
+
+@router.post("/sweep", dependencies=[Depends(default_shop_only)])
+def sweep_carts():
+    """
+    Deletes abandoned carts and releases expired stock holds, in every shop,
+    now instead of waiting for the background sweep, and reports how many
+    went and how long it took. Shop 1 only.
+    """
+    return sweeper.sweep()
+
+
+@router.get("/snapshots", dependencies=[Depends(default_shop_only)])
+def list_snapshots():
+    """
+    Lists the saved game-state snapshots. Shop 1 only.
+    """
+    return snapshots.list_snapshots()
+
+
+@router.post("/snapshots/{name}", dependencies=[Depends(default_shop_only)])
+def save_snapshot(name: str):
+    """
+    Saves the full game state of every shop (inventory, recipes, carts)
+    under name, replacing any snapshot already saved with that name. Shop 1
+    only.
+    """
+    try:
+        return snapshots.save(name)
+    except snapshots.SnapshotError as e:
+        raise HTTPException(400, str(e))
+
+
+@router.post("/snapshots/{name}/restore", dependencies=[Depends(default_shop_only)])
+def restore_snapshot(name: str):
+    """
+    Replaces the full game state of every shop with a saved snapshot. Shop 1
+    only.
+    """
+    try:
+        return snapshots.restore(name)
+    except snapshots.SnapshotError as e:
+        raise HTTPException(400, str(e))
@@ -0,0 +1,196 @@
+"""
+Admission control: which requests run when a tick's burst outnumbers the
+database connections.
+
+Every request is sorted into a priority class by route. At most
+ADMISSION_MAX_INFLIGHT run at once (by default, as many as the pool has
+connections), and low-priority requests only ever hold ADMISSION_LOW_LIMIT
+of those slots, so there is always room for a checkout. Requests over the
+limit wait in this worker's queue, not in the connection pool's. When a slot
+frees up it goes to the oldest waiter of the highest class.
+
+Low-priority requests are shed rather than left to queue: when
+ADMISSION_LOW_QUEUE of them are already waiting, or one has waited
+ADMISSION_LOW_WAIT_SECONDS, it gets a 503 with Retry-After right away.
+Everything else (checkouts and deliveries, and the shop's own plans, audit,
+admin and time updates) is never shed; it waits for a slot however long
+that takes.
+"""
+
+import asyncio
+import json
+import re
+from collections import deque
+from enum import IntEnum
+
+from src import config
+
+
+class Priority(IntEnum):
+    HIGH = 0  # checkouts, deliveries: money and stock change hands
+    NORMAL = 1  # plans, audit, admin, time updates
+    LOW = 2  # browsing: catalog, new carts, cart edits
+
+
+# (method, path) -> class; anything unlisted is NORMAL
+ROUTES = [
+    ("POST", re.compile(r"^/carts/\d+/checkout$"), Priority.HIGH),
+    ("POST", re.compile(r"^/(barrels|bottler|inventory)/deliver/\d+$"), Priority.HIGH),
+    ("GET", re.compile(r"^/catalog/?$"), Priority.LOW),
+    ("POST", re.compile(r"^/carts/?$"), Priority.LOW),
+    ("POST", re.compile(r"^/carts/\d+/items/[^/]+$"), Priority.LOW),
+]
+
+
+def classify(method: str, path: str) -> Priority:
+    for m, pattern, priority in ROUTES:
+        if method == m and pattern.match(path):
+            return priority
+    return Priority.NORMAL
+
+
+class Admission:
+    """
+    Slots and priority queues for one event loop. Every method runs on
+    that loop, so plain counters need no locking.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        low_limit: int | None = None,
+        low_queue: int | None = None,
+        low_wait: float = 0.25,
+    ):
+        self.capacity = capacity
+        # (slots the class may hold, waiters before shedding, seconds a waiter may wait)
+        self.limits = {
+            Priority.HIGH: (capacity, None, None),
+            Priority.NORMAL: (capacity, None, None),
+            Priority.LOW: (
+                max(1, capacity // 2) if low_limit is None else low_limit,
+                2 * capacity if low_queue is None else low_queue,
+                low_wait,
+            ),
+        }
+        self.running = {p: 0 for p in Priority}
+        self.shed = {p: 0 for p in Priority}
+        self._waiting: dict[Priority, deque[asyncio.Future]] = {p: deque() for p in Priority}
+
+    @classmethod
+    def from_settings(cls) -> "Admission":
+        s = config.get_settings()
+        return cls(
+            s.ADMISSION_MAX_INFLIGHT,
+            low_limit=s.ADMISSION_LOW_LIMIT,
+            low_queue=s.ADMISSION_LOW_QUEUE,
+            low_wait=s.ADMISSION_LOW_WAIT_SECONDS,
+        )
+
+    def _has_room(self, priority: Priority) -> bool:
+        return (
+            sum(self.running.values()) < self.capacity
+            and self.running[priority] < self.limits[priority][0]
+        )
+
+    def _queued_ahead(self, priority: Priority) -> bool:
+        return any(self._waiting[p] for p in Priority if p <= priority)
+
+    async def acquire(self, priority: Priority) -> bool:
+        """Take a slot, waiting if need be; False means shed the request."""
+        if self._has_room(priority) and not self._queued_ahead(priority):
+            self.running[priority] += 1
+            return True
+
+        _, max_queue, max_wait = self.limits[priority]
+        queue = self._waiting[priority]
+        if max_queue is not None and len(queue) >= max_queue:
+            self.shed[priority] += 1
+            return False
+
+        granted = asyncio.get_running_loop().create_future()
+        queue.append(granted)
+        try:
+            await asyncio.wait_for(granted, max_wait)
+            return True
+        except asyncio.TimeoutError:
+            if granted.done() and not granted.cancelled():
+                return True  # the slot came in just as the wait ran out
+            self._forget(queue, granted)
+            self.shed[priority] += 1
+            return False
+        except asyncio.CancelledError:
+            # the client went away; hand back a slot we were given meanwhile
+            if granted.done() and not granted.cancelled():
+                self.release(priority)
+            self._forget(queue, granted)
+            raise
+
+    @staticmethod
+    def _forget(queue: deque, granted: asyncio.Future) -> None:
+        try:
+            queue.remove(granted)
+        except ValueError:
+            pass
+
+    def release(self, priority: Priority) -> None:
+        self.running[priority] -= 1
+        for p in Priority:
+            queue = self._waiting[p]
+            while queue and self._has_room(p):
+                granted = queue.popleft()
+                if granted.done():
+                    continue  # timed out or cancelled
+                self.running[p] += 1
+                granted.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            p.name.lower(): {
+                "running": self.running[p],
+                "waiting": len(self._waiting[p]),
+                "shed": self.shed[p],
+            }
+            for p in Priority
+        }
+
+
+_OVERLOADED = json.dumps({"detail": "Shop is busy, try again shortly"}).encode()
+
+
+class AdmissionMiddleware:
+    """Plain ASGI middleware in front of the routers; ADMISSION_MAX_INFLIGHT=0 turns it off."""
+
+    def __init__(self, app, admission: Admission | None = None):
+        self.app = app
+        self._admission = admission
+
+    @property
+    def admission(self) -> Admission:
+        # built on first request: settings are read lazily (see src.config)
+        if self._admission is None:
+            self._admission = Admission.from_settings()
+        return self._admission
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.admission.capacity:
+            return await self.app(scope, receive, send)
+
+        priority = classify(scope["method"], scope["path"])
+        if not await self.admission.acquire(priority):
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 503,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"retry-after", b"1"),
+                    ],
+                }
+            )
+            await send({"type": "http.response.body", "body": _OVERLOADED})
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.release(priority)
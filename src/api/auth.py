@@ -1,16 +1,45 @@
-from src import config
+from src import tenancy
 from fastapi import Security, HTTPException, status, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security.api_key import APIKeyHeader
 
-api_key = config.get_settings().API_KEY
 api_key_header = APIKeyHeader(name="access_token", auto_error=False)
 
 
+async def _shop_for(api_key: str) -> int | None:
+    shop_id = tenancy.keys.cached(api_key)
+    if shop_id is tenancy.UNKNOWN:
+        # first request with this key in a while: one lookup, off the loop
+        shop_id = await run_in_threadpool(tenancy.keys.lookup, api_key)
+    return shop_id
+
+
+def _enter(request: Request, shop_id: int) -> None:
+    # Set here, in the request's own task: the threadpool copies this
+    # context into sync handlers, so tenancy.current() is right in them too.
+    tenancy.activate(shop_id)
+    request.state.shop_id = shop_id  # for the metrics middleware
+
+
 async def get_api_key(request: Request, api_key_header: str = Security(api_key_header)):
-    print(f"api_key_header: {api_key_header}, api_key: {api_key}")
-    if api_key_header == api_key:
-        return api_key_header
-    else:
+    shop_id = await _shop_for(api_key_header) if api_key_header else None
+    if shop_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Forbidden"
+        )
+    _enter(request, shop_id)
+    return api_key_header
+
+
+async def get_shop(request: Request, api_key_header: str = Security(api_key_header)) -> int:
+    """
+    For public endpoints: the caller's shop if they sent a key, shop 1 if
+    they didn't. A key that belongs to no shop is still refused.
+    """
+    shop_id = await _shop_for(api_key_header) if api_key_header else tenancy.DEFAULT_SHOP
+    if shop_id is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Forbidden"
         )
+    _enter(request, shop_id)
+    return shop_id
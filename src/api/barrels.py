@@ -1,13 +1,19 @@
+import logging
+from array import array
 from dataclasses import dataclass
-from fastapi import APIRouter, Depends, status
-from pydantic import BaseModel, Field, field_validator
-from typing import List, Optional
+from fastapi import APIRouter, Depends, Request, status
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, field_validator
+from pydantic_core import InitErrorDetails
+from typing import Annotated, List, Optional, TypedDict
 
-import sqlalchemy
 from src.api import auth
-from src import database as db
+from src.api.responses import json_response
+from src import events, invalidation, storage
 import random 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(
     prefix="/barrels",
     tags=["barrels"],
@@ -37,69 +43,161 @@ class Barrel(BaseModel):
         return potion_type
 
 
+class _BarrelRow(TypedDict):
+    # Barrel's fields and constraints, validated without building a model
+    sku: str
+    ml_per_barrel: Annotated[int, Field(gt=0)]
+    potion_type: Annotated[List[float], Field(min_length=4, max_length=4)]
+    price: Annotated[int, Field(ge=0)]
+    quantity: Annotated[int, Field(ge=0)]
+
+
+_ROWS = TypeAdapter(List[_BarrelRow])
+
+
+@dataclass
+class BarrelColumns:
+    """
+    A barrel catalog as parallel arrays; index i across them is one Barrel,
+    and potion_type holds four mix fractions per barrel. A 10k-barrel
+    catalog is a handful of arrays instead of 10k models.
+    """
+
+    sku: List[str]
+    ml_per_barrel: array
+    potion_type: array
+    price: array
+    quantity: array
+
+    def __len__(self) -> int:
+        return len(self.sku)
+
+    def mix(self, i: int) -> array:
+        return self.potion_type[4 * i : 4 * i + 4]
+
+    @classmethod
+    def from_rows(cls, rows) -> "BarrelColumns":
+        potion_type = array("d")
+        for row in rows:
+            potion_type.extend(row["potion_type"])
+        return cls(
+            sku=[row["sku"] for row in rows],
+            ml_per_barrel=array("q", [row["ml_per_barrel"] for row in rows]),
+            potion_type=potion_type,
+            price=array("q", [row["price"] for row in rows]),
+            quantity=array("q", [row["quantity"] for row in rows]),
+        )
+
+    @classmethod
+    def from_barrels(cls, barrels: List[Barrel]) -> "BarrelColumns":
+        return cls.from_rows([b.model_dump() for b in barrels])
+
+    @classmethod
+    def from_json(cls, body: bytes) -> "BarrelColumns":
+        """Parse and validate a JSON barrel array exactly as List[Barrel] would."""
+        columns = cls.from_rows(_ROWS.validate_json(body))
+        pt = columns.potion_type
+        errors = [
+            InitErrorDetails(
+                type="value_error",
+                loc=(i, "potion_type"),
+                input=list(columns.mix(i)),
+                ctx={"error": ValueError("Sum of potion_type values must be exactly 1.0")},
+            )
+            for i in range(len(columns))
+            if not abs(pt[4 * i] + pt[4 * i + 1] + pt[4 * i + 2] + pt[4 * i + 3] - 1.0) < 1e-6
+        ]
+        if errors:
+            raise ValidationError.from_exception_data("Barrel", errors)
+        return columns
+
+
+async def barrel_columns(request: Request) -> BarrelColumns:
+    """Request-body dependency: the barrel array, straight into columns."""
+    try:
+        return BarrelColumns.from_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)]
+        )
+
+
+# what List[Barrel] used to put in the OpenAPI request body
+_BARRELS_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {
+                "schema": {"type": "array", "items": Barrel.model_json_schema()}
+            }
+        },
+    }
+}
+
+
 class BarrelOrder(BaseModel):
     sku: str
     quantity: int = Field(gt=0, description="Quantity must be greater than 0")
 
 
+_PLAN = TypeAdapter(List[BarrelOrder])
+
+
 @dataclass
 class BarrelSummary:
     gold_paid: int
     ml_added_by_color: dict  # {"red": int, "green": int, "blue": int}
 
 
-def _inv_row(connection) -> sqlalchemy.Row:
-    return connection.execute(sqlalchemy.text("SELECT * FROM global_inventory")).one()
-
-def calculate_barrel_summary(barrels: List[Barrel]) -> BarrelSummary:
+def calculate_barrel_summary(barrels: "List[Barrel] | BarrelColumns") -> BarrelSummary:
+    if not isinstance(barrels, BarrelColumns):
+        barrels = BarrelColumns.from_barrels(barrels)
     # return BarrelSummary(gold_paid=sum(b.price * b.quantity for b in barrels))
     gold = 0
     ml_by_color = {"red": 0, "green": 0, "blue": 0}
-    for b in barrels:
-        gold += b.price * b.quantity
+    for i in range(len(barrels)):
+        gold += barrels.price[i] * barrels.quantity[i]
 
         # assume only pure‑colour barrels (potion_type like [1,0,0,0])
-        idx = b.potion_type.index(1)
+        idx = barrels.mix(i).index(1)
         color = ("red", "green", "blue", "dark")[idx]
         if color in ml_by_color:
-            ml_by_color[color] += b.ml_per_barrel * b.quantity
+            ml_by_color[color] += barrels.ml_per_barrel[i] * barrels.quantity[i]
     return BarrelSummary(gold_paid=gold, ml_added_by_color=ml_by_color)
 
 
-@router.post("/deliver/{order_id}", status_code=status.HTTP_204_NO_CONTENT)
-def post_deliver_barrels(barrels_delivered: List[Barrel], order_id: int):
+@router.post(
+    "/deliver/{order_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    openapi_extra=_BARRELS_BODY,
+)
+def post_deliver_barrels(
+    order_id: int, barrels_delivered: BarrelColumns = Depends(barrel_columns)
+):
     """
     Processes barrels delivered based on the provided order_id. order_id is a unique value representing
     a single delivery; the call is idempotent based on the order_id.
     """
-    print(f"barrels delivered: {barrels_delivered} order_id: {order_id}")
+    logger.info("barrels delivered: %d order_id: %s", len(barrels_delivered), order_id)
 
     delivery = calculate_barrel_summary(barrels_delivered)
 
-    with db.engine.begin() as connection:
-        connection.execute(
-            sqlalchemy.text(
-            #     """
-            #     UPDATE global_inventory SET 
-            #     gold = gold - :gold_paid
-            #     """
-            # ),
-            # [{"gold_paid": delivery.gold_paid}],
-                """
-                UPDATE global_inventory
-                SET gold       = gold - :gold_paid,
-                    red_ml     = red_ml   + :add_r,
-                    green_ml   = green_ml + :add_g,
-                    blue_ml    = blue_ml  + :add_b
-                """
-            ),
+    with storage.get().transaction() as tx:
+        tx.add_barrels(
+            gold_paid=delivery.gold_paid,
+            red_ml=delivery.ml_added_by_color["red"],
+            green_ml=delivery.ml_added_by_color["green"],
+            blue_ml=delivery.ml_added_by_color["blue"],
+        )
+        tx.emit(
+            events.BARRELS_DELIVERED,
             {
-                "gold_paid": delivery.gold_paid,
-                "add_r": delivery.ml_added_by_color["red"],
-                "add_g": delivery.ml_added_by_color["green"],
-                "add_b": delivery.ml_added_by_color["blue"],
+                "order_id": order_id,
+                "gold": delivery.gold_paid,
+                "ml": delivery.ml_added_by_color,
             },
         )
+        tx.publish(invalidation.INVENTORY)
 
     pass
 
@@ -114,8 +212,12 @@ def create_barrel_plan(
     current_red_potions: int,
     current_green_potions: int,
     current_blue_potions: int,
-    wholesale_catalog: List[Barrel],
+    wholesale_catalog: "List[Barrel] | BarrelColumns",
 ) -> List[BarrelOrder]:
+    catalog = wholesale_catalog
+    if not isinstance(catalog, BarrelColumns):
+        catalog = BarrelColumns.from_barrels(catalog)
+
     colour = random.choice(["red", "green", "blue"])
     potion_stock = {
         "red": current_red_potions,
@@ -127,44 +229,51 @@ def create_barrel_plan(
         return []  # plenty in stock
 
     idx = {"red": 0, "green": 1, "blue": 2}[colour]
-    candidates = [b for b in wholesale_catalog if b.potion_type[idx] == 1]
+    candidates = [
+        i for i in range(len(catalog)) if catalog.potion_type[4 * i + idx] == 1
+    ]
     if not candidates:
         return []
 
     # choose *smallest* then *cheapest* barrel we can afford
-    candidates.sort(key=lambda b: (b.ml_per_barrel, b.price))
-    chosen = next((b for b in candidates if b.price <= gold), None)
+    affordable = [i for i in candidates if catalog.price[i] <= gold]
+    chosen = min(
+        affordable,
+        key=lambda i: (catalog.ml_per_barrel[i], catalog.price[i]),
+        default=None,
+    )
 
-    return [BarrelOrder(sku=chosen.sku, quantity=1)] if chosen else []
+    if chosen is None:
+        return []
+    return [BarrelOrder(sku=catalog.sku[chosen], quantity=1)]
 
 
-@router.post("/plan", response_model=List[BarrelOrder])
-def get_wholesale_purchase_plan(wholesale_catalog: List[Barrel]):
+@router.post("/plan", response_model=List[BarrelOrder], openapi_extra=_BARRELS_BODY)
+def get_wholesale_purchase_plan(
+    wholesale_catalog: BarrelColumns = Depends(barrel_columns),
+):
     """
     Gets the plan for purchasing wholesale barrels. The call passes in a catalog of available barrels
     and the shop returns back which barrels they'd like to purchase and how many.
     """
 
-    print(f"barrel catalog: {wholesale_catalog}")
+    logger.info("barrel catalog: %d barrels", len(wholesale_catalog))
 
-    with db.engine.begin() as connection:
-        row = connection.execute(
-            sqlalchemy.text(
-               """
-                SELECT gold, red_potions, green_potions, blue_potions
-                FROM global_inventory
-                """
-            )
-        ).one()
+    with storage.get().transaction() as tx:
+        row = tx.ensure_inventory()
 
         
-    return create_barrel_plan(
-    gold=row.gold,
-    current_red_potions=row.red_potions,
-    current_green_potions=row.green_potions,
-    current_blue_potions=row.blue_potions,
-    wholesale_catalog=wholesale_catalog,
-)
+    # built from validated BarrelOrders; no need to validate them again
+    return json_response(
+        _PLAN,
+        create_barrel_plan(
+            gold=row.gold,
+            current_red_potions=row.red_potions,
+            current_green_potions=row.green_potions,
+            current_blue_potions=row.blue_potions,
+            wholesale_catalog=wholesale_catalog,
+        ),
+    )
     # return create_barrel_plan(
     #     gold=row.gold,
     #     max_barrel_capacity=10000,  
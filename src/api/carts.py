@@ -1,10 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel, Field
-import sqlalchemy as sa
 from src.api import auth
 # from enum import Enum
 from typing import List   #, Optional
-from src import database as db
+from src import events, invalidation, storage
 # from src.api.catalog import PRICE_PER_POTION, POTION_TYPE_LOOKUP  
 # from src.api.bottler import DARK_RECIPE  
 
@@ -30,104 +29,76 @@ class CheckoutResponse(BaseModel):
     total_potions_bought: int
     total_gold_paid: int
 
-def _recipe_row(conn, sku: str):
-    return conn.execute(
-        sa.text("SELECT id, price, inventory FROM potion_recipes WHERE sku=:s"),
-        {"s": sku},
-    ).mappings().first()
-
 #creating new cart
 @router.post("/", response_model=CartCreateResponse)
 def create_cart(customer: Customer):
-    with db.engine.begin() as conn:
-        cart_id = conn.execute(
-            sa.text(
-                """
-                INSERT INTO carts (customer_id, customer_name)
-                VALUES (:cid, :cname)
-                RETURNING id
-                """
-            ),
-            {"cid": customer.customer_id, "cname": customer.customer_name},
-        ).scalar_one()
+    with storage.get().transaction() as tx:
+        cart_id = tx.create_cart(customer.customer_id, customer.customer_name)
+        tx.emit(
+            events.CART_CREATED,
+            {"cart_id": cart_id, "customer_id": customer.customer_id},
+        )
     return CartCreateResponse(cart_id=cart_id)
 
 # Add //update new cart
 @router.post("/{cart_id}/items/{sku}", status_code=status.HTTP_204_NO_CONTENT)
 def set_item_quantity(cart_id: int, sku: str, item: CartItemDTO):
-    with db.engine.begin() as conn:
-        recipe = _recipe_row(conn, sku)
+    with storage.get().transaction() as tx:
+        recipe = tx.recipe_by_sku(sku)
         if recipe is None:
             raise HTTPException(404, "Unknown SKU")
 
-        conn.execute(
-            sa.text(
-                """
-                INSERT INTO cart_items (cart_id, recipe_id, quantity)
-                VALUES (:cid, :rid, :qty)
-                ON CONFLICT (cart_id, recipe_id)
-                DO UPDATE SET quantity = EXCLUDED.quantity
-                """
-            ),
-            {"cid": cart_id, "rid": recipe["id"], "qty": item.quantity},
+        if not tx.set_cart_item(cart_id, recipe.id, item.quantity):
+            raise HTTPException(404, "Unknown or checked-out cart")
+        # hold the stock until checkout (or STOCK_HOLD_SECONDS), so what got
+        # into the cart can still be paid for while others buy
+        if not tx.hold_stock(cart_id, recipe.id, item.quantity):
+            raise HTTPException(400, "Not enough stock")
+        tx.emit(
+            events.CART_ITEM_SET,
+            {"cart_id": cart_id, "sku": sku, "quantity": item.quantity},
         )
+        # the catalog lists unheld stock
+        tx.publish(invalidation.RECIPES)
 
 # Ccheeckkoouut
 @router.post("/{cart_id}/checkout", response_model=CheckoutResponse)
 def checkout(cart_id: int):
-    with db.engine.begin() as conn:
-        items = conn.execute(
-            sa.text(
-                """
-                SELECT pr.id AS recipe_id,
-                       pr.price,
-                       pr.inventory,
-                       ci.quantity
-                FROM cart_items ci
-                JOIN potion_recipes pr ON pr.id = ci.recipe_id
-                WHERE ci.cart_id = :cid
-                """
-            ),
-            {"cid": cart_id},
-        ).mappings().all()
+    with storage.get().transaction() as tx:
+        # Marking cart as checked‑out (rolled back with everything else below
+        # if the checkout fails)
+        if not tx.claim_cart(cart_id):
+            raise HTTPException(400, "Cart does not exist or is already checked out")
+
+        items = tx.cart_lines(cart_id)
 
         if not items:
             raise HTTPException(400, "Cart empty or does not exist")
 
-        # stock check
-        for it in items:
-            if it["quantity"] > it["inventory"]:
-                raise HTTPException(400, "Not enough stock")
+        total_paid   = sum(it.price * it.quantity for it in items)
+        total_bought = sum(it.quantity for it in items)
 
-        total_paid   = sum(it["price"] * it["quantity"] for it in items)
-        total_bought = sum(it["quantity"] for it in items)
+        # Add gold to store. First: every stock change below also updates the
+        # shop's global_inventory row (potion_count trigger), so taking that
+        # row before any recipe row keeps concurrent checkouts from deadlocking.
+        tx.add_gold(total_paid)
 
-        # deducting inventory
+        # deducting inventory: the cart's own holds go first, then each sale
+        # checks, in the same statement that takes the row, that it leaves
+        # other carts' holds alone (lines come in recipe id order, the order
+        # every writer locks recipe rows in)
+        tx.release_holds(cart_id)
         for it in items:
-            conn.execute(
-                sa.text(
-                    """
-                    UPDATE potion_recipes
-                    SET inventory = inventory - :qty
-                    WHERE id = :rid
-                    """
-                ),
-                {"qty": it["quantity"], "rid": it["recipe_id"]},
-            )
-
-        # Add gold to store
-        conn.execute(
-            sa.text("UPDATE global_inventory SET gold = gold + :g"),
-            {"g": total_paid},
-        )
+            if not tx.sell_stock(it.recipe_id, it.quantity):
+                raise HTTPException(400, "Not enough stock")
 
-        # Marking cart as checked‑out
-        conn.execute(
-            sa.text("UPDATE carts SET checked_out = TRUE WHERE id = :cid"),
-            {"cid": cart_id},
+        tx.emit(
+            events.CHECKOUT,
+            {"cart_id": cart_id, "potions": total_bought, "gold": total_paid},
         )
+        tx.publish(invalidation.INVENTORY, invalidation.RECIPES)
 
     return CheckoutResponse(
         total_potions_bought=total_bought,
         total_gold_paid=total_paid,
-    )
\ No newline at end of file
+    )
@@ -1,9 +1,10 @@
-from fastapi import APIRouter
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, Depends
+from pydantic import BaseModel, Field, TypeAdapter
 from typing import List, Annotated
-import sqlalchemy 
-from src import database as db
+from src import invalidation
+from src.api import auth
 from src.api.bottler import DARK_RECIPE  # reusing the mix percentages
+from src.api.responses import json_bytes_response
 
 
 router = APIRouter()
@@ -38,23 +39,40 @@ class CatalogItem(BaseModel):
     )
 
 
+_CATALOG = TypeAdapter(List[CatalogItem])
 
-@router.get("/catalog/", tags=["catalog"], response_model=List[CatalogItem])
+
+def _encode_catalog(rows) -> bytes:
+    """Validate the rows once and encode the whole response body."""
+    items = _CATALOG.validate_python(
+        [
+            {
+                "sku": row["sku"],
+                "name": row["name"],
+                "quantity": row["inventory"],
+                "price": row["price"],
+                "potion_type": [row["red_pct"], row["green_pct"],
+                                row["blue_pct"], row["dark_pct"]],
+            }
+            for row in rows
+        ]
+    )
+    return _CATALOG.dump_json(items)
+
+
+# the encoded response per shop, rebuilt only when a checkout, bottling or
+# reset bumps that shop's recipes version
+_catalog_body = invalidation.bus.cache(
+    invalidation.RECIPES, lambda tx: _encode_catalog(tx.catalog())
+)
+
+
+# public, like it always was; a key picks another shop's catalog
+@router.get(
+    "/catalog/",
+    tags=["catalog"],
+    response_model=List[CatalogItem],
+    dependencies=[Depends(auth.get_shop)],
+)
 def get_catalog():
-    with db.engine.begin() as connection:
-        rows = connection.execute(sqlalchemy.text(
-            "SELECT sku, name, price, red_pct, green_pct, blue_pct, dark_pct, inventory "
-+           "FROM potion_recipes WHERE inventory > 0 LIMIT 6"
-        )).mappings().all()
-
-    return [
-        CatalogItem(
-            sku=row["sku"],
-            name=row["name"],
-            quantity=row["inventory"],
-            price=row["price"],
-            potion_type=[row["red_pct"], row["green_pct"],
-                         row["blue_pct"], row["dark_pct"]],
-        )
-        for row in rows
-    ]
\ No newline at end of file
+    return json_bytes_response(_catalog_body.get())
\ No newline at end of file
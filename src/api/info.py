@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, status
 from pydantic import BaseModel
 from src.api import auth
+from src import events, storage
 
 router = APIRouter(
     prefix="/info",
@@ -17,7 +18,9 @@ class Timestamp(BaseModel):
 @router.post("/current_time", status_code=status.HTTP_204_NO_CONTENT)
 def post_time(timestamp: Timestamp):
     """
-    Shares what the latest time (in game time) is.
+    Shares what the latest time (in game time) is. Records the shop's gold,
+    ml and potion count as of this tick (GET /inventory/history).
     """
-    # TODO: Record day and time of the current tick to associate with later calls
-    pass
+    with storage.get().transaction() as tx:
+        tx.record_tick(timestamp.day, timestamp.hour)
+        tx.emit(events.TICK, timestamp.model_dump())
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, status
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter, Depends, Query, status
 from pydantic import BaseModel, Field
-import sqlalchemy as sa
 from src.api import auth
-from src import database as db
+from src import events, storage, ticks
 
 router = APIRouter(
     prefix="/inventory",
@@ -23,39 +24,49 @@ class CapacityPlan(BaseModel):
     )
     ml_capacity: int = Field(ge=0, le=10, description="ML capacity units, max 10")
 
-def _ensure_inventory_row(conn) -> sa.Row:
+@router.get("/audit", response_model=InventoryAudit)
+def get_inventory():
     """
-    Make sure there is exactly one row in global_inventory and return it.
+    Returns a snapshot of the current inventory, fully backed by storage.
     """
-    row = conn.execute(
-        sa.text("SELECT * FROM global_inventory LIMIT 1")
-    ).fetchone()
+    with storage.get().read() as tx:
+        inv = tx.inventory()
+    if inv is None:
+        # fresh database: create the shop's row (gold = 0) on the primary
+        with storage.get().transaction() as tx:
+            inv = tx.ensure_inventory()
+
+    # potion_count is kept current as stock changes (triggers in Postgres)
+    ml_total = inv.red_ml + inv.green_ml + inv.blue_ml + inv.dark_ml
+    pot_total = inv.potion_count
+
+    return InventoryAudit(
+        number_of_potions=pot_total,
+        ml_in_barrels=ml_total,
+        gold=inv.gold,
+    )
 
-    if row is None:
-        # fresh database: insert the singleton row with gold = 0
-        conn.execute(sa.text("INSERT INTO global_inventory (gold) VALUES (0)"))
-        row = conn.execute(
-            sa.text("SELECT * FROM global_inventory LIMIT 1")
-        ).one()
 
-    return row
+def _local(at: datetime) -> datetime:
+    # ticks are stored in naive local time, like every other timestamp
+    return at if at.tzinfo is None else at.astimezone().replace(tzinfo=None)
 
-@router.get("/audit", response_model=InventoryAudit)
-def get_inventory():
+
+@router.get("/history", response_model=list[storage.TickPoint])
+def get_history(
+    since: datetime | None = None,
+    until: datetime | None = None,
+    points: int = Query(200, ge=1, le=ticks.MAX_POINTS),
+):
     """
-    Returns a snapshot of the current inventory, fully backed by the database.
+    Gold, ml and potion count over time, one point per bucket of game ticks
+    in [since, until) (default: the last 7 days), at most points of them.
+    Each point is the bucket's last tick, with the bucket's tick count and
+    lowest and highest gold.
     """
-    with db.engine.begin() as conn:
-        row = _ensure_inventory_row(conn)
-
-        ml_total = row.red_ml + row.green_ml + row.blue_ml
-        pot_total = row.red_potions + row.green_potions + row.blue_potions
-
-        return InventoryAudit(
-            number_of_potions=pot_total,
-            ml_in_barrels=ml_total,
-            gold=row.gold,
-        )
+    until = datetime.now() if until is None else _local(until)
+    since = until - timedelta(days=7) if since is None else _local(since)
+    return ticks.history(since, until, points)
 
 
 @router.post("/plan", response_model=CapacityPlan)
@@ -79,4 +90,8 @@ def deliver_capacity_plan(capacity_purchase: CapacityPlan, order_id: int):
     # - Each additional capacity unit costs 1000 gold.
     # """
     # print(f"capacity delivered: {capacity_purchase} order_id: {order_id}")
-    pass
+    with storage.get().transaction() as tx:
+        tx.emit(
+            events.CAPACITY_DELIVERED,
+            {"order_id": order_id, **capacity_purchase.model_dump()},
+        )
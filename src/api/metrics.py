@@ -0,0 +1,123 @@
+"""
+Per-shop request metrics, kept in each worker's memory.
+
+MetricsMiddleware times every request and files it under the shop the auth
+dependency resolved (request.state.shop_id). Requests that never got that
+far (a bad key, a 404, /docs) are filed under shop 0. Latencies go into
+fixed buckets, so recording is a few integer adds and the memory per shop
+doesn't grow with traffic; percentiles are read off the bucket bounds.
+"""
+
+import threading
+import time
+
+# upper bounds, in milliseconds; anything slower lands in a final bucket,
+# bounded by the slowest request seen
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+UNRESOLVED = 0
+
+
+class ShopMetrics:
+    __slots__ = ("requests", "errors", "seconds", "slowest", "buckets")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0  # 5xx responses
+        self.seconds = 0.0
+        self.slowest = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def record(self, seconds: float, status: int) -> None:
+        self.requests += 1
+        self.errors += status >= 500
+        self.seconds += seconds
+        self.slowest = max(self.slowest, seconds)
+        ms = seconds * 1000
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        self.buckets[i] += 1
+
+    def percentile(self, q: float) -> float | None:
+        """Upper bound (ms) of the bucket holding the q-th quantile request."""
+        if not self.requests:
+            return None
+        rank = q * self.requests
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        # past the last bound: the slowest request is the only bound we have
+        return round(self.slowest * 1000, 3)
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "mean_ms": round(self.seconds / self.requests * 1000, 3)
+            if self.requests
+            else None,
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self._shops: dict[int, ShopMetrics] = {}
+        self._lock = threading.Lock()
+
+    def record(self, shop_id: int, seconds: float, status: int) -> None:
+        shop = self._shops.get(shop_id)
+        if shop is None:
+            shop = self._shops.setdefault(shop_id, ShopMetrics())
+        with self._lock:
+            shop.record(seconds, status)
+
+    def snapshot(self, shop_ids: list[int] | None = None) -> dict[int, dict]:
+        """Metrics for the given shops (all of them by default)."""
+        with self._lock:
+            return {
+                shop_id: m.as_dict()
+                for shop_id, m in sorted(self._shops.items())
+                if shop_ids is None or shop_id in shop_ids
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._shops.clear()
+
+
+registry = Metrics()
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware: no extra task per request, unlike BaseHTTPMiddleware."""
+
+    def __init__(self, app, metrics: Metrics | None = None):
+        self.app = app
+        self.metrics = registry if metrics is None else metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        state = scope.setdefault("state", {})
+        status = 500
+        started = time.perf_counter()
+
+        async def send_and_note_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_note_status)
+        finally:
+            self.metrics.record(
+                state.get("shop_id", UNRESOLVED), time.perf_counter() - started, status
+            )
@@ -0,0 +1,23 @@
+"""
+JSON responses for values that are already valid.
+
+Returning a model list from a handler makes FastAPI validate it again
+against response_model, then encode it with jsonable_encoder and json.dumps.
+When the value was built from validated models, or validated once when a
+cache loaded it, json_response() skips both steps and encodes with
+pydantic-core's serializer instead. response_model still documents the
+endpoint's schema in OpenAPI.
+"""
+
+from typing import Any
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+def json_response(adapter: TypeAdapter, value: Any) -> Response:
+    return json_bytes_response(adapter.dump_json(value))
+
+
+def json_bytes_response(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
@@ -1,5 +1,9 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from src import events, invalidation, sweeper
 from src.api import carts, catalog, bottler, barrels, admin, info, inventory
+from src.api.admission import AdmissionMiddleware
+from src.api.metrics import MetricsMiddleware
 from starlette.middleware.cors import CORSMiddleware
 
 description = """
@@ -21,6 +25,18 @@ tags_metadata = [
     },
 ]
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    invalidation.bus.start()
+    events.consumer.start()
+    sweeper.sweeper.start()
+    yield
+    await sweeper.sweeper.stop()
+    await events.consumer.stop()
+    invalidation.bus.stop()
+
+
 app = FastAPI(
     title="Central Coast Cauldrons",
     description=description,
@@ -31,6 +47,7 @@ app = FastAPI(
         "email": "lupierce@calpoly.edu",
     },
     openapi_tags=tags_metadata,
+    lifespan=lifespan,
 )
 
 origins = ["https://potion-exchange.vercel.app"]
@@ -42,6 +59,9 @@ app.add_middleware(
     allow_methods=["GET", "OPTIONS"],
     allow_headers=["*"],
 )
+app.add_middleware(AdmissionMiddleware)
+# added last, runs first: shed requests still show up in the metrics
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(inventory.router)
 app.include_router(carts.router)
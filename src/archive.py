@@ -0,0 +1,280 @@
+"""
+Daily partitions of carts and cart_items: made ahead, archived behind.
+
+    python -m src.archive                  # run once a day
+    python -m src.archive --keep-days 14
+
+Each run creates the partitions for the next PARTITION_PREMAKE_DAYS days,
+then detaches every day older than CART_RETENTION_DAYS, writes both of its
+partitions to ARCHIVE_DIR/<table>/<partition>.parquet (zstd) and drops them,
+so the hot tables only ever hold a few days of carts.
+
+Parquet export needs pyarrow (`uv sync --extra archive`); without it the job
+still creates partitions but archives nothing. Archived history is queryable
+in place, e.g. with DuckDB:
+
+    SELECT c.customer_id, sum(i.quantity)
+    FROM 'archive/carts/*.parquet' c
+    JOIN 'archive/cart_items/*.parquet' i
+      ON i.cart_id = c.id AND i.cart_created_at = c.created_at
+    GROUP BY 1
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import sqlalchemy as sa
+
+from src import config
+from src import database as db
+
+logger = logging.getLogger(__name__)
+
+# children before parents: cart_items references carts
+TABLES = ("cart_items", "carts")
+
+# the partition key of each
+_KEYS = {"cart_items": "cart_created_at", "carts": "created_at"}
+
+_PARTITION = re.compile(r"^(?P<table>carts|cart_items)_p(?P<day>\d{8})$")
+
+# partitioned tables name the inherited constraint after the parent's
+_CART_FK = "cart_items_cart_id_cart_created_at_fkey"
+
+# postgres column types -> pyarrow factory names
+_ARROW_TYPES = {
+    "integer": "int32",
+    "bigint": "int64",
+    "boolean": "bool_",
+    "character varying": "string",
+    "text": "string",
+}
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def partition_name(table: str, day: date) -> str:
+    return f"{table}_p{day:%Y%m%d}"
+
+
+def _day_partitions(conn) -> dict[str, bool]:
+    """Every daily partition table, attached or left detached by a failed run."""
+    rows = conn.execute(
+        sa.text(
+            """
+            SELECT c.relname,
+                   EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid)
+            FROM pg_class c
+            WHERE c.relkind = 'r'
+              AND c.relnamespace = current_schema()::regnamespace
+              AND c.relname ~ '^(carts|cart_items)_p[0-9]{8}$'
+            """
+        )
+    ).all()
+    return dict(rows)
+
+
+def _in_default(conn, table: str, day: date) -> bool:
+    """Whether table's default partition holds rows for day."""
+    return conn.execute(
+        sa.text(
+            f"SELECT EXISTS (SELECT 1 FROM {table}_default "
+            f"WHERE {_KEYS[table]} >= :day AND {_KEYS[table]} < :next)"
+        ),
+        {"day": day, "next": day + timedelta(days=1)},
+    ).scalar_one()
+
+
+def create_partitions(conn, days_ahead: int) -> list[str]:
+    """
+    Create any missing partitions from today through days_ahead. Rows the
+    default partitions took for one of those days (the job fell behind) move
+    into the new partitions, in the caller's transaction.
+    """
+    today = conn.execute(sa.text("SELECT current_date")).scalar_one()
+    existing = _day_partitions(conn)
+    created = []
+    for offset in range(days_ahead + 1):
+        day = today + timedelta(days=offset)
+        missing = [t for t in TABLES if partition_name(t, day) not in existing]
+        bounds = f"FROM ('{day}') TO ('{day + timedelta(days=1)}')"
+        if not any(_in_default(conn, table, day) for table in missing):
+            for table in reversed(missing):
+                conn.execute(
+                    sa.text(
+                        f"CREATE TABLE {partition_name(table, day)} "
+                        f"PARTITION OF {table} FOR VALUES {bounds}"
+                    )
+                )
+        else:
+            # the default can't give up rows to a partition attached over
+            # them: fill standalone tables first, then attach. Items go first,
+            # so deleting their carts from the default cascades to nothing.
+            if missing == ["carts"]:
+                raise ArchiveError(
+                    f"carts_default holds carts for {day}, whose items are in "
+                    f"{partition_name('cart_items', day)}; move them by hand"
+                )
+            for table in missing:
+                name = partition_name(table, day)
+                conn.execute(
+                    sa.text(
+                        f"CREATE TABLE {name} "
+                        f"(LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+                    )
+                )
+                conn.execute(
+                    sa.text(
+                        f"""
+                        WITH moved AS (
+                            DELETE FROM {table}_default
+                            WHERE {_KEYS[table]} >= :day AND {_KEYS[table]} < :next
+                            RETURNING *
+                        )
+                        INSERT INTO {name} SELECT * FROM moved
+                        """
+                    ),
+                    {"day": day, "next": day + timedelta(days=1)},
+                )
+            for table in reversed(missing):
+                conn.execute(
+                    sa.text(
+                        f"ALTER TABLE {table} ATTACH PARTITION "
+                        f"{partition_name(table, day)} FOR VALUES {bounds}"
+                    )
+                )
+        created += [partition_name(table, day) for table in reversed(missing)]
+    return created
+
+
+def _arrow_schema(conn, name: str):
+    import pyarrow as pa
+
+    fields = []
+    for column, data_type in conn.execute(
+        sa.text(
+            "SELECT column_name, data_type FROM information_schema.columns "
+            "WHERE table_name = :t ORDER BY ordinal_position"
+        ),
+        {"t": name},
+    ):
+        if data_type.startswith("timestamp"):
+            fields.append(pa.field(column, pa.timestamp("us")))
+        elif data_type in _ARROW_TYPES:
+            fields.append(pa.field(column, getattr(pa, _ARROW_TYPES[data_type])()))
+        else:
+            raise ArchiveError(f"no parquet type for {name}.{column} ({data_type})")
+    return pa.schema(fields)
+
+
+def export(name: str, target: Path, chunk_rows: int = 50_000) -> int:
+    """Stream table `name` into a zstd Parquet file; returns the row count."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    partial = target.with_suffix(".parquet.partial")
+    rows = 0
+    with db.engine.connect() as conn:
+        schema = _arrow_schema(conn, name)
+        result = conn.execution_options(stream_results=True).execute(
+            sa.text(f"SELECT * FROM {name}")
+        )
+        with pq.ParquetWriter(partial, schema, compression="zstd") as writer:
+            for chunk in result.partitions(chunk_rows):
+                writer.write_table(
+                    pa.Table.from_pylist([r._asdict() for r in chunk], schema=schema)
+                )
+                rows += len(chunk)
+    os.replace(partial, target)
+    return rows
+
+
+def archive(keep_days: int, directory: Path | None = None) -> list[dict]:
+    """Detach, export and drop every day of carts older than keep_days."""
+    root = directory or Path(config.get_settings().ARCHIVE_DIR)
+    with db.engine.begin() as conn:
+        today = conn.execute(sa.text("SELECT current_date")).scalar_one()
+        partitions = _day_partitions(conn)
+
+    cutoff = today - timedelta(days=keep_days)
+    days = sorted(
+        {
+            datetime.strptime(match["day"], "%Y%m%d").date()
+            for match in map(_PARTITION.match, partitions)
+            if match is not None
+        }
+    )
+    days = [d for d in days if d < cutoff]
+    if not days:
+        return []
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ArchiveError("archiving needs pyarrow: uv sync --extra archive")
+
+    archived = []
+    for day in days:
+        started = time.perf_counter()
+        names = {t: partition_name(t, day) for t in TABLES}
+
+        # DETACH locks the parent briefly; don't queue behind a long transaction
+        with db.engine.begin() as conn:
+            conn.execute(sa.text("SET LOCAL lock_timeout = '5s'"))
+            for table, name in names.items():
+                if partitions.get(name):
+                    conn.execute(sa.text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                if table == "cart_items" and name in partitions:
+                    # the detached copy would otherwise pin its carts partition
+                    conn.execute(
+                        sa.text(f"ALTER TABLE {name} DROP CONSTRAINT IF EXISTS {_CART_FK}")
+                    )
+
+        rows = {
+            table: export(name, root / table / f"{name}.parquet")
+            for table, name in names.items()
+            if name in partitions
+        }
+
+        with db.engine.begin() as conn:
+            for name in names.values():
+                conn.execute(sa.text(f"DROP TABLE IF EXISTS {name}"))
+
+        archived.append(
+            {"day": str(day), "rows": rows,
+             "seconds": round(time.perf_counter() - started, 3)}
+        )
+    return archived
+
+
+def maintain(keep_days: int | None = None, days_ahead: int | None = None) -> dict:
+    settings = config.get_settings()
+    with db.engine.begin() as conn:
+        created = create_partitions(
+            conn, settings.PARTITION_PREMAKE_DAYS if days_ahead is None else days_ahead
+        )
+    try:
+        archived = archive(
+            settings.CART_RETENTION_DAYS if keep_days is None else keep_days
+        )
+    except ArchiveError as e:
+        logger.warning("not archiving: %s", e)
+        archived = []
+    return {"created": created, "archived": archived}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--keep-days", type=int, help="default CART_RETENTION_DAYS")
+    parser.add_argument("--days-ahead", type=int, help="default PARTITION_PREMAKE_DAYS")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(maintain(args.keep_days, args.days_ahead)))
@@ -0,0 +1,63 @@
+"""
+Check the incrementally maintained audit totals against a full recompute.
+
+    python -m src.audit          # exit status 1 if anything drifted
+    python -m src.audit --fix    # and overwrite the drifted totals
+
+gold and the four ml columns are the source of truth in global_inventory
+already; potion_count is kept in step with potion_recipes.inventory by the
+potion_count_* triggers, so /inventory/audit never has to aggregate.
+potion_recipes.reserved is the sum of the recipe's stock_holds, kept by the
+reserved_* triggers.
+"""
+
+import argparse
+import sys
+
+from src import database as db
+from src.lazy import lazy_import
+
+queries = lazy_import("src.queries")
+
+
+def recompute(conn) -> None:
+    """
+    Rebuild every shop's potion_count from potion_recipes and every recipe's
+    reserved from stock_holds (after TRUNCATE or COPY).
+    """
+    conn.execute(queries.POTION_COUNT_RECOMPUTE)
+    conn.execute(queries.RESERVED_RECOMPUTE)
+
+
+def verify(fix: bool = False) -> list[str]:
+    """Return a description of every total, in any shop, that doesn't match a recompute."""
+    with db.engine.begin() as conn:
+        problems = [
+            f"shop {row.shop_id}: potion_count is {row.potion_count}, "
+            f"potion_recipes hold {row.actual}"
+            for row in conn.execute(queries.POTION_COUNT_CHECK)
+            if row.potion_count != row.actual
+        ]
+        problems += [
+            f"shop {row.shop_id}: {row.sku} has {row.reserved} reserved, "
+            f"stock_holds hold {row.held}"
+            for row in conn.execute(queries.RESERVED_CHECK)
+        ]
+        if problems and fix:
+            recompute(conn)
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--fix", action="store_true", help="rewrite drifted totals")
+    args = parser.parse_args()
+
+    problems = verify(fix=args.fix)
+    for p in problems:
+        print(p)
+    if not problems:
+        print("audit totals match")
+    elif args.fix:
+        print("fixed")
+    sys.exit(1 if problems and not args.fix else 0)
@@ -2,24 +2,144 @@ from dotenv import load_dotenv, find_dotenv
 import os
 from functools import lru_cache
 
-# Load default first
-load_dotenv(dotenv_path="default.env", override=False)
+POOL_MODES = ("queue", "pooler")
+STORAGE_BACKENDS = ("postgres", "memory")
 
-# Then override with .env if available
-load_dotenv(dotenv_path=find_dotenv(".env"), override=True)
 
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _load_env() -> None:
+    # Load default first
+    load_dotenv(dotenv_path="default.env", override=False)
+
+    # Then override with .env if available
+    load_dotenv(dotenv_path=find_dotenv(".env"), override=True)
 
-class Settings:
-    API_KEY: str | None = os.getenv("API_KEY")
-    POSTGRES_URI: str | None = os.getenv("POSTGRES_URI")
 
+class Settings:
     def __init__(self):
+        self.API_KEY: str | None = os.getenv("API_KEY")
+        # where game state lives (src.storage); "memory" needs no Postgres and
+        # starts shop 1 with src.recipe_gen's recipes at MEMORY_RECIPE_STEP
+        self.STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "postgres").strip().lower()
+        self.MEMORY_RECIPE_STEP: int = int(os.getenv("MEMORY_RECIPE_STEP", "5"))
+        self.POSTGRES_URI: str | None = os.getenv("POSTGRES_URI")
+        # direct (non-pooled) URI for LISTEN; a transaction pooler can't hold one
+        self.POSTGRES_LISTEN_URI: str | None = os.getenv("POSTGRES_LISTEN_URI")
+        # replica (or any second Postgres) for read-only endpoints; unset
+        # sends everything to POSTGRES_URI
+        self.POSTGRES_READ_URI: str | None = os.getenv("POSTGRES_READ_URI")
+        # reads go back to the primary while the replica is further behind
+        self.READ_MAX_LAG_SECONDS: float = float(os.getenv("READ_MAX_LAG_SECONDS", "5.0"))
+        self.READ_LAG_CHECK_SECONDS: float = float(
+            os.getenv("READ_LAG_CHECK_SECONDS", "1.0")
+        )
+
+        # production server (src.serve): worker processes, and how many
+        # connections to POSTGRES_URI all of them together may hold (a
+        # POSTGRES_READ_URI read engine gets pools of the same size, uncounted)
+        self.WEB_CONCURRENCY: int = int(
+            os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))
+        )
+        budget = os.getenv("DB_CONNECTION_BUDGET")
+        self.DB_CONNECTION_BUDGET: int | None = int(budget) if budget else None
+        # how long a stopping worker lets in-flight requests finish
+        self.SHUTDOWN_GRACE_SECONDS: float = float(
+            os.getenv("SHUTDOWN_GRACE_SECONDS", "25")
+        )
+
+        # "queue": persistent SQLAlchemy pool per process
+        # "pooler": no local pool, for running behind a transaction-mode pooler
+        self.DB_POOL_MODE: str = os.getenv("DB_POOL_MODE", "queue").strip().lower()
+        self.DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+        self.DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+        if self.DB_CONNECTION_BUDGET:
+            # each worker's share, less the connection its cache-invalidation
+            # listener holds; half pooled, half burst
+            per_worker = self.DB_CONNECTION_BUDGET // max(1, self.WEB_CONCURRENCY) - 1
+            if per_worker < 2:
+                raise ValueError(
+                    "DB_CONNECTION_BUDGET must leave each of the WEB_CONCURRENCY "
+                    "workers at least 3 connections."
+                )
+            self.DB_POOL_SIZE = per_worker // 2
+            self.DB_MAX_OVERFLOW = per_worker - self.DB_POOL_SIZE
+        self.DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "300"))
+        self.DB_POOL_PRE_PING: bool = _env_bool("DB_POOL_PRE_PING", "false")
+        # executions of a statement on one connection before psycopg prepares
+        # it server-side; 0 prepares on first use, "none" never prepares
+        threshold = os.getenv("DB_PREPARE_THRESHOLD", "5").strip().lower()
+        self.DB_PREPARE_THRESHOLD: int | None = (
+            None if threshold in ("", "none") else int(threshold)
+        )
+
+        # seconds each worker remembers which shop an API key belongs to
+        # (src.tenancy); a deleted shop's key keeps working this long
+        self.KEY_CACHE_SECONDS: float = float(os.getenv("KEY_CACHE_SECONDS", "60"))
+
+        # admission control (src.api.admission): requests running at once,
+        # by default one per pooled connection, and how much of that browsing
+        # may take before it is shed
+        self.ADMISSION_MAX_INFLIGHT: int = int(
+            os.getenv(
+                "ADMISSION_MAX_INFLIGHT", str(self.DB_POOL_SIZE + self.DB_MAX_OVERFLOW)
+            )
+        )
+        low_limit = os.getenv("ADMISSION_LOW_LIMIT")
+        self.ADMISSION_LOW_LIMIT: int | None = int(low_limit) if low_limit else None
+        low_queue = os.getenv("ADMISSION_LOW_QUEUE")
+        self.ADMISSION_LOW_QUEUE: int | None = int(low_queue) if low_queue else None
+        self.ADMISSION_LOW_WAIT_SECONDS: float = float(
+            os.getenv("ADMISSION_LOW_WAIT_SECONDS", "0.25")
+        )
+
+        self.SNAPSHOT_DIR: str = os.getenv("SNAPSHOT_DIR", "snapshots")
+
+        # daily cart partitions (src.archive)
+        self.ARCHIVE_DIR: str = os.getenv("ARCHIVE_DIR", "archive")
+        self.CART_RETENTION_DAYS: int = int(os.getenv("CART_RETENTION_DAYS", "7"))
+        self.PARTITION_PREMAKE_DAYS: int = int(os.getenv("PARTITION_PREMAKE_DAYS", "3"))
+
+        self.CACHE_VERSION_CHECK_SECONDS: float = float(
+            os.getenv("CACHE_VERSION_CHECK_SECONDS", "1.0")
+        )
+
+        # abandoned-cart sweeper (src.sweeper): carts left open longer than
+        # CART_EXPIRY_TICKS game ticks of TICK_SECONDS each are deleted
+        self.TICK_SECONDS: int = int(os.getenv("TICK_SECONDS", "7200"))
+        self.CART_EXPIRY_TICKS: int = int(os.getenv("CART_EXPIRY_TICKS", "12"))
+        self.SWEEP_INTERVAL_SECONDS: float = float(
+            os.getenv("SWEEP_INTERVAL_SECONDS", "60")
+        )
+        self.SWEEP_BATCH_SIZE: int = int(os.getenv("SWEEP_BATCH_SIZE", "500"))
+
+        # adding a potion to a cart holds that much stock for this long; the
+        # sweeper releases expired holds
+        self.STOCK_HOLD_SECONDS: float = float(os.getenv("STOCK_HOLD_SECONDS", "900"))
+
+        # outbox consumer (src.events): events per batch, idle sleep
+        self.EVENT_BATCH_SIZE: int = int(os.getenv("EVENT_BATCH_SIZE", "500"))
+        self.EVENT_POLL_SECONDS: float = float(os.getenv("EVENT_POLL_SECONDS", "1.0"))
+
         if not self.API_KEY:
             raise ValueError("API_KEY is missing in the environment variables.")
-        if not self.POSTGRES_URI:
+        if self.STORAGE_BACKEND not in STORAGE_BACKENDS:
+            raise ValueError(
+                f"STORAGE_BACKEND must be one of {', '.join(STORAGE_BACKENDS)}."
+            )
+        if not self.POSTGRES_URI and self.STORAGE_BACKEND == "postgres":
             raise ValueError("POSTGRES_URI is missing in the environment variables.")
+        if self.DB_POOL_MODE not in POOL_MODES:
+            raise ValueError(f"DB_POOL_MODE must be one of {', '.join(POOL_MODES)}.")
 
 
 @lru_cache()
 def get_settings():
+    """
+    Settings are read on first use rather than at import, so a cold start
+    only pays for them once something actually needs them.
+    """
+    _load_env()
     return Settings()
@@ -1,5 +1,124 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
 from src import config
-from sqlalchemy import create_engine
+from src.lazy import lazy_import
+
+queries = lazy_import("src.queries")
+
+logger = logging.getLogger(__name__)
+
+
+def engine_options(settings: config.Settings) -> dict:
+    """create_engine() keyword arguments for the configured DB_POOL_MODE."""
+    from sqlalchemy import pool
+
+    if settings.DB_POOL_MODE == "pooler":
+        # The external pooler (pgbouncer, Supabase transaction pooler) owns the
+        # server connections, so keep none of our own. It may also run our next
+        # transaction on a different backend, where a statement psycopg
+        # prepared earlier doesn't exist; prepare_threshold=None turns that off.
+        return {
+            "poolclass": pool.NullPool,
+            "connect_args": {"prepare_threshold": None},
+        }
+
+    # Recycling connections before server/proxy idle timeouts close them
+    # replaces pre-ping's extra round trip on every checkout. LIFO keeps a few
+    # hot connections busy and lets the rest go idle and get recycled.
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_use_lifo": True,
+        "connect_args": {"prepare_threshold": settings.DB_PREPARE_THRESHOLD},
+    }
+
+
+@lru_cache()
+def get_engine():
+    # imported here: loading the dialect pulls in psycopg, which a cold start
+    # shouldn't pay for until the first query
+    from sqlalchemy import create_engine
+
+    settings = config.get_settings()
+    return create_engine(settings.POSTGRES_URI, **engine_options(settings))
+
+
+@lru_cache()
+def get_read_engine():
+    """Engine for POSTGRES_READ_URI, or None when reads share the primary."""
+    settings = config.get_settings()
+    if not settings.POSTGRES_READ_URI:
+        return None
+    from sqlalchemy import create_engine
+
+    # BEGIN ISOLATION LEVEL REPEATABLE READ READ ONLY DEFERRABLE: one
+    # snapshot per request, and nothing on the replica can take an xid.
+    # (Standbys refuse SERIALIZABLE, the only level DEFERRABLE changes.)
+    return create_engine(
+        settings.POSTGRES_READ_URI, **engine_options(settings)
+    ).execution_options(
+        isolation_level="REPEATABLE READ",
+        postgresql_readonly=True,
+        postgresql_deferrable=True,
+    )
+
+
+class _ReplicaLag:
+    """Whether the read engine is within READ_MAX_LAG_SECONDS, re-checked at most
+    every READ_LAG_CHECK_SECONDS so the check doesn't cost a round trip per read."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked_at = float("-inf")
+        self._fresh = False
+
+    def fresh(self, engine) -> bool:
+        settings = config.get_settings()
+        if time.monotonic() - self._checked_at < settings.READ_LAG_CHECK_SECONDS:
+            return self._fresh
+        if not self._lock.acquire(blocking=False):
+            return self._fresh  # another thread is checking
+        try:
+            try:
+                with engine.connect() as conn:
+                    lag = conn.execute(queries.REPLICA_LAG).scalar_one()
+                fresh = lag <= settings.READ_MAX_LAG_SECONDS
+                if fresh != self._fresh:
+                    logger.info("read replica %s (lag %.1fs)",
+                                "in use" if fresh else "too far behind", lag)
+            except Exception:
+                logger.warning("read replica unreachable", exc_info=True)
+                fresh = False
+            self._fresh, self._checked_at = fresh, time.monotonic()
+            return fresh
+        finally:
+            self._lock.release()
+
+
+replica_lag = _ReplicaLag()
+
+
+@contextmanager
+def read():
+    """
+    A transaction for handlers that only read: on the read engine while it's
+    fresh enough, otherwise on the primary like db.engine.begin().
+    """
+    engine = get_read_engine()
+    if engine is None or not replica_lag.fresh(engine):
+        engine = get_engine()
+    with engine.begin() as conn:
+        yield conn
+
 
-connection_url = config.get_settings().POSTGRES_URI
-engine = create_engine(connection_url, pool_pre_ping=True)
+def __getattr__(name: str):
+    # keeps `db.engine` working everywhere while building it on first access
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
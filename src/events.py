@@ -0,0 +1,197 @@
+"""
+Transactional outbox for shop events.
+
+Endpoints that change state call emit() inside the transaction that makes
+the change, so an event exists exactly when its change committed and the
+request pays for one INSERT. Analytics, rollups and cache refreshes register
+with @handler and run later, off the request path, in the consumer each
+worker starts from the app lifespan.
+
+Delivery is at-least-once. Handlers get the consumer's connection and the
+checkpoint moves in that same transaction, so a handler that raises (or a
+worker that dies mid-batch) sees the whole batch again. Handlers that only
+write to Postgres through that connection are effectively exactly-once;
+anything else must tolerate duplicates.
+
+Only one worker drains a consumer at a time; the others find its checkpoint
+row locked and go back to sleep.
+"""
+
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable
+
+from src import config, tenancy
+from src import database as db
+from src.lazy import lazy_import
+
+queries = lazy_import("src.queries")
+
+logger = logging.getLogger(__name__)
+
+# event kinds
+CART_CREATED = "cart_created"
+CART_ITEM_SET = "cart_item_set"
+CHECKOUT = "checkout"
+BOTTLES_DELIVERED = "bottles_delivered"
+BARRELS_DELIVERED = "barrels_delivered"
+CAPACITY_DELIVERED = "capacity_delivered"
+TICK = "tick"
+
+ALL = "*"
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    shop_id: int
+    kind: str
+    payload: dict
+    created_at: datetime
+
+
+Handler = Callable[[Any, list[Event]], None]
+
+_handlers: dict[str, list[Handler]] = {}
+
+
+def emit(conn, kind: str, payload: dict) -> None:
+    """
+    Record an event for the current shop; it's delivered only if conn's
+    transaction commits.
+    """
+    conn.execute(
+        queries.EVENT_EMIT,
+        {
+            "shop": tenancy.current(),
+            "kind": kind,
+            "payload": json.dumps(payload, separators=(",", ":")),
+        },
+    )
+
+
+def handler(*kinds: str, registry: dict[str, list[Handler]] | None = None):
+    """
+    Register fn(conn, events) for the given kinds (or ALL). It's called once
+    per batch with that batch's matching events, in commit order. A batch
+    can hold events from every shop; each one carries its shop_id.
+    """
+    registry = _handlers if registry is None else registry
+
+    def register(fn: Handler) -> Handler:
+        for kind in kinds:
+            registry.setdefault(kind, []).append(fn)
+        return fn
+
+    return register
+
+
+class Consumer:
+    def __init__(
+        self,
+        name: str = "shop",
+        handlers: dict[str, list[Handler]] | None = None,
+        batch_size: int | None = None,
+        poll_interval: float | None = None,
+    ):
+        self.name = name
+        self.handlers = _handlers if handlers is None else handlers
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self._created = False
+        self._task: asyncio.Task | None = None
+
+    @property
+    def batch_size(self) -> int:
+        if self._batch_size is None:
+            return config.get_settings().EVENT_BATCH_SIZE
+        return self._batch_size
+
+    @property
+    def poll_interval(self) -> float:
+        if self._poll_interval is None:
+            return config.get_settings().EVENT_POLL_SECONDS
+        return self._poll_interval
+
+    def _dispatch(self, conn, events: list[Event]) -> None:
+        for kind, fns in self.handlers.items():
+            matching = events if kind == ALL else [e for e in events if e.kind == kind]
+            if matching:
+                for fn in fns:
+                    fn(conn, matching)
+
+    def drain_once(self) -> int:
+        """Deliver one batch and checkpoint past it; returns its size."""
+        if not self._created:
+            with db.engine.begin() as conn:
+                conn.execute(queries.EVENT_CHECKPOINT_CREATE, {"consumer": self.name})
+            self._created = True
+
+        with db.engine.begin() as conn:
+            checkpoint = conn.execute(
+                queries.EVENT_CHECKPOINT_CLAIM, {"consumer": self.name}
+            ).first()
+            if checkpoint is None:
+                return 0  # another worker is draining
+
+            rows = conn.execute(
+                queries.EVENTS_BATCH,
+                {
+                    "last_txid": checkpoint.last_txid,
+                    "last_id": checkpoint.last_id,
+                    "limit": self.batch_size,
+                },
+            ).all()
+            if not rows:
+                return 0
+
+            self._dispatch(
+                conn, [Event(r.id, r.shop_id, r.kind, r.payload, r.created_at) for r in rows]
+            )
+            moved = {
+                "consumer": self.name,
+                "from_txid": checkpoint.last_txid,
+                "from_id": checkpoint.last_id,
+                "last_txid": rows[-1].txid,
+                "last_id": rows[-1].id,
+            }
+            conn.execute(queries.EVENT_CHECKPOINT_SAVE, moved)
+            conn.execute(queries.EVENTS_PRUNE, moved)
+        return len(rows)
+
+    async def run(self) -> None:
+        """Drain forever, sleeping whenever a batch comes back short."""
+        failures = 0
+        while True:
+            try:
+                drained = await asyncio.to_thread(self.drain_once)
+                failures = 0
+            except Exception:
+                failures += 1
+                logger.exception("event consumer %s failed, retrying", self.name)
+                await asyncio.sleep(min(self.poll_interval * 2**failures, 30.0))
+                continue
+            if drained < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    def start(self) -> None:
+        if config.get_settings().STORAGE_BACKEND != "postgres":
+            logger.info("no outbox with STORAGE_BACKEND=memory; event consumer not started")
+            return
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+consumer = Consumer()
@@ -0,0 +1,244 @@
+"""
+Cross-worker cache invalidation over Postgres LISTEN/NOTIFY.
+
+Writers call publish() inside their own transaction. The version bump and the
+NOTIFY both become visible only when that transaction commits, so a worker
+never hears about a change it can't read yet.
+
+Every worker runs one listener thread that evicts its LocalCaches when a
+notification arrives. Notifications can be missed (listener reconnecting,
+worker paused by the OS), so each cache also compares its version against
+cache_versions at most once every check_interval seconds.
+
+Versions are per shop: a checkout in one shop evicts that shop's copy of
+the catalog and leaves every other shop's cached.
+
+LISTEN needs a session of its own, which a transaction-mode pooler can't
+give us; in DB_POOL_MODE=pooler the listener only runs when
+POSTGRES_LISTEN_URI points at Postgres directly. With STORAGE_BACKEND=memory
+there is no listener either: the one worker's own commits bump its caches.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable
+
+from src import config, storage, tenancy
+from src.lazy import lazy_import
+
+sa = lazy_import("sqlalchemy")
+queries = lazy_import("src.queries")
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "shop_cache"
+
+# topics, one row per shop each in cache_versions
+INVENTORY = "inventory"  # global_inventory (gold, ml)
+RECIPES = "recipes"  # potion_recipes (stock, prices)
+TOPICS = (INVENTORY, RECIPES)
+
+_MISSING = object()
+
+
+def publish(conn, *topics: str) -> None:
+    """Bump the current shop's topics and notify every worker once conn commits."""
+    conn.execute(
+        queries.CACHE_PUBLISH, {"shop": tenancy.current(), "topics": list(topics)}
+    )
+
+
+def publish_all_shops(conn, *topics: str) -> None:
+    """publish() for every shop at once (state restored wholesale)."""
+    conn.execute(queries.CACHE_PUBLISH_ALL_SHOPS, {"topics": list(topics)})
+
+
+class _Entry:
+    """One shop's copy of a LocalCache value."""
+
+    __slots__ = ("lock", "value", "version", "seen")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value: Any = _MISSING
+        self.version = -1  # version the cached value was loaded at
+        self.seen = -1  # newest version we've heard about
+
+
+class LocalCache:
+    """
+    One cached value belonging to a topic, reloaded on demand. Each shop
+    gets its own copy, loaded and evicted independently; get() and the
+    loader, which gets a storage transaction, work for tenancy.current().
+    """
+
+    def __init__(self, bus: "InvalidationBus", topic: str, loader: Callable):
+        self.topic = topic
+        self._bus = bus
+        self._loader = loader
+        self._entries: dict[int, _Entry] = {}
+
+    def _entry(self, shop_id: int) -> _Entry:
+        entry = self._entries.get(shop_id)
+        if entry is None:
+            entry = self._entries.setdefault(shop_id, _Entry())
+        return entry
+
+    def get(self) -> Any:
+        shop_id = tenancy.current()
+        entry = self._entry(shop_id)
+        seen = max(entry.seen, self._bus.known_version(shop_id, self.topic))
+        if entry.value is not _MISSING and entry.version >= seen:
+            return entry.value
+
+        with entry.lock:
+            # seen may come from the bus alone; entry.seen may have moved on
+            # while we waited for the lock
+            seen = max(seen, entry.seen)
+            if entry.value is not _MISSING and entry.version >= seen:
+                return entry.value
+            store = storage.get()
+            version, value = self._load(store.read)
+            if version < seen:
+                # the replica hasn't replayed the change we were told about
+                version, value = self._load(store.transaction)
+            entry.value, entry.version = value, version
+            entry.seen = max(entry.seen, seen, version)
+            return value
+
+    def _load(self, transaction: Callable) -> tuple[int, Any]:
+        with transaction() as tx:
+            # version first: data read after it is at least that new
+            version = tx.cache_version(self.topic)
+            return version, self._loader(tx)
+
+    def invalidate(self, shop_id: int | None = None, version: int | None = None) -> None:
+        """Evict one shop's copy (every shop's without shop_id), or note version."""
+        if shop_id is None:
+            for each in self._entries.values():
+                each.value = _MISSING
+            return
+        entry = self._entries.get(shop_id)
+        if entry is None:
+            return  # nothing cached; the first get() asks the bus
+        if version is None:
+            entry.value = _MISSING
+        else:
+            # an in-flight load may finish with an older version; seen makes
+            # the next get() reload instead of trusting it
+            entry.seen = max(entry.seen, version)
+
+
+class InvalidationBus:
+    def __init__(self, check_interval: float | None = None):
+        self._check_interval = check_interval
+        self._caches: dict[str, list[LocalCache]] = {}
+        self._versions: dict[tuple[int, str], int] = {}
+        self._checked_at = 0.0
+        self._check_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def check_interval(self) -> float:
+        if self._check_interval is None:
+            self._check_interval = config.get_settings().CACHE_VERSION_CHECK_SECONDS
+        return self._check_interval
+
+    def cache(self, topic: str, loader: Callable) -> LocalCache:
+        """Register a cache whose value is loader(tx), evicted on topic changes."""
+        c = LocalCache(self, topic, loader)
+        self._caches.setdefault(topic, []).append(c)
+        return c
+
+    def known_version(self, shop_id: int, topic: str) -> int:
+        """Latest version of a shop's topic, re-read from the database when the check is due."""
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self._check_versions()
+        return self._versions.get((shop_id, topic), -1)
+
+    def _check_versions(self) -> None:
+        if not self._check_lock.acquire(blocking=False):
+            return  # another thread is already checking
+        try:
+            # one small read covers every shop
+            for shop_id, topic, version in storage.get().cache_versions():
+                self.bump(shop_id, topic, version)
+            self._checked_at = time.monotonic()
+        finally:
+            self._check_lock.release()
+
+    def bump(self, shop_id: int, topic: str, version: int) -> None:
+        """A shop's topic reached version: evict what's older."""
+        if version > self._versions.get((shop_id, topic), -1):
+            self._versions[shop_id, topic] = version
+        for c in self._caches.get(topic, ()):
+            c.invalidate(shop_id, version)
+
+    def invalidate_all(self) -> None:
+        for caches in self._caches.values():
+            for c in caches:
+                c.invalidate()
+
+    # listener
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        if config.get_settings().STORAGE_BACKEND != "postgres":
+            return
+        if self._listen_url() is None:
+            logger.info(
+                "no POSTGRES_LISTEN_URI in pooler mode; caches rely on version checks"
+            )
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._listen, name="cache-invalidation", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    @staticmethod
+    def _listen_url() -> str | None:
+        settings = config.get_settings()
+        uri = settings.POSTGRES_LISTEN_URI
+        if uri is None and settings.DB_POOL_MODE != "pooler":
+            uri = settings.POSTGRES_URI
+        if uri is None:
+            return None
+        return sa.engine.make_url(uri).set(drivername="postgresql").render_as_string(
+            hide_password=False
+        )
+
+    def _listen(self) -> None:
+        import psycopg
+
+        url = self._listen_url()
+        if url is None:
+            return  # start() doesn't start us without one
+        backoff = 0.5
+        while not self._stop.is_set():
+            try:
+                with psycopg.connect(url, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {CHANNEL}")
+                    # anything could have changed while we weren't listening
+                    self.invalidate_all()
+                    backoff = 0.5
+                    while not self._stop.is_set():
+                        for n in conn.notifies(timeout=1.0):
+                            shop_id, topic, version = n.payload.split(":")
+                            self.bump(int(shop_id), topic, int(version))
+            except psycopg.Error as e:
+                logger.warning("cache listener disconnected: %s", e)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30)
+
+
+bus = InvalidationBus()
@@ -0,0 +1,539 @@
+"""
+Every statement the API runs against Postgres, built once at import.
+
+Handlers execute these constants instead of building sqlalchemy.text()
+objects per call. That keeps the SQL string byte-identical across calls,
+which is what lets psycopg turn a statement into a server-side prepared
+statement once it has run DB_PREPARE_THRESHOLD times on a connection; from
+then on Postgres skips parsing and planning it. The Postgres storage backend
+(src.storage.postgres) and the tools beside it load this module lazily (see
+src.lazy) so cold starts don't pay for SQLAlchemy.
+"""
+
+import sqlalchemy as sa
+
+# global_inventory
+
+# the columns of src.storage.Inventory
+INVENTORY_ROW = sa.text(
+    """
+    SELECT gold, red_ml, green_ml, blue_ml, dark_ml,
+           red_potions, green_potions, blue_potions, dark_potions, potion_count
+    FROM global_inventory
+    WHERE shop_id = :shop
+    """
+)
+
+INVENTORY_CREATE = sa.text(
+    "INSERT INTO global_inventory (shop_id, gold) VALUES (:shop, 0) ON CONFLICT DO NOTHING"
+)
+
+INVENTORY_RESET = sa.text(
+    """
+    UPDATE global_inventory
+    SET gold = 100,
+        red_ml = 0, green_ml = 0, blue_ml = 0, dark_ml = 0,
+        red_potions = 0, green_potions = 0, blue_potions = 0,
+        dark_potions = 0, potion_count = 0
+    WHERE shop_id = :shop
+    """
+)
+
+INVENTORY_ADD_BARRELS = sa.text(
+    """
+    UPDATE global_inventory
+    SET gold       = gold - :gold_paid,
+        red_ml     = red_ml   + :add_r,
+        green_ml   = green_ml + :add_g,
+        blue_ml    = blue_ml  + :add_b
+    WHERE shop_id = :shop
+    """
+)
+
+INVENTORY_USE_ML = sa.text(
+    """
+    UPDATE global_inventory
+    SET red_ml   = red_ml   - :rml,
+        green_ml = green_ml - :gml,
+        blue_ml  = blue_ml  - :bml
+    WHERE shop_id = :shop
+    """
+)
+
+INVENTORY_ADD_GOLD = sa.text(
+    "UPDATE global_inventory SET gold = gold + :g WHERE shop_id = :shop"
+)
+
+# full recompute of the trigger-maintained potion_count, every shop (src.audit)
+POTION_COUNT_CHECK = sa.text(
+    """
+    SELECT g.shop_id,
+           g.potion_count,
+           (SELECT COALESCE(SUM(p.inventory), 0) FROM potion_recipes p
+            WHERE p.shop_id = g.shop_id) AS actual
+    FROM global_inventory g
+    ORDER BY g.shop_id
+    """
+)
+
+POTION_COUNT_RECOMPUTE = sa.text(
+    """
+    UPDATE global_inventory g
+    SET potion_count = (SELECT COALESCE(SUM(p.inventory), 0) FROM potion_recipes p
+                        WHERE p.shop_id = g.shop_id)
+    """
+)
+
+# recipes whose reserved count isn't the sum of their holds
+RESERVED_CHECK = sa.text(
+    """
+    SELECT p.shop_id, p.sku, p.reserved, COALESCE(h.held, 0) AS held
+    FROM potion_recipes p
+    LEFT JOIN (
+        SELECT recipe_id, SUM(quantity) AS held FROM stock_holds GROUP BY recipe_id
+    ) h ON h.recipe_id = p.id
+    WHERE p.reserved <> COALESCE(h.held, 0)
+    ORDER BY p.shop_id, p.id
+    """
+)
+
+RESERVED_RECOMPUTE = sa.text(
+    """
+    UPDATE potion_recipes p
+    SET reserved = COALESCE(h.held, 0)
+    FROM potion_recipes r
+    LEFT JOIN (
+        SELECT recipe_id, SUM(quantity) AS held FROM stock_holds GROUP BY recipe_id
+    ) h ON h.recipe_id = r.id
+    WHERE p.id = r.id AND r.reserved <> COALESCE(h.held, 0)
+    """
+)
+
+# potion_recipes
+
+RECIPE_BY_SKU = sa.text(
+    "SELECT id, price, inventory FROM potion_recipes WHERE shop_id = :shop AND sku = :s"
+)
+
+RECIPE_BY_MIX = sa.text(
+    """
+    SELECT id FROM potion_recipes
+    WHERE shop_id = :shop
+      AND red_pct = :r AND green_pct = :g AND blue_pct = :b AND dark_pct = :d
+    """
+)
+
+# the next recipes, in id order, that use no more than r/g/b percent of each
+RECIPE_MIXES = sa.text(
+    """
+    SELECT id, red_pct, green_pct, blue_pct, dark_pct FROM potion_recipes
+    WHERE shop_id = :shop AND id > :last_id
+      AND red_pct <= :r AND green_pct <= :g AND blue_pct <= :b
+    ORDER BY id
+    LIMIT :limit
+    """
+)
+
+# what customers can still add: stock no open cart holds
+CATALOG = sa.text(
+    """
+    SELECT sku, name, price, red_pct, green_pct, blue_pct, dark_pct,
+           inventory - reserved AS inventory
+    FROM potion_recipes
+    WHERE shop_id = :shop AND inventory > reserved
+    ORDER BY id
+    LIMIT 6
+    """
+)
+
+# after HOLDS_RESET, so reserved is 0 and this is every recipe with stock
+RECIPES_CLEAR_STOCK = sa.text(
+    "UPDATE potion_recipes SET inventory = 0 WHERE shop_id = :shop AND inventory > reserved"
+)
+
+RECIPE_ADD_STOCK = sa.text(
+    """
+    UPDATE potion_recipes SET inventory = inventory + :qty
+    WHERE id = :rid AND shop_id = :shop
+    """
+)
+
+RECIPE_REMOVE_STOCK = sa.text(
+    """
+    UPDATE potion_recipes SET inventory = inventory - :qty
+    WHERE id = :rid AND shop_id = :shop
+    """
+)
+
+# checkout: the availability check and the decrement are one statement, so
+# a concurrent checkout can't slip in between them. No row: not enough stock
+# that isn't held for another cart.
+RECIPE_SELL = sa.text(
+    """
+    UPDATE potion_recipes SET inventory = inventory - :qty
+    WHERE id = :rid AND shop_id = :shop AND inventory - reserved >= :qty
+    RETURNING id
+    """
+)
+
+# bulk recipe loads (src.recipe_gen)
+
+RECIPE_LOAD_TABLE = sa.text(
+    """
+    CREATE TEMPORARY TABLE recipe_load
+    (LIKE potion_recipes INCLUDING DEFAULTS) ON COMMIT DROP
+    """
+)
+
+# temp tables are never auto-analyzed; without stats the upsert plans for ~1k rows
+RECIPE_LOAD_ANALYZE = sa.text("ANALYZE recipe_load")
+
+RECIPE_LOAD_UPSERT = sa.text(
+    """
+    INSERT INTO potion_recipes
+        (shop_id, sku, name, price, red_pct, green_pct, blue_pct, dark_pct)
+    SELECT l.shop_id, l.sku, l.name, l.price, l.red_pct, l.green_pct, l.blue_pct, l.dark_pct
+    FROM recipe_load l
+    WHERE NOT EXISTS (
+        SELECT 1 FROM potion_recipes p
+        WHERE p.shop_id = l.shop_id
+          AND p.red_pct = l.red_pct AND p.green_pct = l.green_pct
+          AND p.blue_pct = l.blue_pct AND p.dark_pct = l.dark_pct
+          AND p.sku <> l.sku
+    )
+    ON CONFLICT (shop_id, sku) DO UPDATE
+    SET name = EXCLUDED.name,
+        price = EXCLUDED.price,
+        red_pct = EXCLUDED.red_pct,
+        green_pct = EXCLUDED.green_pct,
+        blue_pct = EXCLUDED.blue_pct,
+        dark_pct = EXCLUDED.dark_pct
+    WHERE (potion_recipes.name, potion_recipes.price)
+        IS DISTINCT FROM (EXCLUDED.name, EXCLUDED.price)
+    """
+)
+
+# carts
+
+CART_CREATE = sa.text(
+    """
+    INSERT INTO carts (shop_id, customer_id, customer_name)
+    VALUES (:shop, :cid, :cname)
+    RETURNING id
+    """
+)
+
+# cart_items is partitioned on its cart's created_at; no row means no cart, or
+# one already checked out (its holds are gone and nothing would release new
+# ones before they expire). The key-share lock makes the sweeper skip the cart rather than delete it
+# from under the insert.
+CART_SET_ITEM = sa.text(
+    """
+    INSERT INTO cart_items (shop_id, cart_id, cart_created_at, recipe_id, quantity)
+    SELECT shop_id, id, created_at, :rid, :qty
+    FROM carts
+    WHERE id = :cid AND shop_id = :shop AND NOT checked_out
+    FOR KEY SHARE
+    ON CONFLICT (cart_id, recipe_id, cart_created_at)
+    DO UPDATE SET quantity = EXCLUDED.quantity
+    """
+)
+
+CART_ITEMS_FOR_CHECKOUT = sa.text(
+    """
+    SELECT pr.id AS recipe_id,
+           pr.price,
+           pr.inventory,
+           ci.quantity
+    FROM cart_items ci
+    JOIN potion_recipes pr ON pr.id = ci.recipe_id
+    WHERE ci.cart_id = :cid AND ci.shop_id = :shop
+    ORDER BY pr.id
+    """
+)
+
+# first statement of a checkout: claims the cart (a second checkout gets no
+# row) and row-locks it so the sweeper passes it by
+CART_MARK_CHECKED_OUT = sa.text(
+    """
+    UPDATE carts SET checked_out = TRUE
+    WHERE id = :cid AND shop_id = :shop AND NOT checked_out
+    RETURNING id
+    """
+)
+
+# one bounded batch of abandoned carts, any shop; their cart_items go by cascade
+CARTS_SWEEP = sa.text(
+    """
+    WITH expired AS (
+        SELECT id, created_at
+        FROM carts
+        WHERE NOT checked_out
+          AND created_at < now() - make_interval(secs => :max_age)
+        ORDER BY created_at
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    )
+    DELETE FROM carts c
+    USING expired e
+    WHERE c.id = e.id AND c.created_at = e.created_at
+    """
+)
+
+# cart_items go by cascade; other shops' carts stay
+CARTS_RESET = sa.text("DELETE FROM carts WHERE shop_id = :shop")
+
+# stock holds; the reserved_* triggers keep potion_recipes.reserved in step
+
+# sets the cart's hold on a recipe to :qty, if the stock no other cart holds
+# covers it. The recipe row is locked first, so the check holds until commit;
+# NO KEY UPDATE, because every cart_items insert key-shares the row, and two
+# carts adding the same recipe would deadlock on FOR UPDATE.
+# No row: not enough stock.
+HOLD_SET = sa.text(
+    """
+    INSERT INTO stock_holds (cart_id, recipe_id, shop_id, quantity, expires_at)
+    SELECT :cid, p.id, p.shop_id, :qty, now() + make_interval(secs => :hold_seconds)
+    FROM potion_recipes p
+    LEFT JOIN stock_holds h ON h.cart_id = :cid AND h.recipe_id = p.id
+    WHERE p.id = :rid AND p.shop_id = :shop
+      AND p.inventory - p.reserved + COALESCE(h.quantity, 0) >= :qty
+    FOR NO KEY UPDATE OF p
+    ON CONFLICT (cart_id, recipe_id)
+    DO UPDATE SET quantity = EXCLUDED.quantity, expires_at = EXCLUDED.expires_at
+    RETURNING recipe_id
+    """
+)
+
+HOLDS_RELEASE = sa.text(
+    "DELETE FROM stock_holds WHERE cart_id = :cid AND shop_id = :shop"
+)
+
+HOLDS_RESET = sa.text("DELETE FROM stock_holds WHERE shop_id = :shop")
+
+# one bounded batch of expired holds, any shop; a row per hold, with its shop
+HOLDS_RELEASE_EXPIRED = sa.text(
+    """
+    WITH expired AS (
+        SELECT cart_id, recipe_id
+        FROM stock_holds
+        WHERE expires_at < now()
+        ORDER BY expires_at
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    )
+    DELETE FROM stock_holds h
+    USING expired e
+    WHERE h.cart_id = e.cart_id AND h.recipe_id = e.recipe_id
+    RETURNING h.shop_id
+    """
+)
+
+# read routing (src.database)
+
+# seconds the read replica is behind; 0 for a primary, or a replica that has
+# replayed everything it received (an idle primary writes nothing to replay)
+REPLICA_LAG = sa.text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(
+            EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())::float8,
+            'Infinity'
+        )
+    END
+    """
+)
+
+# cache invalidation (src.invalidation); notifications read shop:topic:version
+
+CACHE_PUBLISH = sa.text(
+    """
+    WITH bumped AS (
+        UPDATE cache_versions
+        SET version = version + 1
+        WHERE shop_id = :shop AND topic = ANY(:topics)
+        RETURNING shop_id, topic, version
+    )
+    SELECT pg_notify('shop_cache', shop_id || ':' || topic || ':' || version)
+    FROM bumped
+    """
+)
+
+# after a snapshot restore, which replaces every shop's state at once
+CACHE_PUBLISH_ALL_SHOPS = sa.text(
+    """
+    WITH bumped AS (
+        UPDATE cache_versions
+        SET version = version + 1
+        WHERE topic = ANY(:topics)
+        RETURNING shop_id, topic, version
+    )
+    SELECT pg_notify('shop_cache', shop_id || ':' || topic || ':' || version)
+    FROM bumped
+    """
+)
+
+CACHE_VERSIONS = sa.text("SELECT shop_id, topic, version FROM cache_versions")
+
+CACHE_VERSION_OF = sa.text(
+    "SELECT version FROM cache_versions WHERE shop_id = :shop AND topic = :t"
+)
+
+CACHE_TOPICS_CREATE = sa.text(
+    """
+    INSERT INTO cache_versions (shop_id, topic)
+    SELECT :shop, unnest(CAST(:topics AS varchar[]))
+    ON CONFLICT DO NOTHING
+    """
+)
+
+# shops (src.tenancy)
+
+SHOP_BY_KEY = sa.text("SELECT id FROM shops WHERE api_key_sha256 = :key_sha256")
+
+SHOP_CREATE = sa.text(
+    """
+    INSERT INTO shops (name, api_key_sha256)
+    VALUES (:name, :key_sha256)
+    RETURNING id
+    """
+)
+
+SHOPS = sa.text("SELECT id, name, created_at FROM shops ORDER BY id")
+
+# everything the shop owns goes with it (ON DELETE CASCADE)
+SHOP_DELETE = sa.text("DELETE FROM shops WHERE id = :shop")
+
+# shop events outbox (src.events)
+
+EVENT_EMIT = sa.text(
+    """
+    INSERT INTO shop_events (shop_id, kind, payload)
+    VALUES (:shop, :kind, CAST(:payload AS jsonb))
+    """
+)
+
+EVENT_CHECKPOINT_CREATE = sa.text(
+    "INSERT INTO event_checkpoints (consumer) VALUES (:consumer) ON CONFLICT DO NOTHING"
+)
+
+# a worker already draining this consumer holds the row; the others skip it
+EVENT_CHECKPOINT_CLAIM = sa.text(
+    """
+    SELECT last_txid::text AS last_txid, last_id
+    FROM event_checkpoints
+    WHERE consumer = :consumer
+    FOR UPDATE SKIP LOCKED
+    """
+)
+
+# only transactions older than every running one: nothing can still commit
+# behind the last event returned here
+EVENTS_BATCH = sa.text(
+    """
+    SELECT id, shop_id, txid::text AS txid, kind, payload, created_at
+    FROM shop_events
+    WHERE (txid, id) > (CAST(:last_txid AS xid8), :last_id)
+      AND txid < pg_snapshot_xmin(pg_current_snapshot())
+    ORDER BY txid, id
+    LIMIT :limit
+    """
+)
+
+EVENT_CHECKPOINT_SAVE = sa.text(
+    """
+    UPDATE event_checkpoints
+    SET last_txid = CAST(:last_txid AS xid8), last_id = :last_id
+    WHERE consumer = :consumer
+    """
+)
+
+# the batch a consumer just checkpointed past, minus anything a slower
+# consumer still needs; that consumer deletes it when it gets there
+EVENTS_PRUNE = sa.text(
+    """
+    DELETE FROM shop_events
+    WHERE (txid, id) > (CAST(:from_txid AS xid8), :from_id)
+      AND (txid, id) <= (CAST(:last_txid AS xid8), :last_id)
+      AND (txid, id) <= (
+          SELECT last_txid, last_id FROM event_checkpoints
+          ORDER BY last_txid, last_id LIMIT 1
+      )
+    """
+)
+
+# tick history (src.ticks)
+
+# the shop's state as of this tick, straight off its inventory row
+TICK_RECORD = sa.text(
+    """
+    INSERT INTO shop_ticks
+        (shop_id, day, hour, gold, red_ml, green_ml, blue_ml, dark_ml, potion_count)
+    SELECT shop_id, :day, :hour, gold, red_ml, green_ml, blue_ml, dark_ml, potion_count
+    FROM global_inventory
+    WHERE shop_id = :shop
+    """
+)
+
+# rebuilds one shop's day from its ticks, so replaying it changes nothing
+TICK_ROLLUP = sa.text(
+    """
+    INSERT INTO shop_tick_rollups
+    SELECT DISTINCT ON (shop_id)
+        shop_id, CAST(:date AS date), count(*) OVER w, at, day, hour,
+        min(gold) OVER w, max(gold) OVER w,
+        gold, red_ml, green_ml, blue_ml, dark_ml, potion_count
+    FROM shop_ticks
+    WHERE shop_id = :shop
+      AND at >= CAST(:date AS date) AND at < CAST(:date AS date) + 1
+    WINDOW w AS (PARTITION BY shop_id)
+    ORDER BY shop_id, at DESC
+    ON CONFLICT (shop_id, date) DO UPDATE
+    SET ticks = EXCLUDED.ticks, last_at = EXCLUDED.last_at,
+        day = EXCLUDED.day, hour = EXCLUDED.hour,
+        gold_min = EXCLUDED.gold_min, gold_max = EXCLUDED.gold_max,
+        gold = EXCLUDED.gold, red_ml = EXCLUDED.red_ml,
+        green_ml = EXCLUDED.green_ml, blue_ml = EXCLUDED.blue_ml,
+        dark_ml = EXCLUDED.dark_ml, potion_count = EXCLUDED.potion_count
+    """
+)
+
+# one point per :width seconds: the bucket's last tick, its tick count and
+# its gold range
+TICKS_BUCKETED = sa.text(
+    """
+    SELECT DISTINCT ON (bucket)
+        bucket AS at, count(*) OVER w AS ticks, day, hour,
+        min(gold) OVER w AS gold_min, max(gold) OVER w AS gold_max,
+        gold, red_ml, green_ml, blue_ml, dark_ml, potion_count
+    FROM (
+        SELECT date_bin(make_interval(secs => :width), at, TIMESTAMP '2000-01-01') AS bucket, *
+        FROM shop_ticks
+        WHERE shop_id = :shop AND at >= :since AND at < :until
+    ) t
+    WINDOW w AS (PARTITION BY bucket)
+    ORDER BY bucket, t.at DESC
+    """
+)
+
+# the same points from the daily rollups; :width is a whole number of days
+TICK_ROLLUPS_BUCKETED = sa.text(
+    """
+    SELECT DISTINCT ON (bucket)
+        bucket AS at, sum(ticks) OVER w AS ticks, day, hour,
+        min(gold_min) OVER w AS gold_min, max(gold_max) OVER w AS gold_max,
+        gold, red_ml, green_ml, blue_ml, dark_ml, potion_count
+    FROM (
+        SELECT date_bin(
+                   make_interval(secs => :width), CAST(date AS timestamp),
+                   TIMESTAMP '2000-01-01'
+               ) AS bucket, *
+        FROM shop_tick_rollups
+        WHERE shop_id = :shop AND date >= CAST(:since AS date) AND date < :until
+    ) r
+    WINDOW w AS (PARTITION BY bucket)
+    ORDER BY bucket, last_at DESC
+    """
+)
@@ -0,0 +1,126 @@
+"""
+Generate the potion recipe catalog and bulk-load it into potion_recipes.
+
+    python -m src.recipe_gen --step 5      # 1,771 mixes
+    python -m src.recipe_gen --step 1      # all 176,851 mixes
+    python -m src.recipe_gen --shop 3      # another shop's recipe book
+
+Every [r, g, b, d] whose parts are multiples of --step and add up to 100 is
+scored, priced and streamed with COPY into a temporary table, then upserted
+into potion_recipes on sku in the same transaction. Existing stock is kept,
+and a mix that is already on the menu under another sku is left alone.
+"""
+
+import argparse
+import time
+from dataclasses import dataclass
+from typing import Iterator
+
+from src import invalidation, storage, tenancy
+from src.lazy import lazy_import
+
+queries = lazy_import("src.queries")
+
+COLOURS = ("red", "green", "blue", "dark")
+
+# relative cost of 1% of a potion in each colour; dark barrels cost more
+COLOUR_WEIGHT = (1.0, 1.0, 1.0, 1.5)
+BASE_PRICE = 40
+MIX_PREMIUM = 8  # per extra colour in the mix
+MIN_PRICE, MAX_PRICE = 1, 500  # what CatalogItem accepts
+
+
+@dataclass(frozen=True)
+class Recipe:
+    sku: str
+    name: str
+    price: int
+    mix: tuple[int, int, int, int]
+
+
+def mixes(step: int) -> Iterator[tuple[int, int, int, int]]:
+    """Every [r, g, b, d] made of multiples of step that sums to 100."""
+    if step < 1 or 100 % step:
+        raise ValueError("step must be a divisor of 100")
+    for r in range(0, 101, step):
+        for g in range(0, 101 - r, step):
+            for b in range(0, 101 - r - g, step):
+                yield (r, g, b, 100 - r - g - b)
+
+
+def score(mix: tuple[int, int, int, int]) -> float:
+    """
+    How special a mix is: ingredient cost (dark weighs more) plus a premium
+    for every colour beyond the first. A pure red potion scores 1.0.
+    """
+    cost = sum(p * w for p, w in zip(mix, COLOUR_WEIGHT)) / 100
+    colours = sum(1 for p in mix if p)
+    return cost + (colours - 1) * MIX_PREMIUM / BASE_PRICE
+
+
+def price(mix: tuple[int, int, int, int]) -> int:
+    return max(MIN_PRICE, min(MAX_PRICE, round(BASE_PRICE * score(mix))))
+
+
+def sku(mix: tuple[int, int, int, int]) -> str:
+    r, g, b, d = mix
+    return f"R{r}G{g}B{b}D{d}"
+
+
+def name(mix: tuple[int, int, int, int]) -> str:
+    parts = [c for c, p in zip(COLOURS, mix) if p]
+    return f"{'-'.join(parts)} potion ({'/'.join(map(str, mix))})"
+
+
+def recipes(step: int) -> Iterator[Recipe]:
+    for mix in mixes(step):
+        yield Recipe(sku=sku(mix), name=name(mix), price=price(mix), mix=mix)
+
+
+def upsert(conn, step: int) -> int:
+    """
+    Upsert every recipe at this granularity into the current shop on conn;
+    returns rows inserted or changed.
+    """
+    shop = tenancy.current()
+    conn.execute(queries.RECIPE_LOAD_TABLE)
+    cur = conn.connection.driver_connection.cursor()
+    with cur.copy(
+        "COPY recipe_load (shop_id, sku, name, price, red_pct, green_pct, blue_pct, "
+        "dark_pct) FROM STDIN"
+    ) as copy:
+        # pre-formatted text rows in large chunks: several times faster
+        # than write_row, and sku/name never contain tabs or backslashes
+        batch = []
+        for rec in recipes(step):
+            r, g, b, d = rec.mix
+            batch.append(f"{shop}\t{rec.sku}\t{rec.name}\t{rec.price}\t{r}\t{g}\t{b}\t{d}\n")
+            if len(batch) == 10_000:
+                copy.write("".join(batch))
+                batch.clear()
+        copy.write("".join(batch))
+    conn.execute(queries.RECIPE_LOAD_ANALYZE)
+    return conn.execute(queries.RECIPE_LOAD_UPSERT).rowcount
+
+
+def load(step: int) -> int:
+    """
+    Load the recipes into the current shop in their own transaction (upsert()
+    on Postgres), invalidating recipe caches on commit.
+    """
+    with storage.get().transaction() as tx:
+        loaded = tx.load_recipes(step)
+        tx.publish(invalidation.RECIPES)
+    return loaded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--step", type=int, default=5, help="granularity in percent")
+    parser.add_argument("--shop", type=int, default=tenancy.DEFAULT_SHOP)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with tenancy.using(args.shop):
+        n = load(args.step)
+    print(f"upserted {n} recipes in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,148 @@
+"""
+Production server: load the app once, then fork workers that share one
+listening socket.
+
+    python -m src.serve                                 # WEB_CONCURRENCY workers on :3000
+    python -m src.serve --host 0.0.0.0 --port $PORT --workers 4
+
+main.py stays the development server (one process, reloads on save).
+
+The parent imports the app and everything a request needs (SQLAlchemy, the
+psycopg dialect, src.queries) before forking and freezes the garbage
+collector, so workers share those pages copy-on-write instead of each
+importing them again. It opens no database connection and starts no thread:
+engines, pools and the background tasks are created in each worker, on
+first use and in its lifespan. The kernel gives each new connection to
+whichever worker accepts it first.
+
+With DB_CONNECTION_BUDGET set, each worker's pool is its share of that
+budget (src.config), so adding workers never opens more connections than
+Postgres or the pooler allows. The budget covers POSTGRES_URI only: with
+POSTGRES_READ_URI set, each worker also opens a read pool of the same size
+there.
+
+SIGTERM or SIGINT drains: every worker stops accepting, lets the requests
+already in flight (checkouts included) finish for up to
+SHUTDOWN_GRACE_SECONDS, runs the lifespan shutdown and exits. A worker that
+dies any other way is replaced.
+"""
+
+import argparse
+import gc
+import importlib
+import logging
+import os
+import signal
+import socket
+import time
+
+import uvicorn
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+# imported by the parent so every worker shares them
+PRELOAD = ("sqlalchemy", "sqlalchemy.dialects.postgresql.psycopg", "src.queries")
+
+# a worker that dies sooner than this after starting is restarted no faster
+RESTART_DELAY_SECONDS = 1.0
+
+
+class Supervisor:
+    def __init__(self, server_config: uvicorn.Config, workers: int):
+        self.config = server_config
+        self.workers = workers
+        self.children: dict[int, float] = {}  # pid -> when it started
+        self.stopping = False
+        # bound now, so stop() always has a socket to close
+        self.sock: socket.socket = server_config.bind_socket()
+
+    def spawn(self) -> None:
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.monotonic()
+            return
+
+        # the worker: uvicorn installs its own SIGTERM/SIGINT handling
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        code = 0
+        try:
+            uvicorn.Server(self.config).run(sockets=[self.sock])
+        except BaseException:
+            logger.exception("worker %d failed", os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+
+    def stop(self, signum, frame) -> None:
+        if not self.stopping:
+            logger.info("%s: draining %d workers", signal.strsignal(signum), len(self.children))
+        self.stopping = True
+        # once the workers close theirs too, new connections are refused
+        # rather than left waiting in a backlog nobody accepts from
+        self.sock.close()
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+
+        while self.children:
+            pid, status = os.wait()
+            started = self.children.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            logger.warning(
+                "worker %d exited with %d, starting another",
+                pid, os.waitstatus_to_exitcode(status),
+            )
+            time.sleep(max(0.0, started + RESTART_DELAY_SECONDS - time.monotonic()))
+            self.spawn()
+        logger.info("all workers stopped")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "3000")))
+    parser.add_argument("--workers", type=int, help="default: WEB_CONCURRENCY")
+    args = parser.parse_args()
+
+    if args.workers:
+        # before settings load: each worker's pool is sized from it
+        os.environ["WEB_CONCURRENCY"] = str(args.workers)
+    settings = config.get_settings()
+    workers = settings.WEB_CONCURRENCY
+    if settings.STORAGE_BACKEND == "memory" and workers > 1:
+        parser.error("STORAGE_BACKEND=memory keeps the game in one process; use --workers 1")
+
+    server_config = uvicorn.Config(
+        "src.api.server:app",
+        host=args.host,
+        port=args.port,
+        log_level="info",
+        timeout_graceful_shutdown=settings.SHUTDOWN_GRACE_SECONDS,
+    )
+    logging.basicConfig(level=logging.INFO)
+    server_config.load()
+    for module in (*PRELOAD, f"src.storage.{settings.STORAGE_BACKEND}"):
+        importlib.import_module(module)
+    gc.freeze()
+
+    logger.info(
+        "%d workers, %d+%d database connections each",
+        workers, settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW,
+    )
+    Supervisor(server_config, workers).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Named snapshots of the whole game state, saved and restored with binary COPY.
+
+    python -m src.snapshots save seeded_100k
+    python -m src.snapshots restore seeded_100k
+    python -m src.snapshots list
+
+A snapshot is a directory under SNAPSHOT_DIR holding one COPY file per game
+table plus a manifest. Restoring truncates every game table and streams the
+files back in a single transaction, so a benchmark run can start from the
+same large state every time in seconds.
+
+A snapshot holds every shop's state. The shops themselves (and their API
+keys) aren't part of it, so it restores only into a database that still
+has every shop it mentions.
+"""
+
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+import sqlalchemy as sa
+
+from src import audit, config
+from src import database as db
+from src import invalidation
+
+# parents before children, the order they're loaded back in
+GAME_TABLES = (
+    "global_inventory", "potion_recipes", "carts", "cart_items", "stock_holds",
+)
+
+# keyed by their parents' ids, no sequence of their own
+_NO_SEQUENCE = {"stock_holds"}
+
+_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _dir(name: str, directory: Path | None) -> Path:
+    if config.get_settings().STORAGE_BACKEND != "postgres":
+        raise SnapshotError("snapshots are COPY files; they need STORAGE_BACKEND=postgres")
+    if not _NAME.match(name):
+        raise SnapshotError("snapshot names may only use letters, digits, _ and -")
+    return (directory or Path(config.get_settings().SNAPSHOT_DIR)) / name
+
+
+def _schema_revision(conn) -> str:
+    return conn.execute(sa.text("SELECT version_num FROM alembic_version")).scalar_one()
+
+
+def save(name: str, directory: Path | None = None) -> dict:
+    """Write every game table to disk from one consistent read snapshot."""
+    target = _dir(name, directory)
+    target.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+
+    with db.engine.connect().execution_options(
+        isolation_level="REPEATABLE READ"
+    ) as conn:
+        with conn.begin():
+            rows = {}
+            cur = conn.connection.driver_connection.cursor()
+            for table in GAME_TABLES:
+                with open(target / f"{table}.copy", "wb") as f:
+                    # COPY (SELECT ...) also works once a table is partitioned
+                    with cur.copy(
+                        f"COPY (SELECT * FROM {table}) TO STDOUT (FORMAT BINARY)"
+                    ) as copy:
+                        for chunk in copy:
+                            f.write(chunk)
+                rows[table] = cur.rowcount
+            manifest: dict[str, Any] = {
+                "name": name,
+                "revision": _schema_revision(conn),
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "rows": rows,
+            }
+
+    (target / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    manifest["seconds"] = round(time.perf_counter() - started, 3)
+    return manifest
+
+
+def restore(name: str, directory: Path | None = None) -> dict:
+    """Replace the current game state with snapshot `name`, atomically."""
+    source = _dir(name, directory)
+    if not (source / "manifest.json").exists():
+        raise SnapshotError(f"no snapshot named {name!r}")
+    manifest = json.loads((source / "manifest.json").read_text())
+    started = time.perf_counter()
+
+    with db.engine.begin() as conn:
+        revision = _schema_revision(conn)
+        if manifest["revision"] != revision:
+            raise SnapshotError(
+                f"snapshot {name!r} was taken at schema {manifest['revision']}, "
+                f"database is at {revision}"
+            )
+
+        conn.execute(sa.text(f"TRUNCATE {', '.join(GAME_TABLES)} RESTART IDENTITY"))
+        cur = conn.connection.driver_connection.cursor()
+        for table in GAME_TABLES:
+            with open(source / f"{table}.copy", "rb") as f:
+                with cur.copy(f"COPY {table} FROM STDIN (FORMAT BINARY)") as copy:
+                    while chunk := f.read(1 << 20):
+                        copy.write(chunk)
+            if table == "potion_recipes":
+                # loading stock_holds adds every hold back through its
+                # triggers; on top of the copied counts they'd break the CHECK
+                conn.execute(sa.text("UPDATE potion_recipes SET reserved = 0"))
+            if table in _NO_SEQUENCE:
+                continue
+            # ids were copied verbatim; move the sequence past them
+            conn.execute(
+                sa.text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"COALESCE(MAX(id), 0) + 1, false) FROM {table}"
+                )
+            )
+        # COPY fired the potion_count triggers on top of the restored count
+        audit.recompute(conn)
+        invalidation.publish_all_shops(
+            conn, invalidation.INVENTORY, invalidation.RECIPES
+        )
+
+    return {"name": name, "rows": manifest["rows"],
+            "seconds": round(time.perf_counter() - started, 3)}
+
+
+def list_snapshots(directory: Path | None = None) -> list[dict]:
+    root = directory or Path(config.get_settings().SNAPSHOT_DIR)
+    return [
+        json.loads(m.read_text()) for m in sorted(root.glob("*/manifest.json"))
+    ]
+
+
+if __name__ == "__main__":
+    usage = "usage: python -m src.snapshots save|restore NAME | list"
+    match sys.argv[1:]:
+        case ["save", name]:
+            print(json.dumps(save(name)))
+        case ["restore", name]:
+            print(json.dumps(restore(name)))
+        case ["list"]:
+            for m in list_snapshots():
+                print(m["name"], m["created_at"], m["rows"])
+        case _:
+            sys.exit(usage)
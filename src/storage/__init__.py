@@ -0,0 +1,289 @@
+"""
+Where the shop keeps its state, behind one interface.
+
+Handlers never talk to a database directly. They open a transaction on the
+configured backend and call its operations:
+
+    with storage.get().transaction() as tx:
+        tx.add_gold(50)
+        tx.emit(events.CHECKOUT, {...})
+        tx.publish(invalidation.INVENTORY)
+
+Everything a transaction does commits together when the block exits and
+is rolled back if it raises, HTTPException included. A transaction works
+for the shop that was current (src.tenancy) when it began.
+
+STORAGE_BACKEND picks the implementation:
+
+    postgres  src.storage.postgres, the statements in src.queries (default)
+    memory    src.storage.memory, plain dicts in this process; nothing to
+              connect to, nothing survives a restart
+
+test/test_storage.py is the conformance suite both backends must pass. The
+Postgres-only tools (snapshots, archive, audit) keep using the database
+directly.
+"""
+
+import importlib
+from abc import ABC, abstractmethod
+from contextlib import AbstractContextManager
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+
+from src import config
+
+# STORAGE_BACKEND -> class in src.storage.<backend>
+_CLASSES = {"postgres": "PostgresStorage", "memory": "MemoryStorage"}
+
+
+class ConstraintError(Exception):
+    """A write would break an invariant (negative gold, ml or stock); the
+    transaction is rolled back."""
+
+
+@dataclass(frozen=True)
+class Inventory:
+    gold: int
+    red_ml: int
+    green_ml: int
+    blue_ml: int
+    dark_ml: int
+    red_potions: int
+    green_potions: int
+    blue_potions: int
+    dark_potions: int
+    potion_count: int  # bottled potions across every recipe
+
+
+@dataclass(frozen=True)
+class RecipeStock:
+    id: int
+    price: int
+    inventory: int
+
+
+@dataclass(frozen=True)
+class CartLine:
+    recipe_id: int
+    price: int
+    inventory: int  # the recipe's stock right now
+    quantity: int
+
+
+@dataclass(frozen=True)
+class TickPoint:
+    """The ticks in one bucket of tick history (src.ticks)."""
+
+    at: datetime  # start of the bucket
+    ticks: int
+    day: str  # game time of the bucket's last tick
+    hour: int
+    gold_min: int
+    gold_max: int
+    # the rest as of the bucket's last tick
+    gold: int
+    red_ml: int
+    green_ml: int
+    blue_ml: int
+    dark_ml: int
+    potion_count: int
+
+
+class Transaction(ABC):
+    """Operations on the current shop, inside one transaction."""
+
+    shop: int
+
+    # inventory and ledger
+
+    @abstractmethod
+    def inventory(self) -> Inventory | None:
+        """The shop's inventory row; None until create_inventory()."""
+
+    @abstractmethod
+    def create_inventory(self) -> None:
+        """Give the shop an inventory row (0 gold) unless it has one."""
+
+    def ensure_inventory(self) -> Inventory:
+        """The shop's inventory row, created first if it has none yet."""
+        inv = self.inventory()
+        if inv is None:
+            self.create_inventory()
+            inv = self.inventory()
+            assert inv is not None, "create_inventory() made no row"
+        return inv
+
+    @abstractmethod
+    def add_barrels(self, gold_paid: int, red_ml: int, green_ml: int, blue_ml: int) -> None:
+        pass
+
+    @abstractmethod
+    def use_ml(self, red_ml: int, green_ml: int, blue_ml: int) -> None:
+        pass
+
+    @abstractmethod
+    def add_gold(self, gold: int) -> None:
+        pass
+
+    @abstractmethod
+    def reset(self) -> None:
+        """Back to 100 gold, no ml, no stock and no carts (/admin/reset)."""
+
+    # recipes
+
+    @abstractmethod
+    def recipe_by_sku(self, sku: str) -> RecipeStock | None:
+        pass
+
+    @abstractmethod
+    def recipe_by_mix(self, potion_type: list[int]) -> int | None:
+        """Id of the recipe mixing exactly [r, g, b, d]."""
+
+    @abstractmethod
+    def recipe_mixes(
+        self, red_pct: int, green_pct: int, blue_pct: int, after: int, limit: int
+    ) -> list[tuple[int, list[int]]]:
+        """
+        (id, [r, g, b, d]) of up to limit recipes with ids above after, in id
+        order, whose red, green and blue shares are at most the ones given.
+        """
+
+    @abstractmethod
+    def catalog(self) -> list[dict]:
+        """
+        Up to 6 recipes with stock no cart holds: sku, name, price, *_pct,
+        and that unheld stock as inventory.
+        """
+
+    @abstractmethod
+    def add_stock(self, recipe_id: int, qty: int) -> None:
+        pass
+
+    @abstractmethod
+    def remove_stock(self, recipe_id: int, qty: int) -> None:
+        pass
+
+    @abstractmethod
+    def sell_stock(self, recipe_id: int, qty: int) -> bool:
+        """Take qty out of stock; False, changing nothing, if that would dip
+        into stock other carts hold."""
+
+    @abstractmethod
+    def load_recipes(self, step: int) -> int:
+        """
+        Upsert src.recipe_gen's recipes at this granularity, keeping stock;
+        a mix already on the menu under another sku is left alone. Returns
+        recipes inserted or changed.
+        """
+
+    # carts
+
+    @abstractmethod
+    def create_cart(self, customer_id: str, customer_name: str) -> int:
+        pass
+
+    @abstractmethod
+    def set_cart_item(self, cart_id: int, recipe_id: int, qty: int) -> bool:
+        """Set a line's quantity; False if the shop has no such open cart."""
+
+    @abstractmethod
+    def claim_cart(self, cart_id: int) -> bool:
+        """Mark the cart checked out; False if it's missing or already was."""
+
+    @abstractmethod
+    def cart_lines(self, cart_id: int) -> list[CartLine]:
+        """The cart's lines in recipe id order, the order checkout sells them."""
+
+    @abstractmethod
+    def hold_stock(self, cart_id: int, recipe_id: int, qty: int) -> bool:
+        """
+        Set the cart's hold on the recipe to qty for STOCK_HOLD_SECONDS; False,
+        changing nothing, if the stock other carts don't hold is short of it.
+        """
+
+    @abstractmethod
+    def release_holds(self, cart_id: int) -> None:
+        pass
+
+    # tick history
+
+    @abstractmethod
+    def record_tick(self, day: str, hour: int) -> None:
+        """Append the shop's gold, ml and potion_count to its tick history."""
+
+    @abstractmethod
+    def tick_history(self, since: datetime, until: datetime, width: int) -> list[TickPoint]:
+        """
+        Ticks in [since, until) grouped into buckets of width seconds, aligned
+        to 2000-01-01, oldest first. A width of whole days may be answered
+        from daily rollups, which cover the days since and until fall in.
+        """
+
+    # outbox and cache invalidation, both delivered only on commit
+
+    @abstractmethod
+    def emit(self, kind: str, payload: dict) -> None:
+        """Record a shop event (src.events)."""
+
+    @abstractmethod
+    def publish(self, *topics: str) -> None:
+        """Bump the shop's cache topics (src.invalidation)."""
+
+    @abstractmethod
+    def cache_version(self, topic: str) -> int:
+        pass
+
+
+class Storage(ABC):
+    name: str
+
+    @abstractmethod
+    def transaction(self) -> AbstractContextManager[Transaction]:
+        pass
+
+    @abstractmethod
+    def read(self) -> AbstractContextManager[Transaction]:
+        """A transaction for handlers that only read; it may see slightly
+        older state (see src.database.read)."""
+
+    @abstractmethod
+    def cache_versions(self) -> list[tuple[int, str, int]]:
+        """(shop_id, topic, version) for every shop."""
+
+    @abstractmethod
+    def sweep_carts(self, max_age: float, limit: int) -> int:
+        """Delete up to limit open carts older than max_age seconds, any shop."""
+
+    @abstractmethod
+    def release_expired_holds(self, limit: int) -> int:
+        """
+        Release up to limit expired stock holds, any shop, and publish
+        RECIPES for each shop that got stock back on sale.
+        """
+
+    # shops (src.tenancy)
+
+    @abstractmethod
+    def shop_by_key(self, key_sha256: str) -> int | None:
+        pass
+
+    @abstractmethod
+    def create_shop(self, name: str, key_sha256: str) -> int:
+        """A new shop in the state reset() leaves, with an empty recipe book."""
+
+    @abstractmethod
+    def delete_shop(self, shop_id: int) -> None:
+        pass
+
+    @abstractmethod
+    def shops(self) -> list[dict]:
+        """id, name and created_at of every shop."""
+
+
+@lru_cache()
+def get() -> Storage:
+    """The STORAGE_BACKEND storage, built on first use."""
+    name = config.get_settings().STORAGE_BACKEND
+    module = importlib.import_module(f"src.storage.{name}")
+    return getattr(module, _CLASSES[name])()
@@ -0,0 +1,534 @@
+"""
+The in-memory backend: every shop's state in dicts in this process.
+
+    STORAGE_BACKEND=memory uvicorn src.api.server:app
+
+Meant for simulations, load tests and local runs without Postgres. It
+mirrors the Postgres backend operation for operation, CHECK constraints
+included, and passes the same conformance suite (test/test_storage.py).
+
+A transaction holds its shop's lock from start to finish, so transactions
+on one shop run one at a time (stricter than Postgres, never weaker) while
+other shops carry on. Each write records how to undo itself; a transaction
+that raises is undone in reverse, and one that commits delivers its cache
+invalidations to this worker's caches right away. Nothing is shared across
+processes, so run a single worker.
+
+Shop 1 starts with 100 gold and src.recipe_gen's recipes at
+MEMORY_RECIPE_STEP. Emitted events are kept (the latest EVENT_LOG_SIZE of
+them, in .events) for inspection; @events.handler consumers only run
+against the Postgres outbox.
+"""
+
+import bisect
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import partial
+from datetime import datetime, timedelta
+from typing import Callable, Iterator
+
+from src import config, tenancy
+from src.storage import (
+    CartLine,
+    ConstraintError,
+    Inventory,
+    RecipeStock,
+    Storage,
+    TickPoint,
+    Transaction,
+)
+
+EVENT_LOG_SIZE = 10_000
+
+# columns CHECKed >= 0 in global_inventory
+_NON_NEGATIVE = (
+    "gold", "red_ml", "green_ml", "blue_ml", "dark_ml",
+    "red_potions", "green_potions", "blue_potions", "dark_potions",
+)
+
+# what a tick records besides its game time (shop_ticks)
+_TICK_STATE = ("gold", "red_ml", "green_ml", "blue_ml", "dark_ml", "potion_count")
+
+# tick buckets are aligned to this, like date_bin() in the Postgres backend
+_BUCKET_ORIGIN = datetime(2000, 1, 1)
+
+_RESET = {
+    "gold": 100, "red_ml": 0, "green_ml": 0, "blue_ml": 0, "dark_ml": 0,
+    "red_potions": 0, "green_potions": 0, "blue_potions": 0, "dark_potions": 0,
+    "potion_count": 0,
+}
+
+
+def _restore(d: dict, key, old) -> None:
+    """Undo d[key] = ...; old is None when there was no key."""
+    if old is None:
+        d.pop(key, None)
+    else:
+        d[key] = old
+
+
+def _rename(recipe: "_Recipe", name: str, price: int) -> None:
+    recipe.name, recipe.price = name, price
+
+
+class _Recipe:
+    __slots__ = ("id", "sku", "name", "price", "mix", "inventory", "reserved")
+
+    def __init__(self, id: int, sku: str, name: str, price: int, mix: tuple):
+        self.id, self.sku, self.name, self.price, self.mix = id, sku, name, price, mix
+        self.inventory = 0
+        self.reserved = 0  # the sum of its holds
+
+
+class _Cart:
+    __slots__ = ("id", "customer_id", "customer_name", "created_at", "checked_out", "items")
+
+    def __init__(self, id: int, customer_id: str, customer_name: str):
+        self.id, self.customer_id, self.customer_name = id, customer_id, customer_name
+        self.created_at = time.time()
+        self.checked_out = False
+        self.items: dict[int, int] = {}  # recipe id -> quantity
+
+
+class _Shop:
+    def __init__(self, id: int, name: str, key_sha256: str | None, topics):
+        self.id, self.name, self.key_sha256 = id, name, key_sha256
+        self.created_at = datetime.now()
+        self.lock = threading.Lock()
+        self.inventory: dict[str, int] | None = dict(_RESET)
+        self.recipes: dict[int, _Recipe] = {}  # in id order
+        self.by_sku: dict[str, _Recipe] = {}
+        self.by_mix: dict[tuple, _Recipe] = {}
+        self.stocked: set[int] = set()  # ids of recipes with inventory > reserved
+        self.carts: dict[int, _Cart] = {}
+        # cart id -> recipe id -> (quantity, expires_at); like stock_holds,
+        # a hold outlives its cart until it expires
+        self.holds: dict[int, dict[int, tuple[int, float]]] = {}
+        self.ticks: list[tuple] = []  # (at, day, hour, *_TICK_STATE), oldest first
+        self.versions = {topic: 0 for topic in topics}
+
+
+class MemoryTransaction(Transaction):
+    def __init__(self, store: "MemoryStorage", shop: _Shop):
+        self._store = store
+        self._shop = shop
+        self.shop = shop.id
+        self._undo: list[Callable[[], None]] = []
+        self._on_commit: list[Callable[[], None]] = []
+
+    def _commit(self) -> None:
+        for fn in self._on_commit:
+            fn()
+
+    def _rollback(self) -> None:
+        for fn in reversed(self._undo):
+            fn()
+
+    # inventory and ledger
+
+    def inventory(self) -> Inventory | None:
+        inv = self._shop.inventory
+        return None if inv is None else Inventory(**inv)
+
+    def create_inventory(self) -> None:
+        shop = self._shop
+        if shop.inventory is None:
+            shop.inventory = {column: 0 for column in _RESET}
+            self._undo.append(lambda: setattr(shop, "inventory", None))
+
+    def _change(self, **deltas: int) -> None:
+        inv = self._shop.inventory
+        if inv is None:
+            return  # like an UPDATE that matches no row
+        changed = {column: inv[column] + delta for column, delta in deltas.items()}
+        for column, value in changed.items():
+            if value < 0 and column in _NON_NEGATIVE:
+                raise ConstraintError(f"global_inventory.{column} would be {value}")
+        old = {column: inv[column] for column in changed}
+        inv.update(changed)
+        self._undo.append(lambda: inv.update(old))
+
+    def add_barrels(self, gold_paid: int, red_ml: int, green_ml: int, blue_ml: int) -> None:
+        self._change(gold=-gold_paid, red_ml=red_ml, green_ml=green_ml, blue_ml=blue_ml)
+
+    def use_ml(self, red_ml: int, green_ml: int, blue_ml: int) -> None:
+        self._change(red_ml=-red_ml, green_ml=-green_ml, blue_ml=-blue_ml)
+
+    def add_gold(self, gold: int) -> None:
+        self._change(gold=gold)
+
+    def reset(self) -> None:
+        shop = self._shop
+        carts = shop.carts
+        shop.carts = {}
+        self._undo.append(lambda: setattr(shop, "carts", carts))
+        for cart_id in list(shop.holds):
+            self.release_holds(cart_id)
+        for recipe_id in list(shop.stocked):
+            self._set_stock(shop.recipes[recipe_id], 0)
+        if shop.inventory is not None:
+            inv, old = shop.inventory, dict(shop.inventory)
+            inv.update(_RESET)
+            self._undo.append(lambda: inv.update(old))
+
+    # recipes
+
+    def recipe_by_sku(self, sku: str) -> RecipeStock | None:
+        recipe = self._shop.by_sku.get(sku)
+        return None if recipe is None else RecipeStock(recipe.id, recipe.price, recipe.inventory)
+
+    def recipe_by_mix(self, potion_type: list[int]) -> int | None:
+        recipe = self._shop.by_mix.get(tuple(potion_type))
+        return None if recipe is None else recipe.id
+
+    def recipe_mixes(
+        self, red_pct: int, green_pct: int, blue_pct: int, after: int, limit: int
+    ) -> list[tuple[int, list[int]]]:
+        found: list[tuple[int, list[int]]] = []
+        for recipe in self._shop.recipes.values():  # added, so kept, in id order
+            if len(found) == limit:
+                break
+            r, g, b, _ = recipe.mix
+            if recipe.id > after and r <= red_pct and g <= green_pct and b <= blue_pct:
+                found.append((recipe.id, list(recipe.mix)))
+        return found
+
+    def catalog(self) -> list[dict]:
+        shop = self._shop
+        return [
+            {
+                "sku": recipe.sku,
+                "name": recipe.name,
+                "price": recipe.price,
+                "red_pct": recipe.mix[0],
+                "green_pct": recipe.mix[1],
+                "blue_pct": recipe.mix[2],
+                "dark_pct": recipe.mix[3],
+                "inventory": recipe.inventory - recipe.reserved,
+            }
+            for recipe in (shop.recipes[i] for i in heapq.nsmallest(6, shop.stocked))
+        ]
+
+    def _apply_stock(self, recipe: _Recipe, inventory: int, reserved: int) -> None:
+        # what the potion_count and reserved triggers do in Postgres
+        shop = self._shop
+        if shop.inventory is not None:
+            shop.inventory["potion_count"] += inventory - recipe.inventory
+        recipe.inventory, recipe.reserved = inventory, reserved
+        if inventory > reserved:
+            shop.stocked.add(recipe.id)
+        else:
+            shop.stocked.discard(recipe.id)
+
+    def _set_stock(self, recipe: _Recipe, inventory: int, reserved: int | None = None) -> None:
+        if reserved is None:
+            reserved = recipe.reserved
+        if inventory < 0:
+            raise ConstraintError(f"potion_recipes.inventory would be {inventory}")
+        if not 0 <= reserved <= inventory:
+            raise ConstraintError(
+                f"potion_recipes.reserved would be {reserved} of {inventory}"
+            )
+        old = (recipe.inventory, recipe.reserved)
+        self._apply_stock(recipe, inventory, reserved)
+        self._undo.append(lambda: self._apply_stock(recipe, *old))
+
+    def _recipe(self, recipe_id: int) -> _Recipe | None:
+        return self._shop.recipes.get(recipe_id)
+
+    def add_stock(self, recipe_id: int, qty: int) -> None:
+        recipe = self._recipe(recipe_id)
+        if recipe is not None:
+            self._set_stock(recipe, recipe.inventory + qty)
+
+    def remove_stock(self, recipe_id: int, qty: int) -> None:
+        recipe = self._recipe(recipe_id)
+        if recipe is not None:
+            self._set_stock(recipe, recipe.inventory - qty)
+
+    def sell_stock(self, recipe_id: int, qty: int) -> bool:
+        recipe = self._recipe(recipe_id)
+        if recipe is None or recipe.inventory - recipe.reserved < qty:
+            return False
+        self._set_stock(recipe, recipe.inventory - qty)
+        return True
+
+    def load_recipes(self, step: int) -> int:
+        from src import recipe_gen
+
+        shop = self._shop
+        changed = 0
+        for rec in recipe_gen.recipes(step):
+            on_menu = shop.by_mix.get(rec.mix)
+            if on_menu is not None and on_menu.sku != rec.sku:
+                continue  # that mix is sold under another sku
+            recipe = shop.by_sku.get(rec.sku)
+            if recipe is None:
+                recipe = _Recipe(
+                    next(self._store._recipe_ids), rec.sku, rec.name, rec.price, rec.mix
+                )
+                shop.recipes[recipe.id] = shop.by_sku[rec.sku] = shop.by_mix[rec.mix] = recipe
+                self._undo.append(partial(self._drop_recipe, recipe))
+            elif (recipe.name, recipe.price) != (rec.name, rec.price):
+                old = (recipe.name, recipe.price)
+                recipe.name, recipe.price = rec.name, rec.price
+                self._undo.append(partial(_rename, recipe, *old))
+            else:
+                continue
+            changed += 1
+        return changed
+
+    def _drop_recipe(self, recipe: _Recipe) -> None:
+        shop = self._shop
+        del shop.recipes[recipe.id], shop.by_sku[recipe.sku], shop.by_mix[recipe.mix]
+
+    # carts
+
+    def create_cart(self, customer_id: str, customer_name: str) -> int:
+        carts = self._shop.carts
+        cart = _Cart(next(self._store._cart_ids), customer_id, customer_name)
+        carts[cart.id] = cart
+        self._undo.append(lambda: _restore(carts, cart.id, None))
+        return cart.id
+
+    def set_cart_item(self, cart_id: int, recipe_id: int, qty: int) -> bool:
+        cart = self._shop.carts.get(cart_id)
+        if cart is None or cart.checked_out:
+            return False
+        if qty <= 0:
+            raise ConstraintError(f"cart_items.quantity would be {qty}")
+        items, old = cart.items, cart.items.get(recipe_id)
+        items[recipe_id] = qty
+        self._undo.append(lambda: _restore(items, recipe_id, old))
+        return True
+
+    def claim_cart(self, cart_id: int) -> bool:
+        cart = self._shop.carts.get(cart_id)
+        if cart is None or cart.checked_out:
+            return False
+        cart.checked_out = True
+        self._undo.append(lambda: setattr(cart, "checked_out", False))
+        return True
+
+    def cart_lines(self, cart_id: int) -> list[CartLine]:
+        cart = self._shop.carts.get(cart_id)
+        if cart is None:
+            return []
+        recipes = self._shop.recipes
+        return [
+            CartLine(recipe_id, recipes[recipe_id].price, recipes[recipe_id].inventory, qty)
+            for recipe_id, qty in sorted(cart.items.items())
+        ]
+
+    def hold_stock(self, cart_id: int, recipe_id: int, qty: int) -> bool:
+        recipe = self._recipe(recipe_id)
+        if recipe is None:
+            return False
+        if qty <= 0:
+            raise ConstraintError(f"stock_holds.quantity would be {qty}")
+        old = self._shop.holds.get(cart_id, {}).get(recipe_id)
+        held = 0 if old is None else old[0]
+        if recipe.inventory - recipe.reserved + held < qty:
+            return False
+        expires_at = time.time() + config.get_settings().STOCK_HOLD_SECONDS
+        self._set_stock(recipe, recipe.inventory, recipe.reserved - held + qty)
+        holds = self._shop.holds.setdefault(cart_id, {})
+        holds[recipe_id] = (qty, expires_at)
+        self._undo.append(lambda: _restore(holds, recipe_id, old))
+        return True
+
+    def release_holds(self, cart_id: int) -> None:
+        shop = self._shop
+        holds = shop.holds.pop(cart_id, None)
+        if holds is None:
+            return
+        self._undo.append(lambda: shop.holds.__setitem__(cart_id, holds))
+        for recipe_id, (qty, _) in sorted(holds.items()):
+            recipe = self._recipe(recipe_id)
+            if recipe is not None:
+                self._set_stock(recipe, recipe.inventory, recipe.reserved - qty)
+
+    # tick history
+
+    def record_tick(self, day: str, hour: int) -> None:
+        inv, ticks = self._shop.inventory, self._shop.ticks
+        if inv is None:
+            return
+        ticks.append((datetime.now(), day, hour, *(inv[column] for column in _TICK_STATE)))
+        self._undo.append(lambda: ticks.__delitem__(-1))
+
+    def tick_history(self, since: datetime, until: datetime, width: int) -> list[TickPoint]:
+        ticks = self._shop.ticks
+        in_range = ticks[bisect.bisect_left(ticks, (since,)) : bisect.bisect_left(ticks, (until,))]
+        stride = timedelta(seconds=width)
+        buckets: dict[datetime, list[tuple]] = {}
+        for tick in in_range:
+            bucket = _BUCKET_ORIGIN + (tick[0] - _BUCKET_ORIGIN) // stride * stride
+            buckets.setdefault(bucket, []).append(tick)
+        points = []
+        for bucket, bucket_ticks in buckets.items():
+            _, day, hour, *state = bucket_ticks[-1]
+            gold = [tick[3] for tick in bucket_ticks]
+            points.append(
+                TickPoint(bucket, len(bucket_ticks), day, hour, min(gold), max(gold), *state)
+            )
+        return points
+
+    # outbox and cache invalidation
+
+    def emit(self, kind: str, payload: dict) -> None:
+        self._on_commit.append(lambda: self._store._record_event(self.shop, kind, payload))
+
+    def publish(self, *topics: str) -> None:
+        from src import invalidation
+
+        versions = self._shop.versions
+        for topic in topics:
+            old = versions[topic]
+            version = versions[topic] = old + 1
+            self._undo.append(partial(_restore, versions, topic, old))
+            self._on_commit.append(partial(invalidation.bus.bump, self.shop, topic, version))
+
+    def cache_version(self, topic: str) -> int:
+        return self._shop.versions[topic]
+
+
+class MemoryStorage(Storage):
+    name = "memory"
+
+    def __init__(self, recipe_step: int | None = None):
+        from src import invalidation
+
+        self._topics = invalidation.TOPICS
+        self._lock = threading.Lock()  # the shop registry, not shop state
+        self._shops: dict[int, _Shop] = {}
+        self._shop_ids = itertools.count(tenancy.DEFAULT_SHOP + 1)
+        self._recipe_ids = itertools.count(1)
+        self._cart_ids = itertools.count(1)
+        self._event_ids = itertools.count(1)
+        self.events: deque = deque(maxlen=EVENT_LOG_SIZE)
+
+        self._shops[tenancy.DEFAULT_SHOP] = _Shop(
+            tenancy.DEFAULT_SHOP, "default", None, self._topics
+        )
+        if recipe_step is None:
+            recipe_step = config.get_settings().MEMORY_RECIPE_STEP
+        if recipe_step:
+            with tenancy.using(tenancy.DEFAULT_SHOP), self.transaction() as tx:
+                tx.load_recipes(recipe_step)
+
+    def _record_event(self, shop_id: int, kind: str, payload: dict) -> None:
+        from src import events
+
+        self.events.append(
+            events.Event(next(self._event_ids), shop_id, kind, payload, datetime.now())
+        )
+
+    @contextmanager
+    def transaction(self) -> Iterator[MemoryTransaction]:
+        shop = self._shops.get(tenancy.current())
+        if shop is None:
+            raise ConstraintError(f"no shop {tenancy.current()}")
+        with shop.lock:
+            tx = MemoryTransaction(self, shop)
+            try:
+                yield tx
+            except BaseException:
+                tx._rollback()
+                raise
+            tx._commit()
+
+    # every transaction sees the latest state, so reads need nothing else
+    read = transaction
+
+    def cache_versions(self) -> list[tuple[int, str, int]]:
+        return [
+            (shop.id, topic, version)
+            for shop in list(self._shops.values())
+            for topic, version in list(shop.versions.items())
+        ]
+
+    def sweep_carts(self, max_age: float, limit: int) -> int:
+        cutoff = time.time() - max_age
+        deleted = 0
+        for shop in list(self._shops.values()):
+            with shop.lock:
+                expired = heapq.nsmallest(
+                    limit - deleted,
+                    (
+                        cart
+                        for cart in shop.carts.values()
+                        if not cart.checked_out and cart.created_at < cutoff
+                    ),
+                    key=lambda cart: cart.created_at,
+                )
+                for cart in expired:
+                    del shop.carts[cart.id]
+            deleted += len(expired)
+            if deleted >= limit:
+                break
+        return deleted
+
+    def release_expired_holds(self, limit: int) -> int:
+        from src import invalidation
+
+        now = time.time()
+        released = 0
+        for shop in list(self._shops.values()):
+            with shop.lock:
+                expired = heapq.nsmallest(
+                    limit - released,
+                    (
+                        (expires_at, cart_id, recipe_id)
+                        for cart_id, holds in shop.holds.items()
+                        for recipe_id, (_, expires_at) in holds.items()
+                        if expires_at < now
+                    ),
+                )
+                # not undone: nothing here can fail
+                tx = MemoryTransaction(self, shop)
+                for _, cart_id, recipe_id in expired:
+                    holds = shop.holds[cart_id]
+                    qty, _ = holds.pop(recipe_id)
+                    if not holds:
+                        del shop.holds[cart_id]
+                    recipe = shop.recipes[recipe_id]
+                    tx._set_stock(recipe, recipe.inventory, recipe.reserved - qty)
+                if expired:
+                    tx.publish(invalidation.RECIPES)
+                    tx._commit()
+            released += len(expired)
+            if released >= limit:
+                break
+        return released
+
+    # shops
+
+    def shop_by_key(self, key_sha256: str) -> int | None:
+        for shop in list(self._shops.values()):
+            if shop.key_sha256 == key_sha256:
+                return shop.id
+        return None
+
+    def create_shop(self, name: str, key_sha256: str) -> int:
+        with self._lock:
+            for shop in self._shops.values():
+                if shop.name == name or shop.key_sha256 == key_sha256:
+                    raise ConstraintError(f"a shop named {name!r} or with that key exists")
+            shop = _Shop(next(self._shop_ids), name, key_sha256, self._topics)
+            self._shops[shop.id] = shop
+        return shop.id
+
+    def delete_shop(self, shop_id: int) -> None:
+        with self._lock:
+            self._shops.pop(shop_id, None)
+
+    def shops(self) -> list[dict]:
+        return [
+            {"id": shop.id, "name": shop.name, "created_at": shop.created_at}
+            for shop in sorted(self._shops.values(), key=lambda shop: shop.id)
+        ]
@@ -0,0 +1,219 @@
+"""
+The Postgres backend: each operation is one of the statements in src.queries,
+run on the transaction's connection.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator
+
+from src import config
+from src import database as db
+from src import events, invalidation, tenancy, ticks
+from src.lazy import lazy_import
+from src.storage import (
+    CartLine,
+    ConstraintError,
+    Inventory,
+    RecipeStock,
+    Storage,
+    TickPoint,
+    Transaction,
+)
+
+sa = lazy_import("sqlalchemy")
+queries = lazy_import("src.queries")
+
+
+class PostgresTransaction(Transaction):
+    def __init__(self, conn):
+        self.conn = conn
+        self.shop = tenancy.current()
+
+    def _run(self, statement, **params):
+        return self.conn.execute(statement, {"shop": self.shop, **params})
+
+    # inventory and ledger
+
+    def inventory(self) -> Inventory | None:
+        row = self._run(queries.INVENTORY_ROW).mappings().first()
+        return None if row is None else Inventory(**row)
+
+    def create_inventory(self) -> None:
+        self._run(queries.INVENTORY_CREATE)
+
+    def add_barrels(self, gold_paid: int, red_ml: int, green_ml: int, blue_ml: int) -> None:
+        self._run(
+            queries.INVENTORY_ADD_BARRELS,
+            gold_paid=gold_paid, add_r=red_ml, add_g=green_ml, add_b=blue_ml,
+        )
+
+    def use_ml(self, red_ml: int, green_ml: int, blue_ml: int) -> None:
+        self._run(queries.INVENTORY_USE_ML, rml=red_ml, gml=green_ml, bml=blue_ml)
+
+    def add_gold(self, gold: int) -> None:
+        self._run(queries.INVENTORY_ADD_GOLD, g=gold)
+
+    def reset(self) -> None:
+        self._run(queries.CARTS_RESET)
+        self._run(queries.HOLDS_RESET)
+        self._run(queries.RECIPES_CLEAR_STOCK)
+        self._run(queries.INVENTORY_RESET)
+
+    # recipes
+
+    def recipe_by_sku(self, sku: str) -> RecipeStock | None:
+        row = self._run(queries.RECIPE_BY_SKU, s=sku).mappings().first()
+        return None if row is None else RecipeStock(**row)
+
+    def recipe_by_mix(self, potion_type: list[int]) -> int | None:
+        r, g, b, d = potion_type
+        return self._run(queries.RECIPE_BY_MIX, r=r, g=g, b=b, d=d).scalar()
+
+    def recipe_mixes(
+        self, red_pct: int, green_pct: int, blue_pct: int, after: int, limit: int
+    ) -> list[tuple[int, list[int]]]:
+        rows = self._run(
+            queries.RECIPE_MIXES,
+            r=red_pct, g=green_pct, b=blue_pct, last_id=after, limit=limit,
+        )
+        return [(recipe_id, list(mix)) for recipe_id, *mix in rows]
+
+    def catalog(self) -> list[dict]:
+        return [dict(row) for row in self._run(queries.CATALOG).mappings()]
+
+    def add_stock(self, recipe_id: int, qty: int) -> None:
+        self._run(queries.RECIPE_ADD_STOCK, rid=recipe_id, qty=qty)
+
+    def remove_stock(self, recipe_id: int, qty: int) -> None:
+        self._run(queries.RECIPE_REMOVE_STOCK, rid=recipe_id, qty=qty)
+
+    def sell_stock(self, recipe_id: int, qty: int) -> bool:
+        return self._run(queries.RECIPE_SELL, rid=recipe_id, qty=qty).first() is not None
+
+    def load_recipes(self, step: int) -> int:
+        from src import recipe_gen
+
+        with tenancy.using(self.shop):
+            return recipe_gen.upsert(self.conn, step)
+
+    # carts
+
+    def create_cart(self, customer_id: str, customer_name: str) -> int:
+        return self._run(
+            queries.CART_CREATE, cid=customer_id, cname=customer_name
+        ).scalar_one()
+
+    def set_cart_item(self, cart_id: int, recipe_id: int, qty: int) -> bool:
+        return bool(
+            self._run(queries.CART_SET_ITEM, cid=cart_id, rid=recipe_id, qty=qty).rowcount
+        )
+
+    def claim_cart(self, cart_id: int) -> bool:
+        return self._run(queries.CART_MARK_CHECKED_OUT, cid=cart_id).first() is not None
+
+    def cart_lines(self, cart_id: int) -> list[CartLine]:
+        return [
+            CartLine(**row)
+            for row in self._run(queries.CART_ITEMS_FOR_CHECKOUT, cid=cart_id).mappings()
+        ]
+
+    def hold_stock(self, cart_id: int, recipe_id: int, qty: int) -> bool:
+        return self._run(
+            queries.HOLD_SET,
+            cid=cart_id, rid=recipe_id, qty=qty,
+            hold_seconds=config.get_settings().STOCK_HOLD_SECONDS,
+        ).first() is not None
+
+    def release_holds(self, cart_id: int) -> None:
+        self._run(queries.HOLDS_RELEASE, cid=cart_id)
+
+    # tick history
+
+    def record_tick(self, day: str, hour: int) -> None:
+        self._run(queries.TICK_RECORD, day=day, hour=hour)
+
+    def tick_history(self, since: datetime, until: datetime, width: int) -> list[TickPoint]:
+        statement = (
+            queries.TICK_ROLLUPS_BUCKETED if width % ticks.DAY == 0 else queries.TICKS_BUCKETED
+        )
+        return [
+            TickPoint(**row)
+            for row in self._run(statement, since=since, until=until, width=width).mappings()
+        ]
+
+    # outbox and cache invalidation
+
+    def emit(self, kind: str, payload: dict) -> None:
+        with tenancy.using(self.shop):
+            events.emit(self.conn, kind, payload)
+
+    def publish(self, *topics: str) -> None:
+        with tenancy.using(self.shop):
+            invalidation.publish(self.conn, *topics)
+
+    def cache_version(self, topic: str) -> int:
+        return self._run(queries.CACHE_VERSION_OF, t=topic).scalar_one()
+
+
+class PostgresStorage(Storage):
+    name = "postgres"
+
+    @contextmanager
+    def _begin(self, transaction) -> Iterator[PostgresTransaction]:
+        try:
+            with transaction() as conn:
+                yield PostgresTransaction(conn)
+        except sa.exc.IntegrityError as e:
+            raise ConstraintError(str(e.orig)) from e
+
+    def transaction(self):
+        return self._begin(db.engine.begin)
+
+    def read(self):
+        return self._begin(db.read)
+
+    def cache_versions(self) -> list[tuple[int, str, int]]:
+        with db.engine.begin() as conn:
+            return [tuple(row) for row in conn.execute(queries.CACHE_VERSIONS)]
+
+    def sweep_carts(self, max_age: float, limit: int) -> int:
+        with db.engine.begin() as conn:
+            return conn.execute(
+                queries.CARTS_SWEEP, {"max_age": max_age, "limit": limit}
+            ).rowcount
+
+    def release_expired_holds(self, limit: int) -> int:
+        with db.engine.begin() as conn:
+            shops = conn.execute(queries.HOLDS_RELEASE_EXPIRED, {"limit": limit}).scalars().all()
+            for shop_id in sorted(set(shops)):
+                with tenancy.using(shop_id):
+                    invalidation.publish(conn, invalidation.RECIPES)
+            return len(shops)
+
+    # shops
+
+    def shop_by_key(self, key_sha256: str) -> int | None:
+        with db.engine.begin() as conn:
+            return conn.execute(queries.SHOP_BY_KEY, {"key_sha256": key_sha256}).scalar()
+
+    def create_shop(self, name: str, key_sha256: str) -> int:
+        with self.transaction() as tx:
+            shop_id = tx.conn.execute(
+                queries.SHOP_CREATE, {"name": name, "key_sha256": key_sha256}
+            ).scalar_one()
+            tx.conn.execute(queries.INVENTORY_CREATE, {"shop": shop_id})
+            tx.conn.execute(queries.INVENTORY_RESET, {"shop": shop_id})
+            tx.conn.execute(
+                queries.CACHE_TOPICS_CREATE,
+                {"shop": shop_id, "topics": list(invalidation.TOPICS)},
+            )
+        return shop_id
+
+    def delete_shop(self, shop_id: int) -> None:
+        with db.engine.begin() as conn:
+            conn.execute(queries.SHOP_DELETE, {"shop": shop_id})
+
+    def shops(self) -> list[dict]:
+        with db.engine.begin() as conn:
+            return [dict(row) for row in conn.execute(queries.SHOPS).mappings()]
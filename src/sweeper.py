@@ -0,0 +1,109 @@
+"""
+Background sweeper for abandoned carts and expired stock holds.
+
+A cart nobody checks out within CART_EXPIRY_TICKS ticks is deleted, along
+with its cart_items (ON DELETE CASCADE). Each worker runs the sweeper from
+the app lifespan every SWEEP_INTERVAL_SECONDS; a sweep deletes in batches of
+SWEEP_BATCH_SIZE, one short transaction each.
+
+Batches take their carts FOR UPDATE SKIP LOCKED. A checkout locks its cart
+before doing anything else and adding an item key-share locks it, so the
+sweeper steps around carts that are in use instead of waiting on them, and
+sweepers in different workers split the work instead of queueing.
+
+Then it releases stock holds older than STOCK_HOLD_SECONDS, in batches of
+the same size and the same way (SKIP LOCKED), which puts that stock back on
+sale and invalidates those shops' catalogs.
+
+    python -m src.sweeper     # one sweep now
+"""
+
+import asyncio
+import json
+import logging
+import time
+
+from src import config, storage
+
+logger = logging.getLogger(__name__)
+
+
+def expiry_seconds() -> int:
+    settings = config.get_settings()
+    return settings.CART_EXPIRY_TICKS * settings.TICK_SECONDS
+
+
+def sweep(max_age: float | None = None, batch_size: int | None = None) -> dict:
+    """
+    Delete every open cart older than max_age seconds and release every
+    expired stock hold; report what it did.
+    """
+    max_age = expiry_seconds() if max_age is None else max_age
+    batch_size = batch_size or config.get_settings().SWEEP_BATCH_SIZE
+    started = time.perf_counter()
+    purged = batches = 0
+    while True:
+        deleted = storage.get().sweep_carts(max_age, batch_size)
+        purged += deleted
+        batches += 1
+        if deleted < batch_size:
+            break
+    released = 0
+    while True:
+        count = storage.get().release_expired_holds(batch_size)
+        released += count
+        if count < batch_size:
+            break
+    return {
+        "purged": purged,
+        "batches": batches,
+        "holds_released": released,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+class Sweeper:
+    def __init__(self, interval: float | None = None):
+        self._interval = interval
+        self._task: asyncio.Task | None = None
+        self.last: dict | None = None  # report of the latest sweep
+
+    @property
+    def interval(self) -> float:
+        if self._interval is None:
+            return config.get_settings().SWEEP_INTERVAL_SECONDS
+        return self._interval
+
+    async def run(self) -> None:
+        while True:
+            try:
+                self.last = await asyncio.to_thread(sweep)
+                if self.last["purged"] or self.last["holds_released"]:
+                    logger.info(
+                        "swept %(purged)d abandoned carts and %(holds_released)d "
+                        "expired holds in %(seconds).3fs",
+                        self.last,
+                    )
+            except Exception:
+                logger.exception("cart sweep failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+sweeper = Sweeper()
+
+
+if __name__ == "__main__":
+    print(json.dumps(sweep()))
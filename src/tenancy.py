@@ -0,0 +1,161 @@
+"""
+Shops, and which one the code running right now works for.
+
+    python -m src.tenancy create "Potion Palace"            # prints its API key
+    python -m src.tenancy create "Potion Palace" --recipes 5
+    python -m src.tenancy list
+    python -m src.tenancy delete 7
+
+Every game table carries shop_id and every statement in src.queries filters
+on :shop, so one process, one connection pool and one set of prepared
+statements serve every shop: the SQL is the same whichever shop runs it.
+(The in-memory storage backend keeps each shop's state apart the same way.)
+
+The auth dependency resolves the request's API key to a shop and calls
+activate(); handlers read it back with current(). API_KEY from the
+environment is always shop 1 and needs no lookup. Other shops' keys are
+stored as sha256 and looked up once per KEY_CACHE_SECONDS in each worker.
+
+Code running outside a request (CLI tools, background tasks) works for
+shop 1 unless it says otherwise with using().
+"""
+
+import argparse
+import hashlib
+import hmac
+import secrets
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from src import config, storage
+
+DEFAULT_SHOP = 1
+
+_current: ContextVar[int] = ContextVar("shop_id", default=DEFAULT_SHOP)
+
+UNKNOWN = object()
+
+
+class TenancyError(Exception):
+    pass
+
+
+def current() -> int:
+    """The shop the running request (or task) works for."""
+    return _current.get()
+
+
+def activate(shop_id: int) -> None:
+    """Make shop_id current for the rest of this context."""
+    _current.set(shop_id)
+
+
+@contextmanager
+def using(shop_id: int) -> Iterator[int]:
+    token = _current.set(shop_id)
+    try:
+        yield shop_id
+    finally:
+        _current.reset(token)
+
+
+def key_sha256(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+class KeyCache:
+    """
+    API key -> shop id, per worker. Unknown keys are remembered as well, so
+    a client retrying a bad key costs one lookup per ttl, not one per request.
+    """
+
+    MAX_ENTRIES = 10_000
+
+    def __init__(self, ttl: float | None = None):
+        self._ttl = ttl
+        self._entries: dict[str, tuple[int | None, float]] = {}
+
+    @property
+    def ttl(self) -> float:
+        if self._ttl is None:
+            return config.get_settings().KEY_CACHE_SECONDS
+        return self._ttl
+
+    def cached(self, api_key: str):
+        """The shop for api_key (None if it belongs to none), or UNKNOWN."""
+        if hmac.compare_digest(api_key.encode(), config.get_settings().API_KEY.encode()):
+            return DEFAULT_SHOP
+        entry = self._entries.get(key_sha256(api_key))
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        return UNKNOWN
+
+    def lookup(self, api_key: str) -> int | None:
+        """Look api_key up in shops and remember the answer."""
+        digest = key_sha256(api_key)
+        shop_id = storage.get().shop_by_key(digest)
+        if len(self._entries) >= self.MAX_ENTRIES:
+            self._entries.clear()
+        self._entries[digest] = (shop_id, time.monotonic() + self.ttl)
+        return shop_id
+
+    def resolve(self, api_key: str) -> int | None:
+        shop_id = self.cached(api_key)
+        return self.lookup(api_key) if shop_id is UNKNOWN else shop_id
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+keys = KeyCache()
+
+
+def create(name: str) -> tuple[int, str]:
+    """
+    Open a new shop with the state /admin/reset leaves behind and an empty
+    recipe book; returns its id and API key. The key isn't stored anywhere,
+    so this is the only time it can be read.
+    """
+    api_key = secrets.token_urlsafe(24)
+    return storage.get().create_shop(name, key_sha256(api_key)), api_key
+
+
+def delete(shop_id: int) -> None:
+    """Close a shop and delete everything it owns."""
+    if shop_id == DEFAULT_SHOP:
+        raise TenancyError("shop 1 belongs to API_KEY and can't be deleted")
+    storage.get().delete_shop(shop_id)
+
+
+def shops() -> list[dict]:
+    return storage.get().shops()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    create_cmd = commands.add_parser("create", help="open a shop, print its API key")
+    create_cmd.add_argument("name")
+    create_cmd.add_argument(
+        "--recipes", type=int, metavar="STEP", help="load src.recipe_gen recipes"
+    )
+    commands.add_parser("list")
+    delete_cmd = commands.add_parser("delete", help="delete a shop and all its state")
+    delete_cmd.add_argument("shop_id", type=int)
+    args = parser.parse_args()
+
+    if args.command == "create":
+        shop_id, api_key = create(args.name)
+        if args.recipes:
+            from src import recipe_gen
+
+            with using(shop_id):
+                recipe_gen.load(args.recipes)
+        print(f"shop {shop_id} API key: {api_key}")
+    elif args.command == "list":
+        for shop in shops():
+            print(shop["id"], shop["name"], shop["created_at"])
+    else:
+        delete(args.shop_id)
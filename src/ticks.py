@@ -0,0 +1,51 @@
+"""
+Tick history: the shop's state at every game tick, for charting.
+
+Each POST /info/current_time appends one narrow row to shop_ticks: the game
+day and hour, gold, ml by colour and potion_count, copied from the shop's
+inventory row (potion_count is already kept current there, so this is one
+INSERT ... SELECT). Rows are never updated.
+
+history() answers a time range with at most `points` buckets, each holding
+the last tick in it plus the bucket's tick count and gold range. A bucket is
+never narrower than a tick (TICK_SECONDS). Once it is a day or wider it is
+rounded to whole days and read from shop_tick_rollups, one row per shop and
+day that the events consumer rebuilds after each tick, so long ranges never
+scan raw ticks. Rollups trail the ticks by the consumer's lag
+(EVENT_POLL_SECONDS); the memory backend buckets its ticks directly.
+"""
+
+import math
+from datetime import datetime
+
+from src import config, events, storage
+from src.lazy import lazy_import
+
+queries = lazy_import("src.queries")
+
+DAY = 86_400
+MAX_POINTS = 2000
+
+
+def bucket_seconds(since: datetime, until: datetime, points: int) -> int:
+    """Bucket width that fits [since, until) into at most points buckets."""
+    width = max(
+        config.get_settings().TICK_SECONDS,
+        math.ceil((until - since).total_seconds() / points),
+    )
+    if width >= DAY:
+        width = math.ceil(width / DAY) * DAY
+    return width
+
+
+def history(since: datetime, until: datetime, points: int) -> list[storage.TickPoint]:
+    """The current shop's ticks in [since, until), downsampled to <= points."""
+    with storage.get().read() as tx:
+        return tx.tick_history(since, until, bucket_seconds(since, until, points))
+
+
+@events.handler(events.TICK)
+def roll_up(conn, batch: list[events.Event]) -> None:
+    """Rebuild the daily rollup of every shop and day the batch ticked in."""
+    days = sorted({(e.shop_id, e.created_at.date()) for e in batch})
+    conn.execute(queries.TICK_ROLLUP, [{"shop": shop, "date": date} for shop, date in days])
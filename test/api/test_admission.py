@@ -0,0 +1,98 @@
+import asyncio
+
+from src.api.admission import Admission, AdmissionMiddleware, Priority, classify
+
+
+def test_routes_are_classified() -> None:
+    assert classify("POST", "/carts/12/checkout") is Priority.HIGH
+    assert classify("POST", "/barrels/deliver/3") is Priority.HIGH
+    assert classify("GET", "/catalog/") is Priority.LOW
+    assert classify("POST", "/carts/12/items/RED") is Priority.LOW
+    assert classify("POST", "/bottler/plan") is Priority.NORMAL
+
+
+def test_freed_slot_goes_to_highest_priority() -> None:
+    async def scenario():
+        admission = Admission(capacity=1, low_wait=5)
+        assert await admission.acquire(Priority.NORMAL)
+        order = []
+
+        async def wait(priority):
+            await admission.acquire(priority)
+            order.append(priority)
+            admission.release(priority)
+
+        waiters = [asyncio.create_task(wait(p)) for p in (Priority.LOW, Priority.HIGH)]
+        await asyncio.sleep(0)
+        admission.release(Priority.NORMAL)
+        await asyncio.gather(*waiters)
+        return order
+
+    assert asyncio.run(scenario()) == [Priority.HIGH, Priority.LOW]
+
+
+def test_low_priority_leaves_room_for_checkout() -> None:
+    async def scenario():
+        admission = Admission(capacity=4, low_limit=2, low_queue=0)
+        browsing = [await admission.acquire(Priority.LOW) for _ in range(3)]
+        checkout = await admission.acquire(Priority.HIGH)
+        return browsing, checkout, admission.stats()["low"]
+
+    browsing, checkout, low = asyncio.run(scenario())
+    assert browsing == [True, True, False]  # the third is shed, not queued
+    assert checkout
+    assert low == {"running": 2, "waiting": 0, "shed": 1}
+
+
+def test_low_priority_shed_after_waiting() -> None:
+    async def scenario():
+        admission = Admission(capacity=1, low_wait=0.01)
+        await admission.acquire(Priority.HIGH)
+        return await admission.acquire(Priority.LOW), admission.stats()["low"]
+
+    admitted, low = asyncio.run(scenario())
+    assert not admitted
+    assert low == {"running": 0, "waiting": 0, "shed": 1}
+
+
+def test_normal_priority_waits_instead_of_being_shed() -> None:
+    async def scenario():
+        admission = Admission(capacity=1, low_queue=0, low_wait=0)
+        await admission.acquire(Priority.HIGH)
+        # more waiters than any LOW queue would take: the shop's own calls
+        plans = [asyncio.create_task(admission.acquire(Priority.NORMAL)) for _ in range(10)]
+        await asyncio.sleep(0.05)
+        assert not any(plan.done() for plan in plans)
+        admission.release(Priority.HIGH)
+        admitted = []
+        for plan in plans:
+            admitted.append(await plan)
+            admission.release(Priority.NORMAL)
+        return admitted, admission.stats()["normal"]
+
+    admitted, normal = asyncio.run(scenario())
+    assert admitted == [True] * 10
+    assert normal == {"running": 0, "waiting": 0, "shed": 0}
+
+
+def test_shed_request_gets_fast_503() -> None:
+    async def app(scope, receive, send):
+        await asyncio.sleep(3600)
+
+    async def scenario():
+        admission = Admission(capacity=1, low_queue=0)
+        middleware = AdmissionMiddleware(app, admission)
+        await admission.acquire(Priority.HIGH)
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "GET", "path": "/catalog/"}
+        await asyncio.wait_for(middleware(scope, None, send), 1)
+        return sent
+
+    start, body = asyncio.run(scenario())
+    assert start["status"] == 503
+    assert (b"retry-after", b"1") in start["headers"]
+    assert b"busy" in body["body"]
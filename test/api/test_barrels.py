@@ -1,7 +1,14 @@
+import json
+import random
+
+import pytest
+from pydantic import TypeAdapter, ValidationError
+
 from src.api.barrels import (
     calculate_barrel_summary,
     create_barrel_plan,
     Barrel,
+    BarrelColumns,
     BarrelOrder,
 )
 from typing import List
@@ -126,7 +133,63 @@ def test_cant_afford_barrel_plan() -> None:
     assert len(barrel_orders) == 0  # Ensure at least one order is generated
 
 
+CATALOG_JSON = b"""[
+    {"sku": "SMALL_RED_BARREL", "ml_per_barrel": 1000, "potion_type": [1, 0, 0, 0], "price": 100, "quantity": 10},
+    {"sku": "LARGE_RED_BARREL", "ml_per_barrel": 5000, "potion_type": [1, 0, 0, 0], "price": 60, "quantity": 1},
+    {"sku": "SMALL_GREEN_BARREL", "ml_per_barrel": 1000, "potion_type": [0, 1, 0, 0], "price": 150, "quantity": 5}
+]"""
+
+
+def test_barrel_columns_match_models() -> None:
+    columns = BarrelColumns.from_json(CATALOG_JSON)
+    models = BarrelColumns.from_barrels(TypeAdapter(List[Barrel]).validate_json(CATALOG_JSON))
 
+    assert columns == models
+    assert len(columns) == 3
+    assert list(columns.mix(2)) == [0.0, 1.0, 0.0, 0.0]
 
 
+@pytest.mark.parametrize(
+    "field, value, error",
+    [
+        ("potion_type", [0.5, 0.4, 0, 0], "value_error"),
+        ("potion_type", [1, 0, 0], "too_short"),
+        ("ml_per_barrel", 0, "greater_than"),
+        ("price", -1, "greater_than_equal"),
+        ("quantity", "many", "int_parsing"),
+    ],
+)
+def test_barrel_columns_validate_like_models(field, value, error) -> None:
+    barrel = {"sku": "X", "ml_per_barrel": 100, "potion_type": [1, 0, 0, 0],
+              "price": 1, "quantity": 1}
+    body = json.dumps([barrel, {**barrel, field: value}]).encode()
+
+    with pytest.raises(ValidationError) as columns_error:
+        BarrelColumns.from_json(body)
+    with pytest.raises(ValidationError) as models_error:
+        TypeAdapter(List[Barrel]).validate_json(body)
+
+    assert [(e["type"], e["loc"]) for e in columns_error.value.errors()] == [
+        (error, (1, field))
+    ]
+    assert [e["type"] for e in models_error.value.errors()] == [error]
+
 
+def test_columnar_delivery_summary() -> None:
+    summary = calculate_barrel_summary(BarrelColumns.from_json(CATALOG_JSON))
+
+    assert summary.gold_paid == 100 * 10 + 60 + 150 * 5
+    assert summary.ml_added_by_color == {"red": 15000, "green": 5000, "blue": 0}
+
+
+def test_columnar_plan_picks_smallest_affordable(monkeypatch) -> None:
+    monkeypatch.setattr(random, "choice", lambda colours: "red")
+    catalog = BarrelColumns.from_json(CATALOG_JSON)
+
+    assert create_barrel_plan(100, 0, 0, 0, catalog) == [
+        BarrelOrder(sku="SMALL_RED_BARREL", quantity=1)
+    ]
+    assert create_barrel_plan(60, 0, 0, 0, catalog) == [
+        BarrelOrder(sku="LARGE_RED_BARREL", quantity=1)
+    ]
+    assert create_barrel_plan(50, 0, 0, 0, catalog) == []
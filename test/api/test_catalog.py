@@ -0,0 +1,35 @@
+import json
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+
+from src.api.bottler import PotionMixes, _PLAN
+from src.api.catalog import CatalogItem, _encode_catalog
+from src.api.responses import json_response
+
+ROW = {
+    "sku": "R50G0B50D0", "name": "Purple", "inventory": 3, "price": 55,
+    "red_pct": 50, "green_pct": 0, "blue_pct": 50, "dark_pct": 0,
+}
+
+
+def test_encoded_catalog_matches_model_response() -> None:
+    expected = [
+        CatalogItem(sku="R50G0B50D0", name="Purple", quantity=3, price=55,
+                    potion_type=[50, 0, 50, 0])
+    ]
+    assert json.loads(_encode_catalog([ROW])) == jsonable_encoder(expected)
+
+
+def test_catalog_rows_still_validated_once() -> None:
+    with pytest.raises(ValidationError):
+        _encode_catalog([{**ROW, "price": 0}])
+
+
+def test_plan_response_is_plain_json() -> None:
+    plan = [PotionMixes(potion_type=[100, 0, 0, 0], quantity=5)]
+    response = json_response(_PLAN, plan)
+
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == jsonable_encoder(plan)
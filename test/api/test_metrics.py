@@ -0,0 +1,21 @@
+import json
+
+from src.api.metrics import ShopMetrics
+
+
+def test_percentiles_read_off_buckets() -> None:
+    m = ShopMetrics()
+    for ms in [3] * 98 + [40, 40]:
+        m.record(ms / 1000, 200)
+
+    assert m.percentile(0.50) == 5
+    assert m.percentile(0.99) == 50
+
+
+def test_requests_past_the_last_bucket_stay_reportable() -> None:
+    m = ShopMetrics()
+    m.record(0.003, 200)
+    m.record(12.5, 503)
+
+    assert m.percentile(0.99) == 12500
+    assert json.loads(json.dumps(m.as_dict()))["errors"] == 1
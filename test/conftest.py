@@ -0,0 +1,18 @@
+import pytest
+import sqlalchemy as sa
+
+
+@pytest.fixture(scope="session")
+def engine():
+    """
+    The database from POSTGRES_URI, migrated to head. Tests that need it are
+    skipped when no Postgres is reachable.
+    """
+    from src import database as db
+
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(sa.text("SELECT 1 FROM cache_versions LIMIT 1"))
+    except sa.exc.SQLAlchemyError as e:
+        pytest.skip(f"needs a migrated Postgres at POSTGRES_URI ({e.__class__.__name__})")
+    return db.engine
@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+import pytest
+import sqlalchemy as sa
+
+from src import archive
+
+OLD_DAY = "2000-01-01"
+
+
+def test_partitions_made_ahead(engine) -> None:
+    with engine.connect() as conn:
+        trans = conn.begin()
+        archive.create_partitions(conn, 40)
+        assert archive.create_partitions(conn, 40) == []  # idempotent
+
+        today = conn.execute(sa.text("SELECT current_date")).scalar_one()
+        cart_id = conn.execute(
+            sa.text(
+                "INSERT INTO carts (customer_id, created_at) "
+                "VALUES ('archive-test', current_date + 40) RETURNING id"
+            )
+        ).scalar_one()
+        (where,) = conn.execute(
+            sa.text("SELECT tableoid::regclass::text FROM carts WHERE id = :id"),
+            {"id": cart_id},
+        ).one()
+        assert where == archive.partition_name("carts", today + timedelta(days=40))
+        trans.rollback()
+
+
+def test_default_rows_move_into_new_partition(engine) -> None:
+    with engine.connect() as conn:
+        trans = conn.begin()
+        archive.create_partitions(conn, 40)
+        # no partition for day 45 yet, so these land in the defaults
+        cart_id = conn.execute(
+            sa.text(
+                "INSERT INTO carts (customer_id, created_at) "
+                "VALUES ('archive-test', current_date + 45) RETURNING id"
+            )
+        ).scalar_one()
+        conn.execute(
+            sa.text(
+                "INSERT INTO cart_items (cart_id, cart_created_at, recipe_id, quantity) "
+                "SELECT :id, current_date + 45, min(id), 3 FROM potion_recipes"
+            ),
+            {"id": cart_id},
+        )
+
+        today = conn.execute(sa.text("SELECT current_date")).scalar_one()
+        day = today + timedelta(days=45)
+        assert archive.create_partitions(conn, 45)[-2:] == [
+            archive.partition_name("carts", day),
+            archive.partition_name("cart_items", day),
+        ]
+
+        for table, column in (("carts", "id"), ("cart_items", "cart_id")):
+            (where,) = conn.execute(
+                sa.text(f"SELECT tableoid::regclass::text FROM {table} WHERE {column} = :id"),
+                {"id": cart_id},
+            ).one()
+            assert where == archive.partition_name(table, day)
+        # the moved items still cascade with their cart
+        conn.execute(sa.text("DELETE FROM carts WHERE id = :id"), {"id": cart_id})
+        assert not conn.execute(
+            sa.text("SELECT 1 FROM cart_items WHERE cart_id = :id"), {"id": cart_id}
+        ).all()
+        trans.rollback()
+
+
+def test_old_day_archived_and_dropped(engine, tmp_path) -> None:
+    pq = pytest.importorskip("pyarrow.parquet")
+    with engine.begin() as conn:
+        for table in ("carts", "cart_items"):
+            conn.execute(
+                sa.text(
+                    f"CREATE TABLE {table}_p20000101 PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{OLD_DAY}') TO ('2000-01-02')"
+                )
+            )
+        cart_id = conn.execute(
+            sa.text(
+                "INSERT INTO carts (customer_id, created_at) "
+                f"VALUES ('archive-test', '{OLD_DAY} 10:00') RETURNING id"
+            )
+        ).scalar_one()
+        conn.execute(
+            sa.text(
+                "INSERT INTO cart_items (cart_id, cart_created_at, recipe_id, quantity) "
+                f"SELECT :id, '{OLD_DAY} 10:00', min(id), 3 FROM potion_recipes"
+            ),
+            {"id": cart_id},
+        )
+
+    done = archive.archive(keep_days=1, directory=tmp_path)
+
+    assert [d["day"] for d in done] == [OLD_DAY]
+    assert done[0]["rows"] == {"cart_items": 1, "carts": 1}
+    items = pq.read_table(tmp_path / "cart_items" / "cart_items_p20000101.parquet")
+    assert items.column("quantity").to_pylist() == [3]
+    with engine.begin() as conn:
+        assert conn.execute(
+            sa.text("SELECT count(*) FROM carts WHERE customer_id = 'archive-test'")
+        ).scalar_one() == 0
+        assert conn.execute(
+            sa.text("SELECT to_regclass('carts_p20000101')")
+        ).scalar_one() is None
@@ -0,0 +1,102 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import sqlalchemy as sa
+from fastapi.testclient import TestClient
+
+from src import queries, tenancy
+from src.api.server import app
+
+
+def _check(conn):
+    rows = conn.execute(queries.POTION_COUNT_CHECK).all()
+    return next(row for row in rows if row.shop_id == 1)
+
+
+def test_potion_count_follows_every_write(engine) -> None:
+    with engine.connect() as conn:
+        trans = conn.begin()
+        conn.execute(queries.POTION_COUNT_RECOMPUTE)
+        before = _check(conn).potion_count
+
+        conn.execute(
+            sa.text(
+                """
+                INSERT INTO potion_recipes
+                    (sku, name, price, red_pct, green_pct, blue_pct, dark_pct, inventory)
+                VALUES ('AUDIT_A', 'a', 10, 100, 0, 0, 0, 7),
+                       ('AUDIT_B', 'b', 10, 0, 100, 0, 0, 3)
+                """
+            )
+        )
+        assert _check(conn).potion_count == before + 10
+
+        conn.execute(
+            sa.text("UPDATE potion_recipes SET inventory = inventory - 2 WHERE sku LIKE 'AUDIT_%'")
+        )
+        assert _check(conn).potion_count == before + 6
+
+        conn.execute(sa.text("DELETE FROM potion_recipes WHERE sku = 'AUDIT_A'"))
+        row = _check(conn)
+        assert row.potion_count == before + 1
+        assert row.potion_count == row.actual
+        trans.rollback()
+
+
+def _wait_for_lock_waits(conn, n: int) -> None:
+    for _ in range(100):
+        waiting = conn.execute(
+            sa.text(
+                "SELECT count(*) FROM pg_stat_activity "
+                "WHERE datname = current_database() AND wait_event_type = 'Lock'"
+            )
+        ).scalar_one()
+        if waiting >= n:
+            return
+        time.sleep(0.05)
+    raise AssertionError(f"expected {n} backends waiting on a lock")
+
+
+def test_concurrent_checkouts_dont_deadlock(engine) -> None:
+    # every stock change also updates the shop's global_inventory row (the
+    # potion_count trigger), so two carts buying the same recipes in opposite
+    # order deadlock unless checkout takes that row before any recipe row
+    shop, key = tenancy.create("audit-checkout-test")
+    headers = {"access_token": key}
+    try:
+        with engine.begin() as conn:
+            conn.execute(
+                sa.text(
+                    "INSERT INTO potion_recipes "
+                    "(shop_id, sku, name, price, red_pct, green_pct, blue_pct, dark_pct, inventory) "
+                    "VALUES (:shop, 'RED', 'red', 50, 100, 0, 0, 0, 10), "
+                    "       (:shop, 'GREEN', 'green', 50, 0, 100, 0, 0, 10)"
+                ),
+                {"shop": shop},
+            )
+        with TestClient(app) as client, ThreadPoolExecutor(2) as pool:
+            carts = []
+            for skus in (("RED", "GREEN"), ("GREEN", "RED")):
+                cart = client.post("/carts/", json={"customer_id": "c"}, headers=headers)
+                carts.append(cart.json()["cart_id"])
+                for sku in skus:
+                    client.post(
+                        f"/carts/{carts[-1]}/items/{sku}", json={"quantity": 1}, headers=headers
+                    )
+
+            # hold the inventory row until both checkouts are waiting on it
+            with engine.begin() as blocker:
+                blocker.execute(
+                    sa.text("SELECT 1 FROM global_inventory WHERE shop_id = :shop FOR UPDATE"),
+                    {"shop": shop},
+                )
+                futures = [
+                    pool.submit(client.post, f"/carts/{cart}/checkout", headers=headers)
+                    for cart in carts
+                ]
+                _wait_for_lock_waits(blocker, 2)
+
+            assert [f.result().status_code for f in futures] == [200, 200]
+            assert client.get("/inventory/audit", headers=headers).json()["number_of_potions"] == 16
+    finally:
+        tenancy.delete(shop)
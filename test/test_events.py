@@ -0,0 +1,93 @@
+import pytest
+import sqlalchemy as sa
+
+from src import events
+
+KIND = "test_event"
+
+
+class RecordingConsumer(events.Consumer):
+    """A consumer whose only handler keeps every event it's given."""
+
+    def __init__(self, name: str):
+        self.received: list[events.Event] = []
+        registry: dict = {}
+        events.handler(KIND, registry=registry)(
+            lambda conn, batch: self.received.extend(batch)
+        )
+        super().__init__(name, handlers=registry, batch_size=1000)
+
+
+@pytest.fixture
+def consumer(engine):
+    consumer = RecordingConsumer("test_events")
+    _drain(consumer)  # skip past whatever the database already holds
+    consumer.received.clear()
+    yield consumer
+    with engine.begin() as conn:
+        conn.execute(sa.text("DELETE FROM event_checkpoints WHERE consumer = 'test_events'"))
+        conn.execute(sa.text("DELETE FROM shop_events WHERE kind = :k"), {"k": KIND})
+
+
+def _drain(consumer) -> None:
+    while consumer.drain_once():
+        pass
+
+
+def _emit(conn, n: int) -> None:
+    events.emit(conn, KIND, {"n": n})
+
+
+def test_events_delivered_in_commit_order(engine, consumer) -> None:
+    with engine.begin() as conn:
+        _emit(conn, 1)
+        _emit(conn, 2)
+    _drain(consumer)
+    assert [e.payload["n"] for e in consumer.received] == [1, 2]
+
+    _drain(consumer)  # checkpointed: nothing is delivered twice
+    assert len(consumer.received) == 2
+
+
+def test_late_commit_is_not_skipped(engine, consumer) -> None:
+    # the slow transaction takes the lower id but commits after the fast one
+    with engine.connect() as slow:
+        slow.begin()
+        _emit(slow, 1)
+        with engine.begin() as fast:
+            _emit(fast, 2)
+
+        _drain(consumer)
+        assert consumer.received == []  # can't pass the open transaction
+
+        slow.commit()
+
+    _drain(consumer)
+    assert sorted(e.payload["n"] for e in consumer.received) == [1, 2]
+
+
+def test_rolled_back_events_are_never_delivered(engine, consumer) -> None:
+    with engine.connect() as conn:
+        conn.begin()
+        _emit(conn, 1)
+        conn.rollback()
+    _drain(consumer)
+    assert consumer.received == []
+
+
+def test_failed_handler_sees_batch_again(engine, consumer) -> None:
+    attempts = []
+
+    def flaky(conn, batch):
+        attempts.append([e.payload["n"] for e in batch])
+        if len(attempts) == 1:
+            raise RuntimeError("downstream unavailable")
+
+    consumer.handlers[KIND].append(flaky)
+    with engine.begin() as conn:
+        _emit(conn, 1)
+
+    with pytest.raises(RuntimeError):
+        consumer.drain_once()
+    _drain(consumer)
+    assert attempts == [[1], [1]]
@@ -0,0 +1,84 @@
+import time
+
+from src import invalidation, storage, tenancy
+from src.storage.memory import MemoryStorage
+
+
+def _wait_for(predicate, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def _loads_counter():
+    loads = []
+
+    def loader(conn):
+        loads.append(1)
+        return len(loads)
+
+    return loader
+
+
+def _publish(engine, topic: str) -> None:
+    with engine.begin() as conn:
+        invalidation.publish(conn, topic)
+
+
+def test_workers_see_each_others_writes(engine) -> None:
+    # two buses with their own listener connections behave like two workers
+    workers = [invalidation.InvalidationBus(check_interval=3600) for _ in range(2)]
+    caches = [w.cache(invalidation.RECIPES, _loads_counter()) for w in workers]
+    for w in workers:
+        w.start()
+    try:
+        assert _wait_for(lambda: all(w._thread is not None for w in workers))
+        time.sleep(0.5)  # let both LISTENs land
+        assert [c.get() for c in caches] == [1, 1]
+        assert [c.get() for c in caches] == [1, 1]  # served from cache
+
+        _publish(engine, invalidation.RECIPES)
+
+        assert _wait_for(lambda: [c.get() for c in caches] == [2, 2])
+    finally:
+        for w in workers:
+            w.stop()
+
+
+def test_missed_notification_caught_by_version_check(engine) -> None:
+    # no listener running: every notification is "missed"
+    worker = invalidation.InvalidationBus(check_interval=0.2)
+    cache = worker.cache(invalidation.INVENTORY, _loads_counter())
+
+    assert cache.get() != "stale"
+    _publish(engine, invalidation.INVENTORY)
+    assert _wait_for(lambda: cache.get() == 2)
+
+
+def test_rollback_does_not_invalidate(engine) -> None:
+    worker = invalidation.InvalidationBus(check_interval=0)
+    cache = worker.cache(invalidation.INVENTORY, _loads_counter())
+
+    assert cache.get() != "stale"
+    with engine.connect() as conn:
+        invalidation.publish(conn, invalidation.INVENTORY)
+        conn.rollback()
+    assert cache.get() != "stale"
+
+
+def test_version_known_only_to_the_bus_reloads(monkeypatch) -> None:
+    # a version check the entry never heard about (it came before the entry
+    # existed) must still make get() reload rather than return the old value
+    monkeypatch.setattr(storage, "get", lambda: MemoryStorage(recipe_step=0))
+    bus = invalidation.InvalidationBus(check_interval=3600)
+    cache = bus.cache(invalidation.RECIPES, _loads_counter())
+    shop = tenancy.DEFAULT_SHOP
+    entry = cache._entry(shop)
+    entry.value, entry.version = "stale", 3
+    bus._versions[shop, invalidation.RECIPES] = 5
+    bus._checked_at = time.monotonic()
+
+    assert cache.get() != "stale"
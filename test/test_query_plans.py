@@ -0,0 +1,176 @@
+"""
+Query-plan regression suite: EXPLAIN every statement in src.queries against a
+large seeded dataset and fail if any of them falls back to a sequential scan
+of a table that grows.
+
+The growing tables are emptied and seeded inside a transaction that is
+rolled back, so plans don't depend on what the database already held (a
+full recipe_gen load, say) and a development database is left untouched.
+"""
+
+import json
+
+import pytest
+import sqlalchemy as sa
+
+from src import queries, recipe_gen
+
+# tables small enough that a seq scan is the right plan
+SMALL_TABLES = {"global_inventory", "cache_versions", "event_checkpoints", "shops"}
+
+# the tables the fixture empties and fills
+SEEDED_TABLES = (
+    "potion_recipes", "carts", "cart_items", "stock_holds", "shop_events",
+    "shop_ticks", "shop_tick_rollups",
+)
+
+# statements that read a whole table on purpose
+FULL_SCANS = {
+    # the staged bulk load, checked against every recipe of the shop: with a
+    # load as big as the catalog, one merge anti join over potion_recipes is
+    # cheaper than an index probe per staged row
+    "RECIPE_LOAD_UPSERT": {"recipe_load", "potion_recipes"},
+    "POTION_COUNT_CHECK": {"potion_recipes"},  # audit recompute
+    "POTION_COUNT_RECOMPUTE": {"potion_recipes"},
+    "RESERVED_CHECK": {"potion_recipes", "stock_holds"},
+    "RESERVED_RECOMPUTE": {"potion_recipes", "stock_holds"},
+    "CARTS_RESET": {"carts"},  # /admin/reset empties the shop's carts
+    "HOLDS_RESET": {"stock_holds"},  # and its holds
+}
+
+# utility statements EXPLAIN doesn't accept
+NOT_EXPLAINABLE = {"RECIPE_LOAD_TABLE", "RECIPE_LOAD_ANALYZE"}
+
+# one sample value per bind parameter name used in src.queries
+SAMPLE_PARAMS = {
+    "shop": 1, "s": "R20G20B20D40",
+    "r": 20, "g": 20, "b": 20, "d": 40,
+    "rid": 1234, "cid": 4321, "qty": 1, "cname": "plan-test",
+    "rml": 0, "gml": 0, "bml": 0,
+    "gold_paid": 0, "add_r": 0, "add_g": 0, "add_b": 0,
+    "t": "recipes", "topics": ["recipes"],
+    "kind": "checkout", "payload": '{"cart_id": 1}', "consumer": "shop",
+    "last_txid": "1000", "last_id": 1000, "limit": 500,
+    "from_txid": "1000", "from_id": 500,
+    "max_age": 86400,
+    "key_sha256": "0" * 64, "name": "plan-test",
+    "day": "Hearthday", "hour": 12, "date": "2025-05-20", "width": 7200,
+    "since": "2025-05-01", "until": "2025-05-31",
+    "hold_seconds": 900,
+}
+
+STATEMENTS = {
+    name: stmt
+    for name, stmt in vars(queries).items()
+    if isinstance(stmt, sa.TextClause) and name not in NOT_EXPLAINABLE
+}
+
+
+@pytest.fixture(scope="module")
+def seeded(engine):
+    with engine.connect() as conn:
+        trans = conn.begin()
+        conn.execute(sa.text(f"TRUNCATE {', '.join(SEEDED_TABLES)}"))
+        recipe_gen.upsert(conn, 2)  # ~23k recipes; leaves recipe_load staged
+        conn.execute(
+            sa.text(
+                "UPDATE potion_recipes SET inventory = 100000 "
+                "WHERE id IN (SELECT id FROM potion_recipes ORDER BY random() LIMIT 6)"
+            )
+        )
+        conn.execute(
+            sa.text(
+                """
+                WITH new_carts AS (
+                    INSERT INTO carts (customer_id, customer_name, checked_out)
+                    SELECT 'c' || i, 'anon', i % 3 = 0 FROM generate_series(1, 50000) i
+                    RETURNING id, created_at
+                )
+                INSERT INTO cart_items (cart_id, cart_created_at, recipe_id, quantity)
+                SELECT id, created_at, (SELECT min(id) FROM potion_recipes), 1
+                FROM new_carts
+                """
+            )
+        )
+        conn.execute(
+            sa.text(
+                """
+                INSERT INTO stock_holds (cart_id, recipe_id, shop_id, quantity, expires_at)
+                SELECT c.id, p.ids[1 + c.id % 6], 1, 1, now() + (c.id % 100) * INTERVAL '1 minute'
+                FROM carts c,
+                     (SELECT array_agg(id) AS ids FROM potion_recipes WHERE inventory = 100000) p
+                """
+            )
+        )
+        conn.execute(
+            sa.text(
+                "INSERT INTO shop_events (kind, payload) "
+                "SELECT 'checkout', '{}' FROM generate_series(1, 50000)"
+            )
+        )
+        conn.execute(
+            sa.text(
+                """
+                INSERT INTO shop_ticks
+                    (shop_id, at, day, hour, gold, red_ml, green_ml, blue_ml, dark_ml, potion_count)
+                SELECT 1, TIMESTAMP '2015-01-01' + i * INTERVAL '2 hours', 'Hearthday', 0,
+                       100, 0, 0, 0, 0, 0
+                FROM generate_series(1, 50000) i
+                """
+            )
+        )
+        conn.execute(
+            sa.text(
+                """
+                INSERT INTO shop_tick_rollups
+                SELECT 1, d, 12, d, 'Hearthday', 0, 100, 100, 100, 0, 0, 0, 0, 0
+                FROM generate_series(DATE '2015-01-01', DATE '2025-12-31', INTERVAL '1 day') d
+                """
+            )
+        )
+        conn.execute(sa.text(f"ANALYZE {', '.join(SEEDED_TABLES)}"))
+        yield conn
+        trans.rollback()
+
+
+@pytest.fixture(scope="module")
+def parents(seeded) -> dict[str, str | None]:
+    """
+    Partition name -> partitioned table, so carts_p20250520 counts as carts.
+    Empty partitions (days ahead, the default) map to None: scanning them is free.
+    Empty going by row estimate: a partition that once held rows keeps its pages.
+    """
+    return {
+        child: parent if rows > 0 else None
+        for child, parent, rows in seeded.execute(
+            sa.text(
+                "SELECT i.inhrelid::regclass::text, i.inhparent::regclass::text, "
+                "c.reltuples FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid"
+            )
+        )
+    }
+
+
+def _seq_scans(plan: dict, parents: dict[str, str | None]) -> set[str]:
+    found = set()
+    if plan.get("Node Type") == "Seq Scan":
+        relation = plan["Relation Name"]
+        if parents.get(relation, relation):
+            found.add(parents.get(relation, relation))
+    for child in plan.get("Plans", ()):
+        found |= _seq_scans(child, parents)
+    return found
+
+
+@pytest.mark.parametrize("name", sorted(STATEMENTS))
+def test_no_sequential_scans(seeded, parents, name) -> None:
+    stmt = STATEMENTS[name]
+    missing = set(stmt._bindparams) - set(SAMPLE_PARAMS)
+    assert not missing, f"add sample values for {missing} to SAMPLE_PARAMS"
+
+    params = {k: SAMPLE_PARAMS[k] for k in stmt._bindparams}
+    raw = seeded.execute(sa.text(f"EXPLAIN (FORMAT JSON) {stmt.text}"), params).scalar()
+    plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+
+    allowed = SMALL_TABLES | FULL_SCANS.get(name, set())
+    assert _seq_scans(plan, parents) <= allowed, json.dumps(plan, indent=1)
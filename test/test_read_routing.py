@@ -0,0 +1,52 @@
+import pytest
+import sqlalchemy as sa
+
+from src import config
+from src import database as db
+
+READ_ONLY = sa.text("SELECT current_setting('transaction_read_only')")
+
+
+@pytest.fixture
+def replica(engine, monkeypatch):
+    """The primary doubles as the read replica: it's never behind."""
+    settings = config.get_settings()
+    monkeypatch.setattr(settings, "POSTGRES_READ_URI", settings.POSTGRES_URI)
+    monkeypatch.setattr(db, "replica_lag", db._ReplicaLag())
+    db.get_read_engine.cache_clear()
+    yield settings
+    db.get_read_engine.cache_clear()
+
+
+def _routed_read_only() -> bool:
+    with db.read() as conn:
+        return conn.execute(READ_ONLY).scalar_one() == "on"
+
+
+def test_reads_use_primary_without_replica(engine, monkeypatch) -> None:
+    monkeypatch.setattr(config.get_settings(), "POSTGRES_READ_URI", None)
+    db.get_read_engine.cache_clear()
+    try:
+        assert not _routed_read_only()
+    finally:
+        db.get_read_engine.cache_clear()
+
+
+def test_reads_routed_to_fresh_replica(replica) -> None:
+    assert _routed_read_only()
+    with db.read() as conn:
+        with pytest.raises(sa.exc.InternalError, match="read-only transaction"):
+            conn.execute(sa.text("UPDATE global_inventory SET gold = gold"))
+
+
+def test_lagging_replica_falls_back_to_primary(replica, monkeypatch) -> None:
+    monkeypatch.setattr(replica, "READ_MAX_LAG_SECONDS", -1.0)
+    assert not _routed_read_only()
+
+
+def test_unreachable_replica_falls_back_to_primary(replica, monkeypatch) -> None:
+    monkeypatch.setattr(
+        replica, "POSTGRES_READ_URI",
+        "postgresql+psycopg://nobody@127.0.0.1:1/nothing?connect_timeout=1",
+    )
+    assert not _routed_read_only()
@@ -0,0 +1,43 @@
+import re
+
+import pytest
+
+from src import recipe_gen
+
+
+def test_every_mix_at_one_percent() -> None:
+    mixes = list(recipe_gen.mixes(1))
+
+    assert len(mixes) == 176_851  # C(103, 3)
+    assert len(set(mixes)) == len(mixes)
+    assert all(sum(m) == 100 for m in mixes)
+
+
+def test_coarse_step() -> None:
+    assert sorted(recipe_gen.mixes(50)) == [
+        (0, 0, 0, 100), (0, 0, 50, 50), (0, 0, 100, 0), (0, 50, 0, 50),
+        (0, 50, 50, 0), (0, 100, 0, 0), (50, 0, 0, 50), (50, 0, 50, 0),
+        (50, 50, 0, 0), (100, 0, 0, 0),
+    ]
+
+
+def test_step_must_divide_100() -> None:
+    with pytest.raises(ValueError):
+        list(recipe_gen.mixes(7))
+
+
+def test_recipes_fit_the_catalog() -> None:
+    # CatalogItem: sku ^[a-zA-Z0-9_]{1,20}$, 1 <= price <= 500
+    skus = set()
+    for rec in recipe_gen.recipes(5):
+        assert re.match(r"^[a-zA-Z0-9_]{1,20}$", rec.sku)
+        assert 1 <= rec.price <= 500
+        skus.add(rec.sku)
+    assert len(skus) == 1771
+
+
+def test_mixed_and_dark_potions_cost_more() -> None:
+    pure_red = recipe_gen.price((100, 0, 0, 0))
+
+    assert recipe_gen.price((50, 50, 0, 0)) > pure_red
+    assert recipe_gen.price((0, 0, 0, 100)) > pure_red
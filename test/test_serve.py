@@ -0,0 +1,86 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+import pytest
+import sqlalchemy as sa
+
+from src import config
+
+BARREL = {"sku": "SMALL_RED_BARREL", "ml_per_barrel": 1,
+          "potion_type": [1, 0, 0, 0], "price": 0, "quantity": 1}
+
+
+def test_pool_is_a_share_of_the_budget(monkeypatch) -> None:
+    monkeypatch.setenv("DB_CONNECTION_BUDGET", "22")
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    monkeypatch.delenv("ADMISSION_MAX_INFLIGHT", raising=False)
+    settings = config.Settings()
+    # 22 // 4 = 5 each, one of them the invalidation listener's
+    assert (settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW) == (2, 2)
+    assert settings.ADMISSION_MAX_INFLIGHT == 4
+
+
+def test_budget_must_cover_every_worker(monkeypatch) -> None:
+    monkeypatch.setenv("DB_CONNECTION_BUDGET", "10")
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    with pytest.raises(ValueError, match="DB_CONNECTION_BUDGET"):
+        config.Settings()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(url: str) -> None:
+    for _ in range(100):
+        try:
+            httpx.get(url)
+            return
+        except httpx.ConnectError:
+            time.sleep(0.1)
+    raise TimeoutError(url)
+
+
+def test_sigterm_drains_in_flight_requests(engine) -> None:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "src.serve", "--workers", "2", "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_until_up(url)
+        headers = {"access_token": config.get_settings().API_KEY}
+        answered = []
+
+        def deliver() -> None:
+            answered.append(
+                httpx.post(f"{url}/barrels/deliver/1", json=[BARREL], headers=headers, timeout=30)
+            )
+
+        with engine.connect() as conn, conn.begin():
+            # the delivery waits on this lock until the server is stopping
+            conn.execute(sa.text("SELECT 1 FROM global_inventory WHERE shop_id = 1 FOR UPDATE"))
+            request = threading.Thread(target=deliver)
+            request.start()
+            time.sleep(1)
+            server.send_signal(signal.SIGTERM)
+            time.sleep(1)
+            with pytest.raises(httpx.ConnectError):
+                httpx.get(url)
+
+        request.join()
+        assert answered[0].status_code == 204
+        assert server.wait(10) == 0
+    finally:
+        if server.poll() is None:
+            os.kill(server.pid, signal.SIGKILL)
@@ -0,0 +1,45 @@
+import pytest
+import sqlalchemy as sa
+
+from src import snapshots
+
+
+def _state(conn) -> dict:
+    # stock_holds is keyed by its first two columns, the rest by the first
+    return {
+        t: conn.execute(sa.text(f"SELECT * FROM {t} ORDER BY 1, 2")).all()
+        for t in snapshots.GAME_TABLES
+    }
+
+
+def test_restore_round_trip(engine, tmp_path) -> None:
+    snapshots.save("before", tmp_path)
+    try:
+        with engine.begin() as conn:
+            conn.execute(sa.text("UPDATE global_inventory SET gold = gold + 12345"))
+            conn.execute(
+                sa.text("INSERT INTO carts (customer_id) VALUES ('snapshot-test')")
+            )
+            saved = _state(conn)
+        snapshots.save("mutated", tmp_path)
+
+        snapshots.restore("before", tmp_path)
+        with engine.begin() as conn:
+            assert _state(conn) != saved
+
+        snapshots.restore("mutated", tmp_path)
+        with engine.begin() as conn:
+            assert _state(conn) == saved
+            # the sequence was moved past the restored ids
+            new_id = conn.execute(
+                sa.text("INSERT INTO carts (customer_id) VALUES ('x') RETURNING id")
+            ).scalar_one()
+            assert new_id > max(r.id for r in saved["carts"])
+    finally:
+        snapshots.restore("before", tmp_path)
+
+
+@pytest.mark.parametrize("name", ["../etc", "a b", ""])
+def test_bad_names_rejected(tmp_path, name) -> None:
+    with pytest.raises(snapshots.SnapshotError):
+        snapshots.save(name, tmp_path)
@@ -0,0 +1,398 @@
+"""
+Conformance suite: every storage backend must pass all of it. Each test
+works in a fresh shop of its own.
+"""
+
+import itertools
+from datetime import datetime, timedelta
+
+import pytest
+
+from src import invalidation, storage, tenancy
+from src.storage.memory import MemoryStorage
+
+RED = [100, 0, 0, 0]
+_names = itertools.count()
+
+
+@pytest.fixture(params=["memory", "postgres"])
+def store(request):
+    if request.param == "memory":
+        return MemoryStorage(recipe_step=0)
+    request.getfixturevalue("engine")  # skips without Postgres
+    from src.storage.postgres import PostgresStorage
+
+    return PostgresStorage()
+
+
+@pytest.fixture
+def shop(store):
+    """A fresh shop with the 10 recipes at step 50, made current."""
+    shop_id = store.create_shop(f"storage-test-{next(_names)}", f"{next(_names):064d}")
+    with tenancy.using(shop_id):
+        with store.transaction() as tx:
+            tx.load_recipes(50)
+        yield shop_id
+    store.delete_shop(shop_id)
+
+
+def _red(store) -> storage.RecipeStock:
+    with store.read() as tx:
+        return tx.recipe_by_sku("R100G0B0D0")
+
+
+def test_new_shop_starts_reset(store, shop) -> None:
+    with store.read() as tx:
+        inv = tx.inventory()
+        assert inv == storage.Inventory(100, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+        assert tx.catalog() == []
+        assert len(tx.recipe_mixes(100, 100, 100, after=0, limit=100)) == 10
+        assert tx.cache_version(invalidation.RECIPES) >= 0
+
+
+def test_recipe_mixes_page_by_id_within_shares(store, shop) -> None:
+    with store.read() as tx:
+        every = tx.recipe_mixes(100, 100, 100, after=0, limit=100)
+        ids = [recipe_id for recipe_id, _ in every]
+        assert ids == sorted(ids)
+        assert tx.recipe_mixes(100, 100, 100, after=ids[2], limit=3) == every[3:6]
+        # no red, green or blue to spend: only dark mixes
+        assert [mix for _, mix in tx.recipe_mixes(0, 0, 0, after=0, limit=100)] == [
+            [0, 0, 0, 100]
+        ]
+        assert sorted(mix for _, mix in tx.recipe_mixes(50, 0, 0, after=0, limit=100)) == [
+            [0, 0, 0, 100], [50, 0, 0, 50],
+        ]
+
+
+def test_recipes_load_once(store, shop) -> None:
+    with store.transaction() as tx:
+        assert tx.load_recipes(50) == 0
+        red = tx.recipe_by_sku("R100G0B0D0")
+        assert (red.price, red.inventory) == (40, 0)
+        assert tx.recipe_by_mix(RED) == red.id
+        assert tx.recipe_by_mix([99, 1, 0, 0]) is None
+        assert tx.recipe_by_sku("NOPE") is None
+
+
+def test_stock_moves_potion_count_and_catalog(store, shop) -> None:
+    red = _red(store)
+    with store.transaction() as tx:
+        tx.add_stock(red.id, 5)
+        tx.remove_stock(red.id, 2)
+
+    with store.read() as tx:
+        assert tx.inventory().potion_count == 3
+        assert tx.catalog() == [
+            {"sku": "R100G0B0D0", "name": "red potion (100/0/0/0)", "price": 40,
+             "red_pct": 100, "green_pct": 0, "blue_pct": 0, "dark_pct": 0,
+             "inventory": 3}
+        ]
+
+
+def test_ledger(store, shop) -> None:
+    with store.transaction() as tx:
+        tx.add_barrels(gold_paid=60, red_ml=500, green_ml=200, blue_ml=0)
+        tx.use_ml(100, 0, 0)
+        tx.add_gold(15)
+        inv = tx.inventory()
+
+    assert (inv.gold, inv.red_ml, inv.green_ml, inv.blue_ml) == (55, 400, 200, 0)
+
+
+@pytest.mark.parametrize(
+    "overdraw",
+    [
+        lambda tx, red: tx.add_gold(-101),
+        lambda tx, red: tx.use_ml(1, 0, 0),
+        lambda tx, red: tx.remove_stock(red.id, 1),
+    ],
+    ids=["gold", "ml", "stock"],
+)
+def test_constraint_violation_rolls_back(store, shop, overdraw) -> None:
+    red = _red(store)
+    with pytest.raises(storage.ConstraintError):
+        with store.transaction() as tx:
+            tx.add_stock(red.id, 1)
+            tx.remove_stock(red.id, 1)
+            overdraw(tx, red)
+
+    with store.read() as tx:
+        assert tx.inventory().gold == 100
+        assert tx.recipe_by_sku("R100G0B0D0").inventory == 0
+
+
+def test_error_rolls_back_everything(store, shop) -> None:
+    red = _red(store)
+    with store.read() as tx:
+        version = tx.cache_version(invalidation.RECIPES)
+
+    with pytest.raises(RuntimeError):
+        with store.transaction() as tx:
+            cart = tx.create_cart("c1", "anon")
+            tx.set_cart_item(cart, red.id, 1)
+            tx.add_stock(red.id, 4)
+            tx.add_gold(10)
+            tx.publish(invalidation.RECIPES)
+            tx.emit("test_event", {"cart_id": cart})
+            raise RuntimeError("checkout failed")
+
+    with store.transaction() as tx:
+        assert not tx.claim_cart(cart)
+        assert tx.inventory() == storage.Inventory(100, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+        assert tx.cache_version(invalidation.RECIPES) == version
+
+
+def test_cart_lifecycle(store, shop) -> None:
+    red = _red(store)
+    with store.transaction() as tx:
+        tx.add_stock(red.id, 7)
+        cart = tx.create_cart("c1", "anon")
+        assert not tx.set_cart_item(cart + 1_000_000, red.id, 1)
+        assert tx.set_cart_item(cart, red.id, 1)
+        assert tx.set_cart_item(cart, red.id, 3)  # replaces the quantity
+
+    with store.transaction() as tx:
+        assert tx.cart_lines(cart) == [storage.CartLine(red.id, 40, 7, 3)]
+        assert tx.claim_cart(cart)
+        assert not tx.claim_cart(cart)
+        # a checked-out cart takes no more items, so it can't hold stock
+        assert not tx.set_cart_item(cart, red.id, 2)
+
+
+def _unheld(store) -> int:
+    with store.read() as tx:
+        return sum(item["inventory"] for item in tx.catalog())
+
+
+def test_holds_set_stock_aside(store, shop) -> None:
+    red = _red(store)
+    with store.transaction() as tx:
+        tx.add_stock(red.id, 5)
+        a, b = tx.create_cart("c1", "anon"), tx.create_cart("c2", "anon")
+        assert tx.hold_stock(a, red.id, 3)
+    assert _unheld(store) == 2
+
+    with store.transaction() as tx:
+        assert not tx.hold_stock(b, red.id, 3)
+        assert tx.hold_stock(b, red.id, 2)
+    assert _unheld(store) == 0
+
+    with store.transaction() as tx:
+        assert tx.hold_stock(a, red.id, 1)  # replaces a's hold
+        assert tx.hold_stock(b, red.id, 4)  # b's own 2 count towards it
+    assert _unheld(store) == 0
+
+    with pytest.raises(storage.ConstraintError), store.transaction() as tx:
+        tx.remove_stock(red.id, 1)  # would leave less than is held
+    with store.read() as tx:
+        assert tx.recipe_by_sku("R100G0B0D0").inventory == 5
+
+
+def test_sales_leave_other_carts_holds_alone(store, shop) -> None:
+    red = _red(store)
+    with store.transaction() as tx:
+        tx.add_stock(red.id, 5)
+        a, b = tx.create_cart("c1", "anon"), tx.create_cart("c2", "anon")
+        tx.hold_stock(a, red.id, 2)
+        tx.hold_stock(b, red.id, 3)
+
+    with store.transaction() as tx:
+        assert not tx.sell_stock(red.id, 1)
+        tx.release_holds(a)
+        assert not tx.sell_stock(red.id, 3)
+        assert tx.sell_stock(red.id, 2)
+
+    with store.transaction() as tx:
+        tx.release_holds(b)
+        assert tx.sell_stock(red.id, 3)
+        assert tx.inventory().potion_count == 0
+
+
+def test_expired_holds_are_released(store, shop, monkeypatch) -> None:
+    from src import config
+
+    red = _red(store)
+    monkeypatch.setattr(config.get_settings(), "STOCK_HOLD_SECONDS", -1)
+    with store.transaction() as tx:
+        tx.add_stock(red.id, 5)
+        tx.hold_stock(tx.create_cart("c1", "anon"), red.id, 2)
+        tx.hold_stock(tx.create_cart("c2", "anon"), red.id, 1)
+    assert _unheld(store) == 2
+
+    with store.read() as tx:
+        version = tx.cache_version(invalidation.RECIPES)
+    assert store.release_expired_holds(limit=1) == 1
+    assert store.release_expired_holds(limit=10) >= 1
+    assert _unheld(store) == 5
+    with store.read() as tx:
+        # the catalog's cache reloads with the stock back on sale
+        assert tx.cache_version(invalidation.RECIPES) > version
+
+
+def test_carts_belong_to_their_shop(store, shop) -> None:
+    with store.transaction() as tx:
+        cart = tx.create_cart("c1", "anon")
+    other = store.create_shop(f"storage-test-{next(_names)}", f"{next(_names):064d}")
+    try:
+        with tenancy.using(other), store.transaction() as tx:
+            assert tx.inventory().gold == 100
+            assert tx.recipe_by_sku("R100G0B0D0") is None
+            assert not tx.claim_cart(cart)
+            assert tx.cart_lines(cart) == []
+    finally:
+        store.delete_shop(other)
+
+
+def test_reset(store, shop) -> None:
+    red = _red(store)
+    with store.transaction() as tx:
+        tx.add_stock(red.id, 2)
+        tx.add_barrels(gold_paid=50, red_ml=100, green_ml=0, blue_ml=0)
+        cart = tx.create_cart("c1", "anon")
+        tx.hold_stock(cart, red.id, 1)
+
+    with store.transaction() as tx:
+        tx.reset()
+
+    with store.transaction() as tx:
+        assert tx.inventory() == storage.Inventory(100, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+        assert tx.catalog() == []
+        assert not tx.claim_cart(cart)
+        tx.add_stock(red.id, 1)
+    assert _unheld(store) == 1
+
+
+def test_publish_bumps_versions_on_commit(store, shop) -> None:
+    with store.read() as tx:
+        before = tx.cache_version(invalidation.INVENTORY)
+    with store.transaction() as tx:
+        tx.publish(invalidation.INVENTORY)
+
+    with store.read() as tx:
+        assert tx.cache_version(invalidation.INVENTORY) == before + 1
+    assert (shop, invalidation.INVENTORY, before + 1) in store.cache_versions()
+
+
+def test_tick_history(store, shop) -> None:
+    red = _red(store)
+    for hour, gold in ((0, 10), (2, -30), (4, 5)):
+        with store.transaction() as tx:
+            tx.add_gold(gold)
+            tx.add_stock(red.id, 1)
+            tx.record_tick("Hearthday", hour)
+    with pytest.raises(RuntimeError), store.transaction() as tx:
+        tx.record_tick("Hearthday", 6)
+        raise RuntimeError("rolled back")
+
+    now = datetime.now()
+    with store.read() as tx:
+        points = tx.tick_history(now - timedelta(hours=1), now + timedelta(hours=1), width=7200)
+        assert tx.tick_history(now - timedelta(hours=2), now - timedelta(hours=1), width=7200) == []
+
+    # 3 ticks, in one bucket unless they straddle an even hour
+    assert sum(p.ticks for p in points) == 3
+    last = points[-1]
+    assert (last.day, last.hour, last.gold, last.potion_count) == ("Hearthday", 4, 85, 3)
+    assert (min(p.gold_min for p in points), max(p.gold_max for p in points)) == (80, 110)
+
+
+def test_shops(store, shop) -> None:
+    key = f"{next(_names):064d}"
+    other = store.create_shop(f"storage-test-{next(_names)}", key)
+    assert store.shop_by_key(key) == other
+    assert {shop, other} <= {s["id"] for s in store.shops()}
+
+    store.delete_shop(other)
+    assert store.shop_by_key(key) is None
+    assert other not in {s["id"] for s in store.shops()}
+
+
+def test_memory_sweep_deletes_only_abandoned_carts(monkeypatch) -> None:
+    from src.storage import memory
+
+    store = MemoryStorage(recipe_step=0)
+    with store.transaction() as tx:
+        old_open, old_done = tx.create_cart("c1", "anon"), tx.create_cart("c2", "anon")
+        tx.claim_cart(old_done)
+    monkeypatch.setattr(memory.time, "time", lambda: 1e12)
+    with store.transaction() as tx:
+        young = tx.create_cart("c3", "anon")
+
+    assert store.sweep_carts(max_age=3600, limit=10) == 1
+    with store.transaction() as tx:
+        assert not tx.claim_cart(old_open)
+        assert tx.claim_cart(young)
+
+
+@pytest.fixture
+def memory_api(monkeypatch):
+    """A client for the app on a fresh memory backend, and shop 1's headers."""
+    from fastapi.testclient import TestClient
+
+    from src import config
+    from src.api.server import app
+
+    monkeypatch.setattr(config.get_settings(), "STORAGE_BACKEND", "memory")
+    monkeypatch.setattr(config.get_settings(), "MEMORY_RECIPE_STEP", 50)
+    storage.get.cache_clear()
+    invalidation.bus.invalidate_all()  # values cached from another backend
+    try:
+        with TestClient(app) as client:
+            yield client, {"access_token": config.get_settings().API_KEY}
+    finally:
+        storage.get.cache_clear()
+        invalidation.bus.invalidate_all()
+
+
+def test_catalog_shows_stock_held_by_carts(memory_api) -> None:
+    client, headers = memory_api
+    red = "R100G0B0D0"
+    with storage.get().transaction() as tx:
+        recipe = tx.recipe_by_sku(red)
+        assert recipe is not None
+        tx.add_stock(recipe.id, 3)
+        tx.publish(invalidation.RECIPES)
+    assert [i["quantity"] for i in client.get("/catalog/").json()] == [3]
+
+    cart = client.post("/carts/", json={"customer_id": "c1"}, headers=headers).json()["cart_id"]
+    assert client.post(
+        f"/carts/{cart}/items/{red}", json={"quantity": 3}, headers=headers
+    ).status_code == 204
+    assert client.get("/catalog/").json() == []  # all of it is held
+
+    assert client.post(
+        f"/carts/{cart}/items/{red}", json={"quantity": 1}, headers=headers
+    ).status_code == 204
+    assert [i["quantity"] for i in client.get("/catalog/").json()] == [2]
+
+    assert client.post(f"/carts/{cart}/checkout", headers=headers).status_code == 200
+    # a checked-out cart can't take the rest off sale
+    assert client.post(
+        f"/carts/{cart}/items/{red}", json={"quantity": 2}, headers=headers
+    ).status_code == 404
+    assert [i["quantity"] for i in client.get("/catalog/").json()] == [2]
+
+
+def test_api_runs_without_postgres(memory_api) -> None:
+    client, headers = memory_api
+    barrel = {"sku": "SMALL_RED_BARREL", "ml_per_barrel": 500,
+              "potion_type": [1, 0, 0, 0], "price": 50, "quantity": 1}
+    assert client.post("/barrels/deliver/1", json=[barrel], headers=headers).status_code == 204
+    assert client.post(
+        "/bottler/deliver/1", json=[{"potion_type": RED, "quantity": 5}], headers=headers
+    ).status_code == 204
+    cart = client.post("/carts/", json={"customer_id": "c1"}, headers=headers).json()["cart_id"]
+    client.post(f"/carts/{cart}/items/R100G0B0D0", json={"quantity": 2}, headers=headers)
+
+    assert client.post(f"/carts/{cart}/checkout", headers=headers).json() == {
+        "total_potions_bought": 2, "total_gold_paid": 80
+    }
+    assert client.get("/inventory/audit", headers=headers).json() == {
+        "number_of_potions": 3, "ml_in_barrels": 0, "gold": 130
+    }
+    assert [i["quantity"] for i in client.get("/catalog/").json()] == [3]
+
+    client.post("/info/current_time", json={"day": "Hearthday", "hour": 2}, headers=headers)
+    [point] = client.get("/inventory/history", headers=headers).json()
+    assert (point["ticks"], point["gold"], point["potion_count"]) == (1, 130, 3)
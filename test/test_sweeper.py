@@ -0,0 +1,78 @@
+import pytest
+import sqlalchemy as sa
+
+from src import sweeper
+
+DAY = 86400
+
+
+@pytest.fixture
+def carts(engine):
+    """Three carts a month old: open with an item, checked out, and open."""
+    with engine.begin() as conn:
+        ids = conn.execute(
+            sa.text(
+                """
+                INSERT INTO carts (customer_id, created_at, checked_out)
+                VALUES ('sweeper-test', now() - interval '30 days', FALSE),
+                       ('sweeper-test', now() - interval '30 days', TRUE),
+                       ('sweeper-test', now() - interval '30 days', FALSE)
+                RETURNING id
+                """
+            )
+        ).scalars().all()
+        conn.execute(
+            sa.text(
+                "INSERT INTO cart_items (cart_id, cart_created_at, recipe_id, quantity) "
+                "SELECT id, created_at, (SELECT min(id) FROM potion_recipes), 1 "
+                "FROM carts WHERE id = :id"
+            ),
+            {"id": ids[0]},
+        )
+    yield ids
+    with engine.begin() as conn:
+        conn.execute(sa.text("DELETE FROM carts WHERE customer_id = 'sweeper-test'"))
+
+
+def _left(engine, ids) -> set[int]:
+    with engine.begin() as conn:
+        return set(
+            conn.execute(
+                sa.text("SELECT id FROM carts WHERE id = ANY(:ids)"), {"ids": ids}
+            ).scalars()
+        )
+
+
+def test_sweep_deletes_only_abandoned_carts(engine, carts) -> None:
+    open_cart, checked_out, other_open = carts
+
+    report = sweeper.sweep(max_age=20 * DAY, batch_size=1)
+
+    assert report["purged"] >= 2
+    assert report["batches"] == report["purged"] + 1  # the last one comes up short
+    assert _left(engine, carts) == {checked_out}
+    with engine.begin() as conn:
+        assert conn.execute(
+            sa.text("SELECT count(*) FROM cart_items WHERE cart_id = :id"),
+            {"id": open_cart},
+        ).scalar_one() == 0
+
+
+def test_sweep_skips_cart_being_checked_out(engine, carts) -> None:
+    open_cart, checked_out, other_open = carts
+    with engine.connect() as checkout:
+        checkout.begin()
+        checkout.execute(
+            sa.text("SELECT 1 FROM carts WHERE id = :id FOR UPDATE"), {"id": open_cart}
+        )
+
+        # returns instead of waiting on the lock
+        sweeper.sweep(max_age=20 * DAY)
+        checkout.rollback()
+
+    assert _left(engine, carts) == {open_cart, checked_out}
+
+
+def test_young_carts_are_kept(engine, carts) -> None:
+    sweeper.sweep(max_age=40 * DAY)
+    assert _left(engine, carts) == set(carts)
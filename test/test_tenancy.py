@@ -0,0 +1,115 @@
+import pytest
+import sqlalchemy as sa
+from fastapi.testclient import TestClient
+
+from src import invalidation, tenancy
+from src.api.server import app
+
+RED_BARREL = {"sku": "SMALL_RED_BARREL", "ml_per_barrel": 1000,
+              "potion_type": [1, 0, 0, 0], "price": 50, "quantity": 1}
+
+
+@pytest.fixture
+def shops(engine):
+    """Two fresh shops, each with a RED recipe; yields (shop_id, headers) pairs."""
+    created = [tenancy.create(f"tenancy-test-{i}") for i in range(2)]
+    with engine.begin() as conn:
+        for shop_id, _ in created:
+            conn.execute(
+                sa.text(
+                    "INSERT INTO potion_recipes "
+                    "(shop_id, sku, name, price, red_pct, green_pct, blue_pct, dark_pct) "
+                    "VALUES (:shop, 'RED', 'red', 50, 100, 0, 0, 0)"
+                ),
+                {"shop": shop_id},
+            )
+    yield [(shop_id, {"access_token": key}) for shop_id, key in created]
+    for shop_id, _ in created:
+        tenancy.delete(shop_id)
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as c:
+        yield c
+
+
+def test_shops_keep_their_own_state(shops, client) -> None:
+    (_, a), (_, b) = shops
+
+    assert client.post("/barrels/deliver/1", json=[RED_BARREL], headers=a).status_code == 204
+    assert client.post(
+        "/bottler/deliver/1", json=[{"potion_type": [100, 0, 0, 0], "quantity": 5}], headers=a
+    ).status_code == 204
+
+    assert client.get("/inventory/audit", headers=a).json() == {
+        "number_of_potions": 5, "ml_in_barrels": 500, "gold": 50
+    }
+    assert client.get("/inventory/audit", headers=b).json() == {
+        "number_of_potions": 0, "ml_in_barrels": 0, "gold": 100
+    }
+    assert [i["quantity"] for i in client.get("/catalog/", headers=a).json()] == [5]
+    assert client.get("/catalog/", headers=b).json() == []
+
+
+def test_carts_belong_to_their_shop(shops, client) -> None:
+    (_, a), (_, b) = shops
+    # adding to a cart holds stock, so shop a needs some
+    client.post("/barrels/deliver/1", json=[RED_BARREL], headers=a)
+    client.post(
+        "/bottler/deliver/1", json=[{"potion_type": [100, 0, 0, 0], "quantity": 1}], headers=a
+    )
+    cart = client.post("/carts/", json={"customer_id": "c1"}, headers=a).json()["cart_id"]
+
+    assert client.post(f"/carts/{cart}/items/RED", json={"quantity": 1}, headers=b).status_code == 404
+    assert client.post(f"/carts/{cart}/checkout", headers=b).status_code == 400
+    assert client.post(f"/carts/{cart}/items/RED", json={"quantity": 1}, headers=a).status_code == 204
+
+
+def test_unknown_key_refused(client, engine) -> None:
+    bad = {"access_token": "not-a-shop"}
+
+    assert client.get("/inventory/audit", headers=bad).status_code == 401
+    assert client.get("/catalog/", headers=bad).status_code == 401
+
+
+def test_metrics_are_per_shop(shops, client) -> None:
+    (a_id, a), (b_id, b) = shops
+    for _ in range(3):
+        client.get("/inventory/audit", headers=a)
+    client.get("/inventory/audit", headers=b)
+
+    seen_by_a = client.get("/admin/metrics", headers=a).json()
+    assert list(seen_by_a) == [str(a_id)]
+    assert seen_by_a[str(a_id)]["requests"] >= 3
+    assert str(b_id) in client.get("/admin/metrics", headers={"access_token": "brat"}).json()
+
+
+def test_whole_game_admin_is_shop_1_only(shops, client) -> None:
+    (_, a), _ = shops
+
+    assert client.post("/admin/snapshots/tenancy-test/restore", headers=a).status_code == 403
+    assert client.post("/admin/snapshots/tenancy-test", headers=a).status_code == 403
+    assert client.get("/admin/snapshots", headers=a).status_code == 403
+    assert client.post("/admin/sweep", headers=a).status_code == 403
+    # a shop still resets itself
+    assert client.post("/admin/reset", headers=a).status_code == 204
+
+
+def test_publish_evicts_only_that_shops_cache(shops, engine) -> None:
+    (a_id, _), (b_id, _) = shops
+    bus = invalidation.InvalidationBus(check_interval=0)
+    loads = []
+    cache = bus.cache(invalidation.RECIPES, lambda conn: loads.append(tenancy.current()))
+
+    for shop_id in (a_id, b_id, a_id, b_id):
+        with tenancy.using(shop_id):
+            cache.get()
+    assert loads == [a_id, b_id]
+
+    with tenancy.using(a_id), engine.begin() as conn:
+        invalidation.publish(conn, invalidation.RECIPES)
+    for shop_id in (a_id, b_id):
+        with tenancy.using(shop_id):
+            cache.get()
+    assert loads == [a_id, b_id, a_id]
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+import sqlalchemy as sa
+
+from src import events, storage, tenancy, ticks
+
+DAY = timedelta(days=1)
+
+
+@pytest.fixture
+def shop(engine):
+    shop_id = storage.get().create_shop("ticks-test", "t" * 64)
+    with tenancy.using(shop_id):
+        yield shop_id
+    storage.get().delete_shop(shop_id)
+
+
+@pytest.fixture
+def consumer(engine):
+    registry: dict = {}
+    events.handler(events.TICK, registry=registry)(ticks.roll_up)
+    consumer = events.Consumer("test_ticks", handlers=registry, batch_size=1000)
+    _drain(consumer)  # roll up whatever the database already holds
+    yield consumer
+    with engine.begin() as conn:
+        conn.execute(sa.text("DELETE FROM event_checkpoints WHERE consumer = 'test_ticks'"))
+
+
+def _drain(consumer) -> None:
+    while consumer.drain_once():
+        pass
+
+
+def _tick(hour: int, gold: int) -> None:
+    with storage.get().transaction() as tx:
+        tx.add_gold(gold)
+        tx.record_tick("Hearthday", hour)
+        tx.emit(events.TICK, {"day": "Hearthday", "hour": hour})
+
+
+def test_bucket_seconds() -> None:
+    now = datetime.now()
+    assert ticks.bucket_seconds(now - DAY, now, 200) == 7200  # never below a tick
+    assert ticks.bucket_seconds(now - 30 * DAY, now, 100) == 25920
+    assert ticks.bucket_seconds(now - 300 * DAY, now, 200) == 2 * ticks.DAY  # whole days
+
+
+def test_long_ranges_come_from_rollups(engine, consumer, shop) -> None:
+    for hour, gold in ((0, 10), (2, -30), (4, 5)):
+        _tick(hour, gold)
+    since, until = datetime.now() - 1000 * DAY, datetime.now() + DAY
+
+    assert ticks.history(since, until, 10) == []  # not rolled up yet
+    _drain(consumer)
+    [point] = ticks.history(since, until, 10)
+    assert (point.ticks, point.hour, point.gold, point.gold_min, point.gold_max) == (
+        3, 4, 85, 80, 110
+    )
+
+    # redelivered events rebuild the same rollup
+    with engine.begin() as conn:
+        ticks.roll_up(conn, [events.Event(0, shop, events.TICK, {}, datetime.now())] * 2)
+    assert ticks.history(since, until, 10) == [point]
+
+
+def test_short_ranges_read_ticks(engine, shop) -> None:
+    _tick(0, 10)
+    _tick(2, 5)
+    points = ticks.history(datetime.now() - DAY, datetime.now() + DAY, 200)
+    assert sum(p.ticks for p in points) == 2
+    assert points[-1].gold == 115